@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.models.signals import post_migrate
 
 
 class ApiappConfig(AppConfig):
     name = 'apiapp'
+
+    def ready(self):
+        from . import signals
+        from . import changes , database , search , stats
+        #檢查CONN_MAX_AGE保留的connection是否仍然可用
+        request_started.connect(database.check_connections)
+        #migrate之後建立或修復全文搜尋的FTS5 index、類別統計以及product變更紀錄的trigger
+        post_migrate.connect(search.install, sender=self)
+        post_migrate.connect(stats.install, sender=self)
+        post_migrate.connect(changes.install, sender=self)
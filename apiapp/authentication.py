@@ -0,0 +1,23 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import jwt_user_cache
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+	'''
+	與JWTAuthentication相同的token驗證，但User從jwt_user_cache(apiapp/cache.py)取得，
+	cache中有資料時每個request不需要再查詢一次auth_user
+	User被修改、停用或刪除時由apiapp/signals.py invalidate
+	'''
+	def get_user(self, validated_token):
+		user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+		if user_id is not None:
+			user = jwt_user_cache.get(user_id)
+			if user is not None:
+				return user
+		
+		#沒有user_id、找不到user或user已停用時由JWTAuthentication raise exception
+		user = super().get_user(validated_token)
+		jwt_user_cache.set(user_id, user)
+		return user
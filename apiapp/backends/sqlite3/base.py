@@ -0,0 +1,30 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+	'''
+	Django的SQLite backend，在settings.DATABASES的OPTIONS加上兩個設定 :
+	pragmas : 每個connection建立時執行的PRAGMA，例如 {'journal_mode': 'wal', 'busy_timeout': 20000}
+	transaction_mode : transaction.atomic()開始時的BEGIN模式(DEFERRED、IMMEDIATE、EXCLUSIVE)
+
+	預設的BEGIN(DEFERRED)在第一個寫入時才取得write lock，apiapp_product的FTS5 trigger會先讀取index，
+	其他connection正在寫入時無法升級為write lock，不會等待busy_timeout而是馬上raise database is locked。
+	IMMEDIATE在BEGIN時就取得write lock，等待其他的寫入完成。
+	'''
+	custom_options = ('pragmas' , 'transaction_mode')
+
+	def get_connection_params(self):
+		kwargs = super().get_connection_params()
+		for option in self.custom_options:
+			kwargs.pop(option, None)
+		return kwargs
+
+	def get_new_connection(self, conn_params):
+		conn = super().get_new_connection(conn_params)
+		for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+			conn.execute('PRAGMA %s = %s' % (name, value)).close()
+		return conn
+
+	def _start_transaction_under_autocommit(self):
+		mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+		self.cursor().execute('BEGIN %s' % mode if mode else 'BEGIN')
@@ -0,0 +1,212 @@
+import copy
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .compression import choose_encoding , compress , set_encoded
+from .metrics import timed
+
+
+#所有cache依照prefix登記在這裡，CacheStats會列出每一個的hit/miss
+registered_caches = {}
+
+#CachedListMixin(apiapp/mixins.py)存放整個list時使用的key
+LIST_KEY = 'list'
+
+
+class CacheEntry:
+	'''
+	單一個request對應的cache entry，由ResponseCache.entry()建立
+	cache中的值為(content, Content-Type, headers, 壓縮後的content)，壓縮後的content為{Content-Encoding : bytes}
+	'''
+	def __init__(self, response_cache, key, request):
+		self.response_cache = response_cache
+		self.key = key
+		self.request = request
+		self.cached = None
+
+	def load(self):
+		'''
+		回傳cache中的HttpResponse(沒有壓縮)，沒有時回傳None
+		'''
+		cached = self.response_cache.cache.get(self.key)
+		self.response_cache.count('hits' if cached is not None else 'misses')
+		if cached is None:
+			return None
+		self.cached = cached
+		content, content_type, headers = cached[:3]
+		response = HttpResponse(content, content_type=content_type)
+		for header, value in headers.items():
+			response[header] = value
+		return response
+
+	def encode(self, response):
+		'''
+		依照request的Accept-Encoding壓縮load()或save()的response，回傳response
+		使用cache中已經壓縮過的bytes，沒有這個encoding時壓縮後一起存入cache，之後的hit不需要再壓縮
+		'''
+		encoding = choose_encoding(self.request, response)
+		if encoding is None:
+			return response
+		content, content_type, headers = self.cached[:3]
+		encoded = dict(self.cached[3]) if len(self.cached) > 3 else {}
+		if encoding in encoded:
+			self.response_cache.count('compressed_hits')
+		else:
+			encoded[encoding] = compress(encoding, content)
+			self.cached = (content, content_type, headers, encoded)
+			self.response_cache.cache.set(self.key, self.cached, self.response_cache.timeout)
+		set_encoded(response, encoding, encoded[encoding])
+		return response
+
+	def save(self, response):
+		'''
+		將REST framework的Response render成bytes後存入cache
+		沒有ETag時以內容的md5作為ETag，已經有ETag、Last-Modified(apiapp/conditional.py)時一起保存
+		'''
+		with timed('render'):
+			response.render()
+		if not response.has_header('ETag'):
+			response['ETag'] = '"%s"' % hashlib.md5(response.content).hexdigest()
+		headers = {header: response[header] for header in ('ETag' , 'Last-Modified') if response.has_header(header)}
+		self.cached = (response.content, response['Content-Type'], headers, {})
+		self.response_cache.cache.set(self.key, self.cached, self.response_cache.timeout)
+		return self.encode(response)
+
+
+class ResponseCache:
+	'''
+	將GET的response(render後的bytes與ETag)存放在settings.CACHES的cache backend
+
+	每個object有一個token，entry的key包含token，invalidate()只需要更換token，
+	舊的entry之後不會再被讀取，會在timeout後由cache backend清除。
+	request讀取資料前先取得token，因此invalidate之前開始的request即使較晚寫入cache，
+	寫入的也是舊token的entry，不會覆蓋新的資料。
+	'''
+	def __init__(self, prefix, alias='default', timeout=None):
+		self.prefix = prefix
+		self.alias = alias
+		self.timeout = timeout if timeout is not None else getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 600)
+		#compressed_hits : hit時使用cache中已經壓縮過的bytes
+		self.counters = {'hits': 0, 'misses': 0, 'compressed_hits': 0, 'invalidations': 0}
+		self._lock = threading.Lock()
+		registered_caches[prefix] = self
+
+	@property
+	def cache(self):
+		return caches[self.alias]
+
+	def count(self, name, n=1):
+		with self._lock:
+			self.counters[name] += n
+
+	def stats(self):
+		with self._lock:
+			return dict(self.counters)
+
+	def _token_key(self, key):
+		return '%s:%s:token' % (self.prefix, key)
+
+	def _get_token(self, key):
+		token_key = self._token_key(key)
+		token = self.cache.get(token_key)
+		if token is None:
+			#token不存在(第一次讀取或被cache backend清除)時建立新的token，舊的entry都不會再被讀取
+			token = uuid.uuid4().hex
+			if not self.cache.add(token_key, token, None):
+				token = self.cache.get(token_key, token)
+		return token
+
+	def entry(self, request, key):
+		'''
+		回傳request對應的CacheEntry，只有JSON的response會被cache，其他format回傳None
+		'''
+		renderer = getattr(request, 'accepted_renderer', None)
+		if renderer is None or renderer.format != 'json':
+			return None
+		#image、next、previous是absolute URL，不同的host需要不同的entry，
+		#?fields=不同時輸出的欄位也不同，list的每一頁(cursor、page_size)也各有一個entry
+		variant = request.build_absolute_uri()
+		variant = hashlib.md5(variant.encode('utf-8')).hexdigest()
+		return CacheEntry(self, '%s:%s:%s:%s' % (self.prefix, key, self._get_token(key), variant), request)
+
+	def invalidate(self, keys):
+		keys = list(keys)
+		if not keys:
+			return
+		self.cache.set_many({self._token_key(key): uuid.uuid4().hex for key in keys}, None)
+		self.count('invalidations', len(keys))
+
+
+class UserCache:
+	'''
+	JWT驗證時使用的User cache : 每個process的LRU加上settings.CACHES的shared cache
+
+	User被修改、停用或刪除時apiapp/signals.py會呼叫invalidate()，
+	只能清除目前process的LRU與shared cache，其他process的LRU依靠較短的local_timeout過期
+	'''
+	def __init__(self, prefix, alias='default', timeout=None, local_timeout=None, maxsize=1024):
+		self.prefix = prefix
+		self.alias = alias
+		self.timeout = timeout if timeout is not None else getattr(settings, 'JWT_USER_CACHE_TIMEOUT', 60)
+		self.local_timeout = local_timeout if local_timeout is not None else getattr(settings, 'JWT_USER_LOCAL_CACHE_TIMEOUT', 5)
+		self.maxsize = maxsize
+		self.local = OrderedDict() #user_id : (expires, user)
+		self.counters = {'hits': 0, 'local_hits': 0, 'misses': 0, 'invalidations': 0}
+		self._lock = threading.Lock()
+		registered_caches[prefix] = self
+
+	@property
+	def cache(self):
+		return caches[self.alias]
+
+	def stats(self):
+		with self._lock:
+			return dict(self.counters)
+
+	def _key(self, user_id):
+		return '%s:%s' % (self.prefix, user_id)
+
+	def get(self, user_id):
+		now = time.monotonic()
+		with self._lock:
+			cached = self.local.get(user_id)
+			if cached is not None and cached[0] > now:
+				self.local.move_to_end(user_id)
+				self.counters['local_hits'] += 1
+				#回傳copy，request中對user的修改不會影響cache中的instance
+				return copy.copy(cached[1])
+		user = self.cache.get(self._key(user_id))
+		with self._lock:
+			self.counters['hits' if user is not None else 'misses'] += 1
+		if user is not None:
+			self._set_local(user_id, user)
+		return user
+
+	def set(self, user_id, user):
+		self.cache.set(self._key(user_id), user, self.timeout)
+		self._set_local(user_id, user)
+
+	def _set_local(self, user_id, user):
+		with self._lock:
+			self.local[user_id] = (time.monotonic() + self.local_timeout, copy.copy(user))
+			self.local.move_to_end(user_id)
+			while len(self.local) > self.maxsize:
+				self.local.popitem(last=False)
+
+	def invalidate(self, user_id):
+		with self._lock:
+			self.local.pop(user_id, None)
+			self.counters['invalidations'] += 1
+		self.cache.delete(self._key(user_id))
+
+
+product_cache = ResponseCache('product')
+category_list_cache = ResponseCache('category_list')
+jwt_user_cache = UserCache('jwt_user')
@@ -0,0 +1,129 @@
+import logging
+
+from django.db import connections , transaction , DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .database import triggers_installed , uses_triggers
+
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'apiapp_productchange'
+#與Django在SQLite保存DateTimeField的格式相同(UTC)
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+#由trigger寫入，bulk_create、bulk_update、update()以及Category、User刪除時cascade的DELETE也會記錄
+SQLITE_SCHEMA = [
+	'''CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON apiapp_product BEGIN
+		INSERT INTO {table}(product_id, action, changed_at) VALUES (new.id, 'created', {now});
+	END''',
+	'''CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE ON apiapp_product BEGIN
+		INSERT INTO {table}(product_id, action, changed_at) VALUES (new.id, 'updated', {now});
+	END''',
+	'''CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON apiapp_product BEGIN
+		INSERT INTO {table}(product_id, action, changed_at) VALUES (old.id, 'deleted', {now});
+	END''',
+	#product的owner欄位為username，user改名時這個user的所有product都需要重新同步
+	'''CREATE TRIGGER IF NOT EXISTS {table}_owner_rename AFTER UPDATE OF username ON auth_user
+	WHEN old.username != new.username BEGIN
+		INSERT INTO {table}(product_id, action, changed_at) SELECT id, 'updated', {now} FROM apiapp_product WHERE owner_id = new.id;
+	END''',
+	]
+TRIGGERS = ['%s_insert' % TABLE , '%s_update' % TABLE , '%s_delete' % TABLE , '%s_owner_rename' % TABLE]
+
+
+class CursorExpired(APIException):
+	status_code = status.HTTP_410_GONE
+	default_detail = 'Changes since this cursor have been compacted, download /apis/products/ again.'
+	default_code = 'cursor_expired'
+
+class ChangesUnavailable(APIException):
+	status_code = status.HTTP_501_NOT_IMPLEMENTED
+	default_detail = 'Product changes are not recorded, run manage.py migrate.'
+	default_code = 'changes_unavailable'
+
+
+def install(using=DEFAULT_DB_ALIAS, **kwargs):
+	'''
+	post_migrate時建立trigger(apiapp/apps.py)，SQLite修改apiapp_product的欄位時會重建table，trigger會跟著被刪除
+	SQLite以外的資料庫沒有trigger，由apiapp/signals.py在product寫入後呼叫record()
+	'''
+	connection = connections[using]
+	if not uses_triggers(using):
+		return
+	with connection.cursor() as cursor:
+		for sql in SQLITE_SCHEMA:
+			cursor.execute(sql.format(table=TABLE, now=NOW))
+
+def available(using=DEFAULT_DB_ALIAS):
+	'''
+	變更是否有被記錄 : SQLite的trigger都存在，或是由signal記錄的其他資料庫
+	'''
+	return not uses_triggers(using) or triggers_installed(using, TRIGGERS)
+
+def record(pks, action, using=DEFAULT_DB_ALIAS):
+	'''
+	SQLite以外的資料庫在product寫入後記錄變更，SQLite由trigger記錄，不做任何事
+	直接以SQL修改、沒有送出signal的寫入不會被記錄
+	'''
+	if uses_triggers(using) or not pks:
+		return
+	from .models import ProductChange
+	connection = connections[using]
+	now = timezone.now()
+	with transaction.atomic(using=using):
+		if connection.vendor == 'postgresql':
+			#sequence的id依照INSERT的順序而不是commit的順序，id較小的transaction較晚commit時，
+			#已經讀到較大id的client會漏掉它，lock到commit為止，寫入變更的transaction依序commit(讀取不受影響)
+			with connection.cursor() as cursor:
+				cursor.execute('LOCK TABLE %s IN EXCLUSIVE MODE' % TABLE)
+		ProductChange.objects.using(using).bulk_create(
+			[ProductChange(product_id=pk, action=action, changed_at=now) for pk in pks], batch_size=500)
+
+def head(using=DEFAULT_DB_ALIAS):
+	'''
+	回傳目前最新的變更id，沒有任何變更時為0
+	'''
+	from .models import ProductChange
+	return ProductChange.objects.using(using).aggregate(head=Max('id'))['head'] or 0
+
+def changes_since(since, limit, using=DEFAULT_DB_ALIAS):
+	'''
+	回傳(變更, cursor, 是否還有更多變更)
+	讀取id大於since的limit筆紀錄，同一個product只保留最後一筆，變更為依照id(commit的順序)排列的(id, product_id, action)
+	cursor為讀取到的最後一個id，沒有變更時為since
+	since之後的紀錄已經被compact()清除時raise CursorExpired
+	'''
+	from .models import ProductChange
+	rows = list(ProductChange.objects.using(using).filter(id__gt=since).order_by('id').values_list(
+		'id' , 'product_id' , 'action')[:limit])
+	if rows and rows[0][2] == ProductChange.COMPACTED:
+		#COMPACTED是compaction後最小的id，since比它小表示中間的變更已經被刪除
+		raise CursorExpired()
+	latest = {}
+	for row in rows:
+		if row[1] is not None:
+			#dict依照最後一次設定的順序排列需要先刪除
+			latest.pop(row[1], None)
+			latest[row[1]] = row
+	return list(latest.values()), rows[-1][0] if rows else since, len(rows) == limit
+
+def compact(retention, using=DEFAULT_DB_ALIAS):
+	'''
+	清除變更紀錄，回傳刪除的筆數
+	1. 同一個product只保留最新的一筆，client不論cursor在哪裡都會讀到最新的那一筆，不影響同步的結果
+	2. 刪除早於retention(timedelta)的紀錄，最後一筆改為COMPACTED，cursor比它小的client需要重新下載全部的product
+	'''
+	from .models import ProductChange
+	changes = ProductChange.objects.using(using)
+	with transaction.atomic(using=using):
+		latest = changes.filter(product_id__isnull=False).order_by().values('product_id').annotate(last=Max('id')).values('last')
+		deleted, _ = changes.filter(product_id__isnull=False).exclude(id__in=latest).delete()
+		expired = changes.filter(changed_at__lt=timezone.now() - retention).order_by('-id').values_list('id' , flat=True).first()
+		if expired is not None:
+			deleted += changes.filter(id__lt=expired).delete()[0]
+			changes.filter(id=expired).update(product_id=None, action=ProductChange.COMPACTED)
+	return deleted
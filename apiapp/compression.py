@@ -0,0 +1,164 @@
+import re
+import zlib
+
+try:
+	import brotli
+except ImportError: #沒有安裝brotli時不提供br
+	brotli = None
+
+try:
+	import zstandard
+except ImportError: #沒有安裝zstandard時不提供zstd
+	zstandard = None
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from .metrics import timed
+
+
+#JSON、文字等可以壓縮的Content-Type，圖片(apiapp/media.py)已經壓縮過，不再壓縮
+COMPRESSIBLE_TYPES = {'application/json' , 'application/x-ndjson' , 'application/javascript' , 'application/xml' , 'image/svg+xml'}
+STRONG_ETAG_RE = re.compile(r'^"[^"]*"$')
+
+
+class GzipCodec:
+	def __init__(self, level):
+		self.level = level
+
+	def _compressobj(self):
+		#wbits=31 : gzip的header，mtime為0，相同的內容壓縮後的bytes也相同
+		return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+	def compress(self, data):
+		compressor = self._compressobj()
+		return compressor.compress(data) + compressor.flush()
+
+	def stream(self, chunks):
+		compressor = self._compressobj()
+		for chunk in chunks:
+			#每個chunk都flush，client不需要等到最後才能解壓縮
+			yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+		yield compressor.flush()
+
+
+class BrotliCodec(GzipCodec):
+	def compress(self, data):
+		return brotli.compress(data, quality=self.level)
+
+	def stream(self, chunks):
+		compressor = brotli.Compressor(quality=self.level)
+		for chunk in chunks:
+			yield compressor.process(chunk) + compressor.flush()
+		yield compressor.finish()
+
+
+class ZstdCodec(GzipCodec):
+	#ZstdCompressor不能在多個thread同時使用，每次建立新的
+	def compress(self, data):
+		return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+	def stream(self, chunks):
+		compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+		for chunk in chunks:
+			yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+		yield compressor.flush()
+
+
+#Content-Encoding : codec，只包含已安裝的
+CODECS = {'gzip': GzipCodec}
+if brotli is not None:
+	CODECS['br'] = BrotliCodec
+if zstandard is not None:
+	CODECS['zstd'] = ZstdCodec
+
+
+def get_codec(encoding):
+	levels = getattr(settings, 'COMPRESSION_LEVELS', {})
+	return CODECS[encoding](levels.get(encoding, 6 if encoding == 'gzip' else 3))
+
+def compress(encoding, data):
+	with timed('compress'):
+		return get_codec(encoding).compress(data)
+
+def negotiate(accept_encoding):
+	'''
+	回傳Accept-Encoding中q最高且已安裝的encoding，q相同時依照settings.COMPRESSION_ENCODINGS的順序，都不接受時回傳None
+	'''
+	accepted = {}
+	for part in accept_encoding.split(','):
+		name, _, params = part.partition(';')
+		q = 1.0
+		for param in params.split(';'):
+			key, _, value = param.partition('=')
+			if key.strip().lower() == 'q':
+				try:
+					q = float(value)
+				except ValueError:
+					q = 0.0
+		accepted[name.strip().lower()] = q
+	best, best_q = None, 0.0
+	for encoding in getattr(settings, 'COMPRESSION_ENCODINGS', ('gzip',)):
+		if encoding not in CODECS:
+			continue
+		q = accepted.get(encoding, accepted.get('*', 0.0))
+		if q > best_q:
+			best, best_q = encoding, q
+	return best
+
+def choose_encoding(request, response):
+	'''
+	回傳這個response使用的encoding，不壓縮時回傳None
+	小於COMPRESSION_MIN_SIZE、已經壓縮過、206或不是文字的response不壓縮，會壓縮的response加上Vary: Accept-Encoding
+	'''
+	if not getattr(settings, 'COMPRESSION_ENABLED', True):
+		return None
+	if response.status_code in (204, 206, 304) or response.has_header('Content-Encoding'):
+		return None
+	content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+	if not (content_type.startswith('text/') or content_type in COMPRESSIBLE_TYPES):
+		return None
+	if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+		return None
+	patch_vary_headers(response, ('Accept-Encoding',))
+	return negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+def set_encoded(response, encoding, content):
+	'''
+	將response的內容換成壓縮後的content
+	'''
+	response.content = content
+	response['Content-Length'] = str(len(content))
+	set_encoding_headers(response, encoding)
+
+def set_encoding_headers(response, encoding):
+	response['Content-Encoding'] = encoding
+	#與GZipMiddleware相同，壓縮後的bytes不同，strong ETag改為weak
+	etag = response.get('ETag', '')
+	if STRONG_ETAG_RE.match(etag):
+		response['ETag'] = 'W/' + etag
+
+
+class CompressionMiddleware:
+	'''
+	依照Accept-Encoding以zstd、br、gzip壓縮response，取代django.middleware.gzip.GZipMiddleware
+	apiapp/cache.py的response cache會保存壓縮後的bytes，cache hit時已經有Content-Encoding，這裡不再壓縮
+	'''
+	def __init__(self, get_response):
+		if not getattr(settings, 'COMPRESSION_ENABLED', True):
+			raise MiddlewareNotUsed
+		self.get_response = get_response
+
+	def __call__(self, request):
+		response = self.get_response(request)
+		encoding = choose_encoding(request, response)
+		if encoding is None:
+			return response
+		if response.streaming:
+			response.streaming_content = get_codec(encoding).stream(response.streaming_content)
+			del response['Content-Length']
+			set_encoding_headers(response, encoding)
+		else:
+			set_encoded(response, encoding, compress(encoding, response.content))
+		return response
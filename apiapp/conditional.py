@@ -0,0 +1,42 @@
+import calendar
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date , parse_http_date_safe
+
+
+def make_validators(request, *parts, last_modified=None):
+	'''
+	回傳(ETag, Last-Modified的timestamp)
+	ETag由URL、response的media type以及parts(例如count、max(updated_at))組成，不需要序列化資料
+	'''
+	renderer = getattr(request, 'accepted_renderer', None)
+	values = [request.get_full_path(), renderer.media_type if renderer is not None else '']
+	values.extend(str(part) for part in parts)
+	values.append(last_modified.isoformat() if last_modified is not None else '')
+	#同樣的資料在gzip等不同encoding時內容不同，所以使用weak ETag
+	etag = 'W/"%s"' % hashlib.md5('|'.join(values).encode('utf-8')).hexdigest()
+	timestamp = calendar.timegm(last_modified.utctimetuple()) if last_modified is not None else None
+	return etag, timestamp
+
+def not_modified(request, etag, last_modified):
+	'''
+	If-None-Match、If-Modified-Since符合時回傳304 response，否則回傳None
+	'''
+	response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+	if response is not None:
+		set_validators(response, etag, last_modified)
+	return response
+
+def set_validators(response, etag, last_modified):
+	response['ETag'] = etag
+	if last_modified is not None:
+		response['Last-Modified'] = http_date(last_modified)
+	return response
+
+def response_validators(response):
+	'''
+	從cache中的response取回(ETag, Last-Modified的timestamp)
+	'''
+	last_modified = response.get('Last-Modified')
+	return response.get('ETag'), parse_http_date_safe(last_modified) if last_modified else None
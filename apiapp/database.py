@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.db import connections
+
+
+def check_connections(**kwargs):
+	'''
+	request_started時檢查CONN_MAX_AGE保留下來的connection，資料庫重新啟動或斷線後關閉，使用時重新連線
+	Django 2.2只有在發生錯誤之後才會檢查，沒有CONN_HEALTH_CHECKS(Django 4.1)
+	'''
+	if not getattr(settings, 'DATABASE_HEALTH_CHECKS', False):
+		return
+	for connection in connections.all():
+		if (connection.connection is not None and connection.settings_dict['CONN_MAX_AGE'] and
+				not connection.in_atomic_block and not connection.is_usable()):
+			connection.close()
+
+def uses_triggers(using):
+	'''
+	類別統計(apiapp/stats.py)與product變更紀錄(apiapp/changes.py)在SQLite由trigger維護，
+	其他資料庫由apiapp/signals.py的signal維護
+	'''
+	return connections[using].vendor == 'sqlite'
+
+#{(alias, database NAME, trigger names): True}，只記錄存在的結果，之後的request不需要再查詢sqlite_master
+_installed = {}
+
+def triggers_installed(using, triggers):
+	'''
+	SQLite的triggers是否都存在，SQLite修改apiapp_product的欄位時會重建table，trigger會跟著被刪除，要等到post_migrate才重新建立
+	'''
+	connection = connections[using]
+	key = (connection.alias, connection.settings_dict['NAME'], tuple(triggers))
+	if key not in _installed:
+		with connection.cursor() as cursor:
+			cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s)" % ', '.join(['%s'] * len(triggers)), triggers)
+			if cursor.fetchone()[0] != len(triggers):
+				return False
+		_installed[key] = True
+	return True
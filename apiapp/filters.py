@@ -0,0 +1,127 @@
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class Filter:
+	'''
+	一個查詢參數對應的filter，to_python()無法轉換時raise ValueError，訊息會成為400 response的內容
+	'''
+	def __init__(self, lookup):
+		self.lookup = lookup
+
+	def to_python(self, value):
+		return value
+
+	def filter(self, queryset, value):
+		return queryset.filter(**{self.lookup: value})
+
+class ListFilter(Filter):
+	'''
+	以逗號分隔的多個值 : ?category=book,guitar，lookup為__in
+	'''
+	def to_python(self, value):
+		values = [item.strip() for item in value.split(',') if item.strip()]
+		if not values:
+			raise ValueError('Enter at least one value.')
+		return values
+
+class IntegerFilter(Filter):
+	'''
+	0到max_value的整數，預設的max_value為PositiveIntegerField的上限，超過64 bit的值SQLite無法bind
+	'''
+	def __init__(self, lookup, max_value=2 ** 31 - 1):
+		super().__init__(lookup)
+		self.max_value = max_value
+
+	def to_python(self, value):
+		try:
+			value = int(value)
+		except ValueError:
+			raise ValueError('A valid integer is required.')
+		if value < 0:
+			raise ValueError('Ensure this value is greater than or equal to 0.')
+		if value > self.max_value:
+			raise ValueError('Ensure this value is less than or equal to %d.' % self.max_value)
+		return value
+
+class BooleanFilter(Filter):
+	'''
+	true時filter lookup(Q object)，false時filter false_lookup
+	'''
+	true_values = ('true' , '1' , 'yes')
+	false_values = ('false' , '0' , 'no')
+
+	def __init__(self, lookup, false_lookup):
+		super().__init__(lookup)
+		self.false_lookup = false_lookup
+
+	def to_python(self, value):
+		value = value.lower()
+		if value in self.true_values:
+			return True
+		if value in self.false_values:
+			return False
+		raise ValueError('Must be a valid boolean.')
+
+	def filter(self, queryset, value):
+		return queryset.filter(self.lookup if value else self.false_lookup)
+
+
+class FilterSetBackend(BaseFilterBackend):
+	'''
+	宣告式的filter : filters為{查詢參數 : Filter}，ordering_fields為允許排序的欄位(白名單)
+	任何查詢參數的值不正確或排序欄位不在ordering_fields中時回傳400，不會以沒有index的欄位排序
+	CursorPagination會透過get_ordering()使用相同的排序
+	'''
+	filters = {}
+	ordering_param = 'ordering'
+	ordering_fields = ('id' ,)
+	default_ordering = ('id' ,)
+	tiebreaker = 'id' #排序欄位不是unique時最後加上id，分頁時順序固定
+
+	def filter_queryset(self, request, queryset, view):
+		errors = {}
+		for param, filter in self.filters.items():
+			value = request.query_params.get(param , None)
+			if value is None:
+				continue
+			try:
+				queryset = filter.filter(queryset, filter.to_python(value))
+			except ValueError as e:
+				errors[param] = [str(e)]
+		try:
+			ordering = self.get_ordering(request, queryset, view)
+		except ValueError as e:
+			errors[self.ordering_param] = [str(e)]
+		if errors:
+			raise ValidationError(errors)
+		return queryset.order_by(*ordering)
+
+	def get_ordering(self, request, queryset, view):
+		value = request.query_params.get(self.ordering_param , '')
+		ordering = [field.strip() for field in value.split(',') if field.strip()]
+		if not ordering:
+			return list(self.default_ordering)
+		invalid = [field for field in ordering if field.lstrip('-') not in self.ordering_fields]
+		if invalid:
+			raise ValueError('Invalid ordering "%s", choices are: %s.' % (','.join(invalid), ','.join(self.ordering_fields)))
+		if self.tiebreaker not in [field.lstrip('-') for field in ordering]:
+			#與第一個排序欄位相同的方向，(price, id)的index可以整個反向讀取
+			ordering.append('-' + self.tiebreaker if ordering[0].startswith('-') else self.tiebreaker)
+		return ordering
+
+
+class ProductFilterBackend(FilterSetBackend):
+	'''
+	ProductList的filter與排序，每一種組合都有apiapp/models.py的index
+	example : /products/?category=book,guitar&price_min=100&price_max=1000&in_stock=true&ordering=price,-id
+	'''
+	filters = {
+		'category': ListFilter('category__name__in'),
+		'username': Filter('owner__username'),
+		'price_min': IntegerFilter('price__gte'),
+		'price_max': IntegerFilter('price__lte'),
+		'in_stock': BooleanFilter(Q(stock__gt=0), Q(stock=0)),
+		}
+	ordering_fields = ('id' , 'price')
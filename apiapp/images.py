@@ -0,0 +1,118 @@
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import connections , transaction
+from django.utils import timezone
+from PIL import Image
+
+from .models import Product , ProductChange
+
+
+logger = logging.getLogger(__name__)
+
+#縮圖的名稱與最長邊的pixel數，輸出為WebP
+THUMBNAIL_SIZES = getattr(settings, 'PRODUCT_THUMBNAIL_SIZES', {'small': 200, 'medium': 800})
+MAX_IMAGE_PIXELS = getattr(settings, 'PRODUCT_IMAGE_MAX_PIXELS', 40000000) #寬 x 高的上限，超過時不產生縮圖
+MAX_UPLOAD_SIZE = getattr(settings, 'PRODUCT_IMAGE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024) #上傳檔案的bytes上限，ProductSerializer驗證
+
+#縮圖的名稱由原圖決定，不使用Product.image的ContentAddressedStorage(apiapp/storage.py)
+thumbnail_storage = FileSystemStorage()
+
+#處理圖片的local worker pool，POST、PUT只需要寫入原圖，解碼與縮圖在worker中進行
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2), thread_name_prefix='product-image')
+
+
+def thumbnail_name(name, variant):
+	'''
+	原圖 media/ab/abc.jpg 的縮圖為 thumbnails/media/ab/abc_small_200.webp
+	原圖的名稱為內容的hash，相同的原圖共用同一組縮圖，檔名包含尺寸，修改THUMBNAIL_SIZES後是不同的檔案
+	'''
+	return posixpath.join('thumbnails', '%s_%s_%d.webp' % (posixpath.splitext(name)[0], variant, THUMBNAIL_SIZES[variant]))
+
+def thumbnail_names(name, status):
+	'''
+	回傳{variant: 縮圖名稱}，縮圖還沒有產生完成時回傳None
+	'''
+	if not name or status != Product.IMAGE_READY:
+		return None
+	return {variant: thumbnail_name(name, variant) for variant in THUMBNAIL_SIZES}
+
+def schedule(pk):
+	'''
+	transaction commit之後才交給worker，worker才讀得到新的image
+	'''
+	transaction.on_commit(lambda: executor.submit(_process_in_worker, pk))
+
+def make_thumbnails(storage, name):
+	'''
+	解碼原圖，產生每個THUMBNAIL_SIZES的WebP縮圖，圖片無法解碼或超過MAX_IMAGE_PIXELS時raise ValueError
+	'''
+	with storage.open(name) as file:
+		with Image.open(file) as image:
+			width, height = image.size
+			if width * height > MAX_IMAGE_PIXELS:
+				raise ValueError('image is %dx%d, larger than %d pixels' % (width, height, MAX_IMAGE_PIXELS))
+			image.load()
+			if image.mode not in ('RGB' , 'RGBA'):
+				image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.getbands() else 'RGB')
+
+			for variant, size in THUMBNAIL_SIZES.items():
+				thumbnail = image.copy()
+				thumbnail.thumbnail((size, size))
+				content = io.BytesIO()
+				thumbnail.save(content, 'WEBP', quality=80)
+				target = thumbnail_name(name, variant)
+				#重新處理同一張圖片時覆蓋舊的縮圖
+				thumbnail_storage.delete(target)
+				thumbnail_storage.save(target, ContentFile(content.getvalue()))
+
+def process_image(pk):
+	'''
+	worker執行的工作 : 產生縮圖後將image_status改為ready，失敗時改為failed
+	只有在image沒有再被修改時才更新狀態，並且invalidate ProductDetail的cache
+	'''
+	#避免與apiapp/signals.py的circular import
+	from .changes import record
+	from .signals import invalidate_products
+	name = Product.objects.filter(pk=pk).values_list('image' , flat=True).first()
+	if not name:
+		return
+	try:
+		make_thumbnails(Product._meta.get_field('image').storage, name)
+		status = Product.IMAGE_READY
+	except (OSError, ValueError, Image.DecompressionBombError) as e:
+		logger.warning('product %s image %s: %s', pk, name, e)
+		status = Product.IMAGE_FAILED
+	
+	updated = Product.objects.filter(pk=pk, image=name).update(image_status=status, updated_at=timezone.now())
+	if updated:
+		invalidate_products([pk])
+		record([pk], ProductChange.UPDATED)
+
+def backfill(reprocess=False):
+	'''
+	在目前的process中依序為還沒有縮圖的product產生縮圖，回傳處理的product數量
+	包含加上縮圖功能之前上傳的圖片(image_status為空字串)以及worker還沒處理就停止的pending，
+	reprocess為True時重新產生所有圖片的縮圖(修改THUMBNAIL_SIZES之後)
+	'''
+	products = Product.objects.exclude(image='')
+	if not reprocess:
+		products = products.filter(image_status__in=('' , Product.IMAGE_PENDING))
+	pks = list(products.order_by('id').values_list('id' , flat=True))
+	for pk in pks:
+		process_image(pk)
+	return len(pks)
+
+def _process_in_worker(pk):
+	try:
+		process_image(pk)
+	except Exception:
+		logger.exception('product %s image processing failed', pk)
+	finally:
+		#worker的thread不會經過request_finished，需要自己關閉資料庫連線
+		connections.close_all()
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from apiapp.changes import compact
+
+
+class Command(BaseCommand):
+	help = '清除product的變更紀錄(apiapp_productchange) : 每個product只保留最新的一筆，並刪除超過保留天數的紀錄'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--days', type=int, default=settings.PRODUCT_CHANGES_RETENTION_DAYS,
+			help='保留的天數，預設為settings.PRODUCT_CHANGES_RETENTION_DAYS')
+		parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='使用的資料庫，預設為default')
+
+	def handle(self, *args, **options):
+		count = compact(timedelta(days=options['days']), options['database'])
+		self.stdout.write('Deleted %d product changes.' % count)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apiapp.images import backfill
+
+
+class Command(BaseCommand):
+	help = '為還沒有縮圖的product產生縮圖，包含加上縮圖功能之前上傳的圖片'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--all', action='store_true', help='重新產生所有product的縮圖，修改PRODUCT_THUMBNAIL_SIZES之後使用')
+
+	def handle(self, *args, **options):
+		count = backfill(reprocess=options['all'])
+		self.stdout.write('Processed images of %d products.' % count)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from apiapp.stats import rebuild
+
+
+class Command(BaseCommand):
+	help = '從apiapp_product重新計算每個類別的統計(apiapp_categorystats)'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='使用的資料庫，預設為default')
+
+	def handle(self, *args, **options):
+		count = rebuild(options['database'])
+		self.stdout.write('Rebuilt statistics for %d categories.' % count)
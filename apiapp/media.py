@@ -0,0 +1,131 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse , Http404 , HttpResponse , StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date , parse_http_date_safe
+
+from .storage import is_content_addressed
+
+
+#Product.image的檔名為內容的hash(apiapp/storage.py)，縮圖的檔名由原圖與尺寸決定，檔名不變時內容就不會改變
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=%d, immutable' % getattr(settings, 'MEDIA_CACHE_MAX_AGE', 365 * 24 * 60 * 60)
+#之前上傳的檔名不是內容的hash，client每次都以ETag、Last-Modified確認(304)
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+#原圖為ContentAddressedStorage的檔名時，縮圖 thumbnails/media/ab/abc_small_200.webp 的內容也不會改變
+THUMBNAIL_RE = re.compile(r'^thumbnails/(.+?)_[^/]+_\d+\.webp$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+	'''
+	回傳Range header的(start, end)，end包含在內
+	只支援單一範圍，沒有Range或無法解析(包含多個範圍)時回傳None，範圍超出檔案大小時raise ValueError
+	'''
+	match = RANGE_RE.match(header.strip()) if header else None
+	if match is None:
+		return None
+	start, end = match.groups()
+	if not start and not end:
+		return None
+	if not start:
+		#bytes=-500 : 最後500 bytes
+		start, end = max(size - int(end), 0), size - 1
+	else:
+		start, end = int(start), min(int(end), size - 1) if end else size - 1
+	if start >= size or start > end:
+		raise ValueError(header)
+	return start, end
+
+def cache_control(path):
+	'''
+	只有ContentAddressedStorage的原圖以及它的縮圖回傳immutable
+	'''
+	thumbnail = THUMBNAIL_RE.match(path)
+	if is_content_addressed(thumbnail.group(1) if thumbnail else path):
+		return IMMUTABLE_CACHE_CONTROL
+	return REVALIDATE_CACHE_CONTROL
+
+def read_range(path, start, length):
+	with open(path, 'rb') as file:
+		file.seek(start)
+		while length > 0:
+			chunk = file.read(min(CHUNK_SIZE, length))
+			if not chunk:
+				break
+			length -= len(chunk)
+			yield chunk
+
+def serve_media(request, path):
+	'''
+	取代django.conf.urls.static.static()，MEDIA_ROOT的檔案加上ETag、Last-Modified以及cache_control()的Cache-Control，
+	支援If-None-Match、If-Modified-Since(304)以及單一範圍的Range(206)
+
+	設定MEDIA_SENDFILE_HEADER時只回傳header，由web server傳送檔案內容 :
+	'X-Accel-Redirect'(nginx) 回傳 MEDIA_ACCEL_REDIRECT_PREFIX + path，'X-Sendfile'(Apache、lighttpd) 回傳檔案的絕對路徑
+	沒有設定時使用FileResponse，WSGI server有wsgi.file_wrapper時會以sendfile傳送
+	'''
+	try:
+		fullpath = safe_join(settings.MEDIA_ROOT, path)
+	except SuspiciousFileOperation:
+		raise Http404
+	try:
+		stat = os.stat(fullpath)
+	except (FileNotFoundError, NotADirectoryError):
+		raise Http404
+	if not os.path.isfile(fullpath):
+		raise Http404
+
+	etag = '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+	response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+	if response is None:
+		response = file_response(request, path, fullpath, stat, etag)
+	response['ETag'] = etag
+	response['Last-Modified'] = http_date(stat.st_mtime)
+	response['Cache-Control'] = cache_control(path)
+	return response
+
+def file_response(request, path, fullpath, stat, etag):
+	size = stat.st_size
+	content_type, encoding = mimetypes.guess_type(fullpath)
+	content_type = content_type or 'application/octet-stream'
+
+	sendfile_header = getattr(settings, 'MEDIA_SENDFILE_HEADER', None)
+	if sendfile_header == 'X-Accel-Redirect':
+		#nginx會自己處理Range，X-Accel-Redirect為URI，空白、中文等字元需要以%XX表示
+		response = HttpResponse(content_type=content_type)
+		response[sendfile_header] = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/') + quote(path)
+		return response
+	if sendfile_header:
+		response = HttpResponse(content_type=content_type)
+		response[sendfile_header] = fullpath
+		return response
+
+	#If-Range的ETag或日期與目前的檔案不同時，忽略Range回傳完整的檔案
+	if_range = request.META.get('HTTP_IF_RANGE')
+	byte_range = None
+	if if_range is None or if_range == etag or parse_http_date_safe(if_range) == int(stat.st_mtime):
+		try:
+			byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+		except ValueError:
+			response = HttpResponse(status=416)
+			response['Content-Range'] = 'bytes */%d' % size
+			return response
+
+	if byte_range is None:
+		response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+	else:
+		start, end = byte_range
+		response = StreamingHttpResponse(read_range(fullpath, start, end - start + 1), status=206, content_type=content_type)
+		response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+		response['Content-Length'] = str(end - start + 1)
+	response['Accept-Ranges'] = 'bytes'
+	if encoding:
+		response['Content-Encoding'] = encoding
+	return response
@@ -0,0 +1,257 @@
+import bisect
+import threading
+import time
+from contextlib import ExitStack , contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404 , HttpResponse
+
+
+#Prometheus client預設的duration bucket(秒)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+#Server-Timing與histogram的項目 : SQL、序列化、render、壓縮(apiapp/compression.py)，app為剩下的時間(view、permission、middleware...)
+PHASES = ('db' , 'serialize' , 'render' , 'compress')
+#其他method都記錄為OTHER，label的組合數量固定
+METHODS = {'GET' , 'HEAD' , 'POST' , 'PUT' , 'PATCH' , 'DELETE' , 'OPTIONS'}
+
+_local = threading.local()
+
+
+class Histogram:
+	'''
+	Prometheus的histogram，依label分開累計，expose()輸出text format
+	只保存在目前的process，多個worker process時每個process各自累計
+	'''
+	def __init__(self, name, help, buckets, labels=('route' , 'method')):
+		self.name = name
+		self.help = help
+		self.buckets = tuple(buckets)
+		self.labels = labels
+		self.values = {} #label的值 : [每個bucket的次數..., 總和, 次數]
+		self._lock = threading.Lock()
+
+	def observe(self, labels, value):
+		index = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			counts = self.values.get(labels)
+			if counts is None:
+				counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+			if index < len(self.buckets):
+				counts[index] += 1
+			counts[-2] += value
+			counts[-1] += 1
+
+	def expose(self):
+		lines = ['# HELP %s %s' % (self.name, self.help) , '# TYPE %s histogram' % self.name]
+		with self._lock:
+			values = sorted((labels, list(counts)) for labels, counts in self.values.items())
+		for labels, counts in values:
+			label = ','.join('%s="%s"' % (name, escape(value)) for name, value in zip(self.labels, labels))
+			cumulative = 0
+			for bucket, count in zip(self.buckets, counts):
+				cumulative += count
+				lines.append('%s_bucket{%s,le="%s"} %d' % (self.name, label, bucket, cumulative))
+			lines.append('%s_bucket{%s,le="+Inf"} %d' % (self.name, label, counts[-1]))
+			lines.append('%s_sum{%s} %s' % (self.name, label, repr(float(counts[-2]))))
+			lines.append('%s_count{%s} %d' % (self.name, label, counts[-1]))
+		return '\n'.join(lines)
+
+	def clear(self):
+		with self._lock:
+			self.values.clear()
+
+
+def escape(value):
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+	def __init__(self):
+		self.request_duration = Histogram('productapi_request_duration_seconds',
+			'Time spent handling the request, streaming bodies excluded.', DURATION_BUCKETS)
+		self.phase_duration = Histogram('productapi_request_phase_duration_seconds',
+			'Time spent per request in SQL (db), serializers (serialize), renderers (render) and compression (compress).',
+			DURATION_BUCKETS, labels=('route' , 'method' , 'phase'))
+		self.queries = Histogram('productapi_request_queries',
+			'SQL queries executed per request.', QUERY_BUCKETS)
+		self.response_size = Histogram('productapi_response_size_bytes',
+			'Response body size, streaming bodies excluded.', SIZE_BUCKETS)
+		self.histograms = [self.request_duration , self.phase_duration , self.queries , self.response_size]
+
+	def record(self, route, method, metrics, size):
+		labels = (route, method)
+		self.request_duration.observe(labels, metrics.total)
+		for phase in PHASES:
+			self.phase_duration.observe(labels + (phase,), metrics.durations[phase])
+		self.queries.observe(labels, metrics.queries)
+		if size is not None:
+			self.response_size.observe(labels, size)
+
+	def expose(self):
+		return '\n'.join(histogram.expose() for histogram in self.histograms) + '\n'
+
+	def clear(self):
+		for histogram in self.histograms:
+			histogram.clear()
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+	'''
+	一個request的SQL數量與每個階段的時間(秒)，由MetricsMiddleware建立並放在thread local
+	'''
+	def __init__(self):
+		self.start = time.perf_counter()
+		self.total = 0.0
+		self.queries = 0
+		self.durations = dict.fromkeys(PHASES, 0.0)
+
+	def execute(self, execute, sql, params, many, context):
+		#connection.execute_wrapper()，累計每個SQL的時間，之後fetch的時間由TimedCursor累計
+		cursor = context['cursor']
+		if not isinstance(cursor.cursor, TimedCursor):
+			cursor.cursor = TimedCursor(cursor.cursor, self)
+		start = time.perf_counter()
+		try:
+			return execute(sql, params, many, context)
+		finally:
+			self.durations['db'] += time.perf_counter() - start
+			self.queries += 1
+
+	def add(self, phase, seconds):
+		self.durations[phase] += seconds
+
+	def finish(self):
+		self.total = time.perf_counter() - self.start
+
+	def server_timing(self):
+		app = max(self.total - sum(self.durations.values()), 0)
+		parts = ['db;dur=%.2f;desc="%d queries"' % (self.durations['db'] * 1000, self.queries)]
+		parts.extend('%s;dur=%.2f' % (phase, self.durations[phase] * 1000) for phase in PHASES[1:])
+		parts.append('app;dur=%.2f' % (app * 1000))
+		parts.append('total;dur=%.2f' % (self.total * 1000))
+		return ', '.join(parts)
+
+
+class TimedCursor:
+	'''
+	DB-API cursor的proxy，fetchone()、fetchmany()、fetchall()的時間也算在db
+	SQLite的execute只取得第一筆，其餘的row在fetch時才讀取，只計算execute會把大部分的時間算在app
+	'''
+	def __init__(self, cursor, metrics):
+		self.cursor = cursor
+		self.metrics = metrics
+
+	def __getattr__(self, name):
+		return getattr(self.cursor, name)
+
+	def __iter__(self):
+		return iter(self.cursor)
+
+	def _fetch(self, fetch, *args):
+		start = time.perf_counter()
+		try:
+			return fetch(*args)
+		finally:
+			self.metrics.durations['db'] += time.perf_counter() - start
+
+	def fetchone(self):
+		return self._fetch(self.cursor.fetchone)
+
+	def fetchmany(self, *args):
+		return self._fetch(self.cursor.fetchmany, *args)
+
+	def fetchall(self):
+		return self._fetch(self.cursor.fetchall)
+
+
+def current():
+	'''
+	回傳目前request的RequestMetrics，沒有啟用MetricsMiddleware時回傳None
+	'''
+	return getattr(_local, 'metrics', None)
+
+@contextmanager
+def timed(phase):
+	'''
+	將這段程式的時間加到目前request的phase，其中執行的SQL只算在db，不重複計算
+	沒有啟用MetricsMiddleware時不做任何事
+	'''
+	metrics = current()
+	if metrics is None:
+		yield
+		return
+	start = time.perf_counter()
+	db = metrics.durations['db']
+	try:
+		yield
+	finally:
+		metrics.add(phase, time.perf_counter() - start - (metrics.durations['db'] - db))
+
+
+class MetricsMiddleware:
+	'''
+	記錄每個request的SQL數量與時間、序列化、render的時間以及response大小
+	以Server-Timing header回傳，並累計到registry的histogram(/metrics)
+	settings.METRICS_ENABLED為False時不使用(MiddlewareNotUsed)，沒有任何成本
+	'''
+	def __init__(self, get_response):
+		if not getattr(settings, 'METRICS_ENABLED', False):
+			raise MiddlewareNotUsed
+		self.get_response = get_response
+		self.server_timing = getattr(settings, 'METRICS_SERVER_TIMING', True)
+
+	def __call__(self, request):
+		metrics = _local.metrics = RequestMetrics()
+		try:
+			with ExitStack() as stack:
+				for connection in connections.all():
+					stack.enter_context(connection.execute_wrapper(metrics.execute))
+				response = self.get_response(request)
+		finally:
+			_local.metrics = None
+		metrics.finish()
+
+		match = request.resolver_match
+		route = match.route if match is not None else 'unmatched'
+		method = request.method if request.method in METHODS else 'OTHER'
+		size = None if response.streaming else len(response.content)
+		registry.record(route, method, metrics, size)
+		if self.server_timing:
+			response['Server-Timing'] = metrics.server_timing()
+		return response
+
+	def process_template_response(self, request, response):
+		metrics = current()
+		if metrics is not None:
+			#process_template_response()之後Django才render，render()結束時停止計時，
+			#之後其他middleware的時間不算在render，render中執行的SQL只算在db
+			start, db = time.perf_counter(), metrics.durations['db']
+			response.add_post_render_callback(
+				lambda response: metrics.add('render', time.perf_counter() - start - (metrics.durations['db'] - db)))
+		return response
+
+
+class TimedDataMixin:
+	'''
+	serializer的.data(to_representation)算在目前request的serialize
+	'''
+	@property
+	def data(self):
+		with timed('serialize'):
+			return super().data
+
+
+def metrics_view(request):
+	'''
+	以Prometheus text format輸出目前process的histogram，METRICS_ENABLED為False時回傳404
+	'''
+	if not getattr(settings, 'METRICS_ENABLED', False):
+		raise Http404
+	return HttpResponse(registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
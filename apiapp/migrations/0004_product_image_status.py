@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0003_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_status',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:00
+
+import apiapp.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0004_product_image_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, storage=apiapp.storage.ContentAddressedStorage(), upload_to='media'),
+        ),
+    ]
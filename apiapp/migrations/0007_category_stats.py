@@ -0,0 +1,26 @@
+# Generated by Django 2.2.28 on 2026-10-18 08:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0006_product_price_stock_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='apiapp.Category')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('total_stock', models.BigIntegerField(default=0)),
+                ('total_value', models.BigIntegerField(default=0)),
+                ('price_sum', models.BigIntegerField(default=0)),
+                ('min_price', models.PositiveIntegerField(null=True)),
+                ('max_price', models.PositiveIntegerField(null=True)),
+            ],
+        ),
+    ]
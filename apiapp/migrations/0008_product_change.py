@@ -0,0 +1,26 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apiapp', '0007_category_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.IntegerField(null=True)),
+                ('action', models.CharField(max_length=10)),
+                ('changed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productchange',
+            index=models.Index(fields=['product_id', 'id'], name='productchange_product_id_idx'),
+        ),
+    ]
@@ -0,0 +1,181 @@
+from django.db.models import Count , Max
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from .cache import LIST_KEY
+from .conditional import make_validators , not_modified , response_validators , set_validators
+from .metrics import timed
+
+
+class ReadListModelMixin:
+	'''
+	取代mixins.ListModelMixin，GET時使用read_serializer_class而不是ModelSerializer
+	'''
+	read_serializer_class = None
+	
+	def get_read_serializer(self):
+		return self.read_serializer_class(self.get_serializer_context())
+	
+	def list(self, request, *args, **kwargs):
+		serializer = self.get_read_serializer()
+		rows = serializer.get_rows(self.filter_queryset(self.get_queryset()))
+		
+		page = self.paginate_queryset(rows)
+		if page is not None:
+			with timed('serialize'):
+				data = serializer.many(page)
+			return self.get_paginated_response(data)
+		
+		with timed('serialize'):
+			data = serializer.many(rows)
+		return Response(data)
+
+
+class ReadRetrieveModelMixin(ReadListModelMixin):
+	'''
+	取代mixins.RetrieveModelMixin，GET時使用read_serializer_class而不是ModelSerializer
+	'''
+	def retrieve(self, request, *args, **kwargs):
+		serializer = self.get_read_serializer()
+		rows = serializer.get_rows(self.filter_queryset(self.get_queryset()))
+		
+		lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+		row = get_object_or_404(rows, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+		
+		#GET屬於SAFE_METHODS，apiapp/permissions.py的has_object_permission不會讀取row的內容
+		self.check_object_permissions(request, row)
+		
+		with timed('serialize'):
+			data = serializer.to_representation(row)
+		return Response(data)
+
+
+class SparseFieldsMixin:
+	'''
+	查詢參數 ?fields=id,name,price 只回傳指定的欄位，read serializer也只SELECT這些欄位的column
+	'''
+	fields_query_param = 'fields'
+	
+	def get_read_fields(self):
+		#沒有fields參數或為空字串時回傳None，輸出所有欄位
+		value = self.request.query_params.get(self.fields_query_param , '')
+		fields = [field.strip() for field in value.split(',') if field.strip()]
+		return fields or None
+	
+	def get_read_ordering(self):
+		#cursor分頁以第一個排序欄位的值作為position，fields沒有要求時也需要SELECT
+		for backend in self.filter_backends:
+			if hasattr(backend, 'get_ordering'):
+				try:
+					return backend().get_ordering(self.request, None, self)
+				except ValueError:
+					#錯誤的排序參數由filter_queryset()回傳400
+					return ()
+		return ()
+	
+	def get_read_serializer(self):
+		return self.read_serializer_class(self.get_serializer_context(), 
+			fields=self.get_read_fields(), ordering=self.get_read_ordering())
+
+
+class ConditionalListMixin:
+	'''
+	list的ETag由這一頁的id、updated_at以及是否有前後頁決定，
+	If-None-Match符合時只執行一個讀取這一頁id、updated_at的query就回傳304，不序列化資料
+	只讀取一頁，成本與filter後的product數量無關；沒有分頁時使用整個queryset的count + max(updated_at)
+	list不回傳Last-Modified : 刪除資料時max(updated_at)不會改變，If-Modified-Since會誤判為沒有修改
+	'''
+	def get_list_validators(self, request, queryset):
+		page = None
+		if self.paginator is not None:
+			#另外建立一個paginator，不影響list()時self.paginator的狀態
+			paginator = type(self.paginator)()
+			fields = ['id' , 'updated_at']
+			if hasattr(paginator, 'get_ordering'):
+				#cursor分頁需要排序欄位的值作為next、previous的position
+				fields.extend(field.lstrip('-') for field in paginator.get_ordering(request, queryset, self))
+			page = paginator.paginate_queryset(queryset.values(*fields), request, view=self)
+		if page is None:
+			aggregate = queryset.aggregate(count=Count('id') , last_modified=Max('updated_at'))
+			last_modified = aggregate['last_modified']
+			return make_validators(request, aggregate['count'], last_modified.isoformat() if last_modified else '')
+		parts = [paginator.get_next_link() , paginator.get_previous_link()]
+		parts.extend('%s@%s' % (row['id'], row['updated_at'].isoformat()) for row in page)
+		return make_validators(request, *parts)
+	
+	def list(self, request, *args, **kwargs):
+		queryset = self.filter_queryset(self.get_queryset())
+		etag, last_modified = self.get_list_validators(request, queryset)
+		
+		response = not_modified(request, etag, last_modified)
+		if response is None:
+			response = set_validators(super().list(request, *args, **kwargs), etag, last_modified)
+		return response
+
+
+class ConditionalRetrieveMixin:
+	'''
+	detail的ETag、Last-Modified由該object的updated_at決定，304時不讀取也不序列化整筆資料
+	'''
+	def retrieve(self, request, *args, **kwargs):
+		lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+		updated_at = self.filter_queryset(self.get_queryset()).filter(
+			**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).values_list('updated_at' , flat=True).first()
+		if updated_at is None:
+			#不存在的object交給retrieve()回傳404
+			return super().retrieve(request, *args, **kwargs)
+		
+		etag, last_modified = make_validators(request, last_modified=updated_at)
+		response = not_modified(request, etag, last_modified)
+		if response is None:
+			response = set_validators(super().retrieve(request, *args, **kwargs), etag, last_modified)
+		return response
+
+
+class CachedResponseMixin:
+	'''
+	GET的response存放在response_cache(apiapp/cache.py)，cache中有資料時不查詢資料庫也不序列化
+	cache中的response帶有ConditionalRetrieveMixin、ConditionalListMixin的ETag(detail另外有Last-Modified)，同樣可以回傳304
+	'''
+	response_cache = None
+	
+	def cached_response(self, request, key):
+		#回傳cache中的response，沒有時回傳None，response在finalize_response()時存入cache
+		entry = self.response_cache.entry(request, key)
+		if entry is not None:
+			response = entry.load()
+			if response is not None:
+				return not_modified(request, *response_validators(response)) or entry.encode(response)
+		self.cache_entry = entry
+		return None
+	
+	def finalize_response(self, request, response, *args, **kwargs):
+		response = super().finalize_response(request, response, *args, **kwargs)
+		entry = getattr(self, 'cache_entry', None)
+		if entry is not None and response.status_code == 200:
+			response = entry.save(response)
+		return response
+
+
+class CachedRetrieveMixin(CachedResponseMixin):
+	'''
+	以object的pk作為key cache detail的response
+	'''
+	def retrieve(self, request, *args, **kwargs):
+		lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+		response = self.cached_response(request, self.kwargs[lookup_url_kwarg])
+		if response is None:
+			response = super().retrieve(request, *args, **kwargs)
+		return response
+
+
+class CachedListMixin(CachedResponseMixin):
+	'''
+	cache整個list的response，每一頁、每一組查詢參數各有一個entry
+	任何一個object改變時以LIST_KEY invalidate，所有頁一起失效
+	'''
+	def list(self, request, *args, **kwargs):
+		response = self.cached_response(request, LIST_KEY)
+		if response is None:
+			response = super().list(request, *args, **kwargs)
+		return response
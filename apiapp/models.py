@@ -1,22 +1,80 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from .storage import ContentAddressedStorage
+
 #商品類別
 class Category(models.Model):
-	name = models.CharField(max_length=50); #類別名稱
+	name = models.CharField(max_length=50 , unique=True); #類別名稱，unique index讓?category=的filter不需要scan整個table
+	updated_at = models.DateTimeField(auto_now = True) #最後修改時間，作為ETag、Last-Modified
 
 	def __str__(self):
 		return self.name
 
 #商品資訊
 class Product(models.Model):
-	category = models.ForeignKey(Category , on_delete = models.CASCADE) #分類
+	#image_status的值
+	IMAGE_PENDING = 'pending' #等待worker產生縮圖
+	IMAGE_READY = 'ready' #縮圖已經產生
+	IMAGE_FAILED = 'failed' #圖片無法解碼或超過尺寸上限
+	
+	category = models.ForeignKey(Category , on_delete = models.CASCADE , db_index=False) #分類，index由Meta.indexes的(category, id)提供
 	name = models.CharField(max_length = 50) #產品名稱
 	description = models.TextField(default = '尚未有產品說明') #產品敘述
-	image = models.ImageField(upload_to = 'media' , blank = True) #圖片，若資料夾中已經有相同名稱的檔案，storage system會自動修改為unique的名稱
+	image = models.ImageField(upload_to = 'media' , blank = True , storage = ContentAddressedStorage()) #圖片，檔名為內容的hash，相同的圖片只存放一次
+	image_status = models.CharField(max_length = 10 , blank = True , default = '') #縮圖的處理狀態(apiapp/images.py)，沒有圖片時為空字串
 	stock = models.PositiveIntegerField(default = 0) #庫存
 	price = models.PositiveIntegerField(default = 0) #價錢
-	owner = models.ForeignKey(User , on_delete=models.CASCADE , related_name='products')
+	owner = models.ForeignKey(User , on_delete=models.CASCADE , related_name='products' , db_index=False) #index由Meta.indexes的(owner, id)提供
+	updated_at = models.DateTimeField(auto_now = True) #最後修改時間，作為ETag、Last-Modified。使用update()修改時需要一起更新
+
+	class Meta:
+		#ProductList以category、owner filter後再依id排序、分頁，composite index可以直接依序讀出需要的資料
+		#price_min、price_max與ordering=price使用(price, id)，in_stock使用stock > 0、stock = 0的partial index
+		indexes = [
+			models.Index(fields=['category' , 'id'] , name='product_category_id_idx'),
+			models.Index(fields=['owner' , 'id'] , name='product_owner_id_idx'),
+			models.Index(fields=['price' , 'id'] , name='product_price_id_idx'),
+			models.Index(fields=['category' , 'price' , 'id'] , name='product_category_price_id_idx'),
+			models.Index(fields=['id'] , name='product_in_stock_id_idx' , condition=models.Q(stock__gt=0)),
+			models.Index(fields=['price' , 'id'] , name='product_in_stock_price_id_idx' , condition=models.Q(stock__gt=0)),
+			models.Index(fields=['id'] , name='product_out_of_stock_id_idx' , condition=models.Q(stock=0)),
+			]
+
+	def __str__(self):
+		return self.name
+
+#每個類別的product統計，由apiapp/stats.py的SQLite trigger在product新增、刪除、修改時更新
+#manage.py rebuild_category_stats可以從apiapp_product重新計算
+class CategoryStats(models.Model):
+	category = models.OneToOneField(Category , on_delete = models.CASCADE , primary_key = True , related_name = 'stats')
+	product_count = models.PositiveIntegerField(default = 0) #product數量
+	total_stock = models.BigIntegerField(default = 0) #庫存總和
+	total_value = models.BigIntegerField(default = 0) #庫存 x 價錢的總和
+	price_sum = models.BigIntegerField(default = 0) #價錢總和，平均價錢為price_sum / product_count
+	min_price = models.PositiveIntegerField(null = True) #沒有product時為NULL
+	max_price = models.PositiveIntegerField(null = True)
+
+	def __str__(self):
+		return str(self.category)
+
+#product的變更紀錄，由apiapp/changes.py的SQLite trigger(其他資料庫為apiapp/signals.py)在product新增、修改、刪除(包含Category、User刪除時的cascade)時寫入
+#id依照commit的順序遞增，/apis/products/changes/?since=<id>只回傳之後的變更，manage.py compact_product_changes定期清除舊的紀錄
+class ProductChange(models.Model):
+	CREATED = 'created'
+	UPDATED = 'updated'
+	DELETED = 'deleted' #tombstone
+	COMPACTED = 'compacted' #compaction時保留的最後一筆，since小於它的cursor已經無法取得完整的變更
+	
+	product_id = models.IntegerField(null = True) #product刪除後仍然保留，不使用ForeignKey；COMPACTED時為NULL
+	action = models.CharField(max_length = 10)
+	changed_at = models.DateTimeField() #由trigger或signal寫入(UTC)，compaction以這個時間判斷是否超過保留期間
+
+	class Meta:
+		#compaction找出每個product最新的一筆變更
+		indexes = [
+			models.Index(fields=['product_id' , 'id'] , name='productchange_product_id_idx'),
+			]
 
 	def __str__(self):
-		return self.name
\ No newline at end of file
+		return '%s %s' % (self.action, self.product_id)
@@ -0,0 +1,25 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination , PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+	'''
+	所有list view預設的分頁(settings.REST_FRAMEWORK的DEFAULT_PAGINATION_CLASS)
+	以id為key的keyset(cursor)分頁，查詢為 WHERE id > 上一頁最後的id ORDER BY id LIMIT n，
+	不使用OFFSET，所以第10000頁與第1頁的成本相同。
+	cursor為REST framework產生的base64字串，client端只需照著next、previous的URL繼續取得資料。
+	view有ProductFilterBackend(apiapp/filters.py)時使用它的排序，例如ordering=price時以price作為key
+	'''
+	ordering = 'id' #id為unique，不會產生offset
+	page_size_query_param = 'page_size'
+	max_page_size = settings.PAGINATION_MAX_PAGE_SIZE #page_size的上限，避免client一次要求過多資料
+
+
+class SearchPagination(PageNumberPagination):
+	'''
+	搜尋結果依照相關程度排序，rank不是unique，所以使用page number而不是cursor分頁
+	client通常只會看前幾頁，OFFSET的成本不大
+	'''
+	page_size = 20
+	page_size_query_param = 'page_size'
+	max_page_size = min(100 , settings.PAGINATION_MAX_PAGE_SIZE)
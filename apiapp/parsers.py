@@ -0,0 +1,39 @@
+import io
+import re
+
+try:
+	import orjson
+except ImportError: #沒有安裝orjson時使用標準的json module
+	orjson = None
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .renderers import FastJSONRenderer
+
+
+#orjson將超過64 bit的整數轉為float，json module則保留為int，19位以上的數字交給JSONParser
+#(字串中的數字也會符合，只是改用JSONParser，結果相同)
+LARGE_NUMBER_RE = re.compile(rb'\d{19}')
+
+
+class FastJSONParser(JSONParser):
+	'''
+	以orjson解析request body，沒有安裝orjson、charset不是UTF-8或有超過64 bit的整數時使用JSONParser
+	與STRICT_JSON的JSONParser相同，NaN、Infinity視為錯誤
+	'''
+	renderer_class = FastJSONRenderer
+
+	def parse(self, stream, media_type=None, parser_context=None):
+		parser_context = parser_context or {}
+		encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+		if orjson is None or not self.strict or encoding.lower().replace('-', '') != 'utf8':
+			return super().parse(stream, media_type, parser_context)
+		body = stream.read()
+		if LARGE_NUMBER_RE.search(body):
+			return super().parse(io.BytesIO(body), media_type, parser_context)
+		try:
+			return orjson.loads(body)
+		except orjson.JSONDecodeError as exc:
+			raise ParseError('JSON parse error - %s' % str(exc))
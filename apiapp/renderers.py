@@ -0,0 +1,48 @@
+import json
+
+try:
+	import orjson
+except ImportError: #沒有安裝orjson時使用標準的json module
+	orjson = None
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+_encoder = JSONEncoder()
+#datetime、date、time交給REST framework的JSONEncoder，輸出的格式(毫秒、Z)與JSONRenderer相同
+#沒有使用OPT_NON_STR_KEYS(慢約30%)，key不是字串的dict很少見，由json module處理
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME if orjson is not None else 0
+
+
+def dumps(data):
+	'''
+	回傳與JSONRenderer相同的compact JSON bytes，中文直接以UTF-8輸出，不跳脫為\\uXXXX
+	有安裝orjson時使用orjson，orjson無法處理的資料(超過64 bit的整數、key不是字串的dict)改用json module
+	'''
+	if orjson is not None:
+		try:
+			ret = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+		except orjson.JSONEncodeError:
+			pass
+		else:
+			#與JSONRenderer相同跳脫U+2028、U+2029，輸出是JavaScript的子集合
+			if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+				ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+			return ret
+	ret = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+	return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode('utf-8')
+
+
+class FastJSONRenderer(JSONRenderer):
+	'''
+	以dumps()(orjson)render，輸出與JSONRenderer完全相同
+	要求indent(browsable API、?format=json; indent=4)或改變了UNICODE_JSON、COMPACT_JSON、STRICT_JSON時使用JSONRenderer
+	'''
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		if data is None:
+			return b''
+		if (self.ensure_ascii or not self.compact or not self.strict or
+				self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+			return super().render(data, accepted_media_type, renderer_context)
+		return dumps(data)
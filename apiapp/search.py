@@ -0,0 +1,89 @@
+import logging
+
+from django.db import connections , DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.db.utils import OperationalError
+
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'apiapp_product_search'
+MIN_TERM_LENGTH = 3 #trigram tokenizer只能以MATCH搜尋3個字以上的詞
+
+#SQLite FTS5的trigram index，content為apiapp_product，不重複存放name、description
+#由trigger在INSERT、DELETE以及修改name、description時更新，bulk_create、bulk_update、update()也會同步
+SQLITE_SCHEMA = [
+	'''CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+		name, description, content='apiapp_product', content_rowid='id', tokenize='trigram')''',
+	'''CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON apiapp_product BEGIN
+		INSERT INTO {table}(rowid, name, description) VALUES (new.id, new.name, new.description);
+	END''',
+	'''CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON apiapp_product BEGIN
+		INSERT INTO {table}({table}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+	END''',
+	'''CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF name, description ON apiapp_product BEGIN
+		INSERT INTO {table}({table}, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+		INSERT INTO {table}(rowid, name, description) VALUES (new.id, new.name, new.description);
+	END''',
+	]
+TRIGGERS = ['%s_insert' % TABLE , '%s_delete' % TABLE , '%s_update' % TABLE]
+
+
+def install(using=DEFAULT_DB_ALIAS, **kwargs):
+	'''
+	post_migrate時建立FTS5 table與trigger(apiapp/apps.py)
+	SQLite修改apiapp_product的欄位時會重建table，trigger會跟著被刪除，所以每次migrate後都要檢查
+	trigger原本不存在時以rebuild重新建立整個index
+	'''
+	connection = connections[using]
+	if connection.vendor != 'sqlite':
+		logger.info('full-text search index requires SQLite FTS5, %s uses icontains', connection.vendor)
+		return
+	with connection.cursor() as cursor:
+		cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)", TRIGGERS)
+		existing = {row[0] for row in cursor.fetchall()}
+		try:
+			for sql in SQLITE_SCHEMA:
+				cursor.execute(sql.format(table=TABLE))
+		except OperationalError as e:
+			#SQLite 3.34以前沒有trigram tokenizer，search_products()改用icontains
+			logger.warning('full-text search index is not available: %s', e)
+			return
+		if existing != set(TRIGGERS):
+			cursor.execute("INSERT INTO {table}({table}) VALUES ('rebuild')".format(table=TABLE))
+
+#{(alias, database NAME): FTS5 table是否存在}，只記錄存在的結果，之後的request不需要再查詢sqlite_master
+_available = {}
+
+def available(connection):
+	if connection.vendor != 'sqlite':
+		return False
+	key = (connection.alias, connection.settings_dict['NAME'])
+	if key not in _available:
+		if TABLE not in connection.introspection.table_names():
+			return False
+		_available[key] = True
+	return True
+
+def match_expression(terms):
+	#每個詞以雙引號包起來作為FTS5的string，使用者輸入的AND、OR、*等等不會被當作語法
+	return ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+
+def search_products(queryset, q):
+	'''
+	回傳name或description包含q中每一個詞的product，依照相關程度(bm25)排序
+	有任何一個詞少於3個字，或資料庫沒有FTS5 index時，使用icontains依照id排序
+	'''
+	terms = q.split()
+	connection = connections[queryset.db]
+	if all(len(term) >= MIN_TERM_LENGTH for term in terms) and available(connection):
+		return queryset.extra(
+			tables=[TABLE],
+			where=['%s.rowid = apiapp_product.id' % TABLE , '%s MATCH %%s' % TABLE],
+			params=[match_expression(terms)],
+			select={'rank': '%s.rank' % TABLE},
+			order_by=['rank' , 'id'],
+			)
+	for term in terms:
+		queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+	return queryset.order_by('id')
@@ -1,22 +1,310 @@
-from .models import Category,Product
+from .models import Category,Product,ProductChange
+from .changes import record
+from .images import MAX_UPLOAD_SIZE , thumbnail_names , thumbnail_storage
+from .metrics import TimedDataMixin
+from .signals import invalidate_products
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.utils import timezone
+from django.utils.http import urlencode
 
-class UserSerializer(serializers.ModelSerializer):
-	products = serializers.PrimaryKeyRelatedField(many=True, queryset=Product.objects.all())
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+	'''
+	與PrimaryKeyRelatedField相同，但BulkListSerializer驗證多筆資料時，
+	會先以一個IN query取得所有需要的object，不需要每筆資料各查詢一次
+	'''
+	preloaded = None
+	
+	def to_pk(self, data):
+		#將client傳來的值轉換為pk，無法轉換時回傳None
+		if isinstance(data, bool):
+			return None
+		try:
+			#使用self.queryset而不是get_queryset()，避免每一筆資料都複製一次queryset
+			return self.queryset.model._meta.pk.to_python(data)
+		except ValidationError:
+			return None
+	
+	def preload(self, values):
+		pks = {pk for pk in map(self.to_pk, values) if pk is not None}
+		self.preloaded = self.get_queryset().in_bulk(pks)
+	
+	def to_internal_value(self, data):
+		if self.preloaded is None:
+			return super().to_internal_value(data)
+		pk = self.to_pk(data)
+		if pk is None:
+			self.fail('incorrect_type', data_type=type(data).__name__)
+		try:
+			return self.preloaded[pk]
+		except (KeyError, TypeError):
+			self.fail('does_not_exist', pk_value=data)
+
+	@classmethod
+	def many_init(cls, *args, **kwargs):
+		list_kwargs = {'child_relation': cls(*args, **kwargs)}
+		list_kwargs.update((key, value) for key, value in kwargs.items() if key in MANY_RELATION_KWARGS)
+		return BulkManyRelatedField(**list_kwargs)
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+	'''
+	many=True的BulkPrimaryKeyRelatedField，驗證時以一個IN query取得所有pk，不需要每個pk各查詢一次
+	'''
+	def to_internal_value(self, data):
+		if isinstance(data, str) or not hasattr(data, '__iter__'):
+			self.fail('not_a_list', input_type=type(data).__name__)
+		data = list(data)
+		self.child_relation.preload(data)
+		try:
+			return super().to_internal_value(data)
+		finally:
+			self.child_relation.preloaded = None
+
+class BulkListSerializer(TimedDataMixin , serializers.ListSerializer):
+	'''
+	many=True驗證時，先為child的BulkPrimaryKeyRelatedField一次取得所有相關的object
+	'''
+	def to_internal_value(self, data):
+		fields = [
+			field for field in self.child._writable_fields
+			if isinstance(field, BulkPrimaryKeyRelatedField)
+			]
+		items = [item for item in data if isinstance(item, dict)] if isinstance(data, list) else []
+		for field in fields:
+			field.preload(item[field.field_name] for item in items if field.field_name in item)
+		try:
+			return super().to_internal_value(data)
+		finally:
+			for field in fields:
+				field.preloaded = None
+
+def prefetch_products(users, limit):
+	'''
+	以一個query取得每個user的前limit個product id，存放在user._product_ids
+	從user開始以correlated subquery讀取(owner, id)的index，每個user只讀取limit筆，與user擁有的product數量無關
+	'''
+	users = [user for user in users if not hasattr(user, '_product_ids')]
+	for user in users:
+		user._product_ids = []
+	if not users:
+		return
+	by_pk = {user.pk: user for user in users}
+	sql = '''SELECT u.id, p.id FROM {user} u, {product} p
+		WHERE u.id IN ({pks}) AND p.id IN (SELECT id FROM {product} WHERE owner_id = u.id ORDER BY id LIMIT %s)
+		ORDER BY u.id, p.id'''.format(user=User._meta.db_table, product=Product._meta.db_table, pks=', '.join(['%s'] * len(by_pk)))
+	with connections[Product.objects.db].cursor() as cursor:
+		cursor.execute(sql, list(by_pk) + [limit])
+		for owner_id, pk in cursor.fetchall():
+			by_pk[owner_id]._product_ids.append(pk)
+
+class ProductPreviewField(BulkManyRelatedField):
+	'''
+	寫入時與PrimaryKeyRelatedField(many=True)相同，讀取時只回傳前PREVIEW_SIZE個product id
+	'''
+	def get_attribute(self, instance):
+		if not hasattr(instance, '_product_ids'):
+			#UserDetail、POST的response沒有經過UserListSerializer，只查詢這個user的product
+			instance._product_ids = list(instance.products.order_by('id').values_list('id' , flat=True)[:self.parent.PREVIEW_SIZE])
+		return instance._product_ids
+
+	def to_representation(self, value):
+		return list(value)
+
+class UserListSerializer(TimedDataMixin , serializers.ListSerializer):
+	'''
+	序列化多個user時，先以prefetch_products()一次取得所有user的product id
+	'''
+	def to_representation(self, data):
+		users = list(data.all() if hasattr(data, 'all') else data)
+		prefetch_products(users, self.child.PREVIEW_SIZE)
+		return super().to_representation(users)
+
+class UserSerializer(TimedDataMixin , serializers.ModelSerializer):
+	'''
+	products只列出前PREVIEW_SIZE個product id，product_count為全部的數量，完整的list由products_url分頁取得
+	'''
+	PREVIEW_SIZE = 100
+	products = ProductPreviewField(child_relation=BulkPrimaryKeyRelatedField(queryset=Product.objects.all()), required=False)
+	product_count = serializers.SerializerMethodField()
+	products_url = serializers.SerializerMethodField()
 	class Meta:
 		model = User
-		fields = ['id', 'username', 'is_staff' , 'products']
+		fields = ['id', 'username', 'is_staff' , 'products' , 'product_count' , 'products_url']
+		list_serializer_class = UserListSerializer
+
+	def get_product_count(self, instance):
+		#UserList、UserDetail的queryset以subquery annotate(apiapp/views.py)，POST的response才需要另外查詢
+		if not hasattr(instance, 'product_count'):
+			instance.product_count = instance.products.count()
+		return instance.product_count
+
+	def get_products_url(self, instance):
+		url = '/apis/products/?' + urlencode({'username': instance.username})
+		request = self.context.get('request')
+		return request.build_absolute_uri(url) if request else url
 
-class CategorySerializer(serializers.ModelSerializer):
+	def create(self, validated_data):
+		products = validated_data.pop('products' , [])
+		user = super().create(validated_data)
+		if products:
+			#與RelatedManager.add()相同只需要一個UPDATE，另外更新updated_at並清除product的cache
+			pks = [product.pk for product in products]
+			Product.objects.filter(pk__in=pks).update(owner=user, updated_at=timezone.now())
+			invalidate_products(pks)
+			record(pks, ProductChange.UPDATED)
+		return user
+
+class CategorySerializer(TimedDataMixin , serializers.ModelSerializer):
 	class Meta:
 		model = Category
 		fields = ['id' , 'name']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedDataMixin , serializers.ModelSerializer):
+	category = BulkPrimaryKeyRelatedField(queryset=Category.objects.all())
 	owner = serializers.ReadOnlyField(source='owner.username')
+	thumbnails = serializers.SerializerMethodField() #縮圖的absolute URL，worker還沒有產生完成時為None
 	class Meta:
 		model = Product
-		fields = ['id' , 'category' , 'name' , 'description' , 'image' , 'stock' , 'price' , 'owner']
-		
\ No newline at end of file
+		fields = ['id' , 'category' , 'name' , 'description' , 'image' , 'thumbnails' , 'stock' , 'price' , 'owner']
+		list_serializer_class = BulkListSerializer #ProductBulk以many=True驗證時，category只需要一個query
+
+	def validate_image(self, image):
+		#只檢查檔案大小，解碼與pixel數的檢查由apiapp/images.py的worker進行
+		if image and image.size > MAX_UPLOAD_SIZE:
+			raise serializers.ValidationError('Ensure this file is no larger than %d bytes.' % MAX_UPLOAD_SIZE)
+		return image
+	
+	def get_thumbnails(self, product):
+		names = thumbnail_names(product.image.name, product.image_status)
+		if names is None:
+			return None
+		#與image相同，有request時為absolute URL
+		request = self.context.get('request' , None)
+		urls = {variant: thumbnail_storage.url(name) for variant, name in names.items()}
+		if request is not None:
+			urls = {variant: request.build_absolute_uri(url) for variant, url in urls.items()}
+		return urls
+
+
+
+class StockReservationSerializer(serializers.Serializer):
+	#ProductStock扣除的數量，上限為PositiveIntegerField的範圍
+	quantity = serializers.IntegerField(min_value=1 , max_value=2147483647)
+
+class BulkStockReservationSerializer(StockReservationSerializer):
+	#ProductStockBatch的每一筆資料
+	id = serializers.IntegerField(max_value=2 ** 63 - 1) #超過64 bit的整數SQLite無法bind
+
+
+class CategoryReadSerializer:
+	'''
+	GET專用的快速序列化，以values_list()取得tuple後直接組成dict，輸出與CategorySerializer相同
+	'''
+	columns = ('id' , 'name')
+	
+	def __init__(self, context=None):
+		self.context = context or {}
+	
+	def get_rows(self, queryset):
+		#named=True讓cursor分頁可以用row.id取得position
+		return queryset.values_list(*self.columns, named=True)
+	
+	def to_representation(self, row):
+		id, name = row
+		return {'id': id , 'name': name}
+	
+	def many(self, rows):
+		to_representation = self.to_representation
+		return [to_representation(row) for row in rows]
+
+
+class ProductReadSerializer(CategoryReadSerializer):
+	'''
+	GET專用的快速序列化，輸出與ProductSerializer相同(image、thumbnails同樣為absolute URL)
+	fields指定時(?fields=id,name,price)只SELECT需要的column並只輸出這些欄位，
+	沒有要求description時就不會從資料庫讀取這個沒有長度上限的TextField
+	'''
+	columns = ('id' , 'category_id' , 'name' , 'description' , 'image' , 'image_status' , 'stock' , 'price' , 'owner__username')
+	#每個欄位需要的column
+	field_columns = {
+		'id': ('id' ,) ,
+		'category': ('category_id' ,) ,
+		'name': ('name' ,) ,
+		'description': ('description' ,) ,
+		'image': ('image' ,) ,
+		'thumbnails': ('image' , 'image_status') ,
+		'stock': ('stock' ,) ,
+		'price': ('price' ,) ,
+		'owner': ('owner__username' ,)
+		}
+	
+	def __init__(self, context=None, fields=None, ordering=()):
+		super().__init__(context)
+		self.request = self.context.get('request' , None)
+		self.storage = Product._meta.get_field('image').storage
+		self.fields = None
+		if fields is not None:
+			invalid = [field for field in fields if field not in self.field_columns]
+			if invalid:
+				raise serializers.ValidationError({'fields': ['Invalid field "%s".' % field for field in invalid]})
+			#依照ProductSerializer的欄位順序輸出，cursor分頁需要row.id以及排序欄位，所以一定會被SELECT
+			self.fields = [field for field in self.field_columns if field in fields]
+			needed = {column for field in self.fields for column in self.field_columns[field]}
+			needed.update(field.lstrip('-') for field in ordering)
+			self.columns = tuple(column for column in self.columns if column == 'id' or column in needed)
+	
+	def image_url(self, name):
+		#與REST framework的ImageField.to_representation相同
+		if not name:
+			return None
+		url = self.storage.url(name)
+		if self.request is not None:
+			return self.request.build_absolute_uri(url)
+		return url
+	
+	def thumbnail_urls(self, name, status):
+		#與ProductSerializer.get_thumbnails相同
+		names = thumbnail_names(name, status)
+		if names is None:
+			return None
+		urls = {variant: thumbnail_storage.url(name) for variant, name in names.items()}
+		if self.request is not None:
+			urls = {variant: self.request.build_absolute_uri(url) for variant, url in urls.items()}
+		return urls
+	
+	def instance_row(self, instance):
+		#已經在記憶體中的Product instance(例如bulk_create之後)，不需要再查詢一次資料庫
+		return (instance.id , instance.category_id , instance.name , instance.description , 
+			instance.image.name , instance.image_status , instance.stock , instance.price , instance.owner.username)
+	
+	def to_representation(self, row):
+		if self.fields is not None:
+			return self.sparse_representation(row)
+		id, category, name, description, image, image_status, stock, price, owner = row
+		return {
+			'id': id ,
+			'category': category ,
+			'name': name ,
+			'description': description ,
+			'image': self.image_url(image) ,
+			'thumbnails': self.thumbnail_urls(image, image_status) ,
+			'stock': stock ,
+			'price': price ,
+			'owner': owner
+			}
+	
+	def sparse_representation(self, row):
+		values = dict(zip(self.columns, row))
+		data = {}
+		for field in self.fields:
+			if field == 'image':
+				data[field] = self.image_url(values['image'])
+			elif field == 'thumbnails':
+				data[field] = self.thumbnail_urls(values['image'], values['image_status'])
+			else:
+				data[field] = values[self.field_columns[field][0]]
+		return data
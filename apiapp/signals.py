@@ -0,0 +1,107 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete , post_init , post_save , pre_save
+from django.dispatch import Signal , receiver
+from django.utils import timezone
+
+from . import changes , images , stats
+from .cache import LIST_KEY , category_list_cache , jwt_user_cache , product_cache
+from .models import Category , Product , ProductChange
+
+
+#bulk_create、bulk_update、update()不會送出post_save，ProductBulk、扣除庫存等寫入後送出此signal
+#參數 : pks(寫入的Product id list)、created(True為新增，False為修改)、categories(修改前的Category id，可省略)
+products_bulk_saved = Signal()
+
+def invalidate_products(pks):
+	pks = list(pks)
+	product_cache.invalidate(pks)
+	#在transaction中時，commit之後再invalidate一次，避免其他request在commit之前又把舊的資料寫入cache
+	if transaction.get_connection().in_atomic_block:
+		transaction.on_commit(lambda: product_cache.invalidate(pks))
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, signal, created=False, **kwargs):
+	#刪除Category、User時cascade刪除的Product也會送出post_delete
+	invalidate_products([instance.pk])
+	#SQLite以外的資料庫沒有trigger，記錄變更
+	action = ProductChange.DELETED if signal is post_delete else ProductChange.CREATED if created else ProductChange.UPDATED
+	changes.record([instance.pk], action)
+	#重新計算修改前、後類別的統計
+	stats.refresh({instance.__dict__.get('category_id') , instance._loaded_category_id})
+	instance._loaded_category_id = instance.__dict__.get('category_id')
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+	#CategoryList的每一頁都可能包含這個category，整個list一起invalidate
+	category_list_cache.invalidate([LIST_KEY])
+	if transaction.get_connection().in_atomic_block:
+		transaction.on_commit(lambda: category_list_cache.invalidate([LIST_KEY]))
+
+def image_changed(instance):
+	'''
+	回傳(image是否改變, 目前的image名稱)，新增的instance有image時視為改變
+	'''
+	value = instance.__dict__.get('image')
+	#post_init時為字串，之後可能已經被轉換為FieldFile
+	name = getattr(value, 'name', value) or ''
+	if instance._state.adding:
+		return bool(name), name
+	#only()、defer()沒有讀取image時，_loaded_image為None，視為沒有改變
+	return instance._loaded_image is not None and name != instance._loaded_image, name
+
+@receiver(post_init, sender=Product)
+def remember_image(sender, instance, **kwargs):
+	#記錄讀取時的image，save時判斷是否需要產生縮圖
+	value = instance.__dict__.get('image')
+	instance._loaded_image = getattr(value, 'name', value) or '' if 'image' in instance.__dict__ else None
+	#記錄讀取時的category，修改category時兩個類別的統計都需要重新計算
+	instance._loaded_category_id = instance.__dict__.get('category_id')
+
+@receiver(pre_save, sender=Product)
+def mark_image_pending(sender, instance, **kwargs):
+	changed, name = image_changed(instance)
+	if changed:
+		instance.image_status = Product.IMAGE_PENDING if name else ''
+
+@receiver(post_save, sender=Product)
+def process_new_image(sender, instance, **kwargs):
+	#pre_save之後storage可能修改了檔名，以image_status判斷這次save是否有新的圖片
+	if instance.image_status == Product.IMAGE_PENDING and instance.image:
+		images.schedule(instance.pk)
+	instance._loaded_image = instance.image.name or ''
+
+@receiver(products_bulk_saved, sender=Product)
+def products_bulk_changed(sender, pks, created, categories=(), **kwargs):
+	if not created:
+		invalidate_products(pks)
+	changes.record(pks, ProductChange.CREATED if created else ProductChange.UPDATED)
+	stats.refresh(categories, pks)
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+	#記錄讀取時的username，post_save時判斷是否需要invalidate
+	#only()、defer()沒有讀取username時記錄None，不會為了記錄而另外查詢
+	instance._loaded_username = instance.__dict__.get('username')
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+	#修改、停用user時，CachedJWTAuthentication(apiapp/authentication.py)需要重新讀取
+	jwt_user_cache.invalidate(instance.pk)
+	
+	#product的owner欄位為username，只有username改變時才需要invalidate該user的product
+	#沒有讀取username時，之後有讀取或設定username就當作改變
+	if not created and instance.__dict__.get('username') != instance._loaded_username:
+		products = Product.objects.filter(owner=instance)
+		pks = list(products.values_list('id' , flat=True))
+		invalidate_products(pks)
+		#更新updated_at，讓ETag、Last-Modified(apiapp/conditional.py)跟著改變
+		products.update(updated_at=timezone.now())
+		changes.record(pks, ProductChange.UPDATED)
+	instance._loaded_username = instance.__dict__.get('username')
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+	jwt_user_cache.invalidate(instance.pk)
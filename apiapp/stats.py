@@ -0,0 +1,126 @@
+import logging
+
+from django.db import connections , transaction , DEFAULT_DB_ALIAS
+from django.db.models import BigIntegerField , Count , F , Max , Min , Sum
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .database import triggers_installed , uses_triggers
+
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'apiapp_categorystats'
+
+#新增一個product時加上它的數值
+ADD = '''
+		INSERT OR IGNORE INTO {table}(category_id, product_count, total_stock, total_value, price_sum) VALUES (new.category_id, 0, 0, 0, 0);
+		UPDATE {table} SET
+			product_count = product_count + 1,
+			total_stock = total_stock + new.stock,
+			total_value = total_value + new.stock * new.price,
+			price_sum = price_sum + new.price,
+			min_price = MIN(COALESCE(min_price, new.price), new.price),
+			max_price = MAX(COALESCE(max_price, new.price), new.price)
+		WHERE category_id = new.category_id;'''
+#刪除一個product時減去它的數值，min、max由(category, price, id)的index重新取得，不需要掃描整個類別
+SUBTRACT = '''
+		UPDATE {table} SET
+			product_count = product_count - 1,
+			total_stock = total_stock - old.stock,
+			total_value = total_value - old.stock * old.price,
+			price_sum = price_sum - old.price,
+			min_price = (SELECT MIN(price) FROM apiapp_product WHERE category_id = old.category_id),
+			max_price = (SELECT MAX(price) FROM apiapp_product WHERE category_id = old.category_id)
+		WHERE category_id = old.category_id;'''
+
+#由trigger維護，bulk_create、bulk_update、update()以及apiapp/stock.py扣除庫存時也會同步
+SQLITE_SCHEMA = [
+	'''CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON apiapp_product BEGIN%s
+	END''' % ADD,
+	'''CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON apiapp_product BEGIN%s
+	END''' % SUBTRACT,
+	#先以SUBTRACT減去舊的值、ADD加上新的值，ADD是以舊的min、max比較，所以最後重新取得新類別的min、max
+	'''CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF category_id, stock, price ON apiapp_product
+	WHEN old.category_id != new.category_id OR old.stock != new.stock OR old.price != new.price BEGIN%s%s
+		UPDATE {table} SET
+			min_price = (SELECT MIN(price) FROM apiapp_product WHERE category_id = new.category_id),
+			max_price = (SELECT MAX(price) FROM apiapp_product WHERE category_id = new.category_id)
+		WHERE category_id = new.category_id;
+	END''' % (SUBTRACT, ADD),
+	]
+TRIGGERS = ['%s_insert' % TABLE , '%s_delete' % TABLE , '%s_update' % TABLE]
+
+
+class StatsUnavailable(APIException):
+	status_code = status.HTTP_501_NOT_IMPLEMENTED
+	default_detail = 'Category statistics are not maintained, run manage.py migrate.'
+	default_code = 'stats_unavailable'
+
+
+def install(using=DEFAULT_DB_ALIAS, **kwargs):
+	'''
+	post_migrate時建立trigger(apiapp/apps.py)，trigger原本不存在時以rebuild()重新計算
+	SQLite以外的資料庫沒有trigger，由apiapp/signals.py在product寫入後呼叫refresh()
+	'''
+	connection = connections[using]
+	if not uses_triggers(using):
+		return
+	with connection.cursor() as cursor:
+		cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)", TRIGGERS)
+		existing = {row[0] for row in cursor.fetchall()}
+		for sql in SQLITE_SCHEMA:
+			cursor.execute(sql.format(table=TABLE))
+	if existing != set(TRIGGERS):
+		rebuild(using)
+
+def available(using=DEFAULT_DB_ALIAS):
+	'''
+	統計是否有被維護 : SQLite的trigger都存在，或是由signal維護的其他資料庫
+	'''
+	return not uses_triggers(using) or triggers_installed(using, TRIGGERS)
+
+def aggregate(products):
+	#每個類別一筆，與CategoryStats的欄位相同
+	return products.order_by().values('category').annotate(
+		product_count=Count('id'),
+		total_stock=Sum('stock'),
+		total_value=Sum(F('stock') * F('price'), output_field=BigIntegerField()),
+		price_sum=Sum('price'),
+		min_price=Min('price'),
+		max_price=Max('price'),
+		)
+
+def refresh(categories=(), pks=(), using=DEFAULT_DB_ALIAS):
+	'''
+	SQLite以外的資料庫在product寫入後重新計算categories以及pks(product id)所屬類別的統計，SQLite由trigger維護，不做任何事
+	以(category, price, id)的index只讀取這些類別的product，先lock類別，同時寫入同一個類別的transaction依序計算
+	'''
+	if uses_triggers(using):
+		return
+	from .models import Category , CategoryStats , Product
+	categories = set(categories)
+	if pks:
+		categories.update(Product.objects.using(using).filter(pk__in=list(pks)).values_list('category_id' , flat=True))
+	categories.discard(None)
+	if not categories:
+		return
+	with transaction.atomic(using=using):
+		#cascade刪除中的類別已經不存在，只重新計算還存在的類別
+		categories = list(Category.objects.using(using).select_for_update().filter(id__in=categories).order_by('id').values_list('id' , flat=True))
+		rows = aggregate(Product.objects.using(using).filter(category__in=categories))
+		CategoryStats.objects.using(using).filter(category__in=categories).delete()
+		CategoryStats.objects.using(using).bulk_create([CategoryStats(category_id=row.pop('category'), **row) for row in rows])
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+	'''
+	從apiapp_product重新計算所有類別的統計，回傳有product的類別數量
+	在transaction中執行，計算期間其他request不會看到空的統計
+	'''
+	from .models import CategoryStats , Product
+	rows = aggregate(Product.objects.using(using))
+	with transaction.atomic(using=using):
+		CategoryStats.objects.using(using).all().delete()
+		stats = CategoryStats.objects.using(using).bulk_create(
+			[CategoryStats(category_id=row.pop('category'), **row) for row in rows], batch_size=500)
+	return len(stats)
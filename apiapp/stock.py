@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Product
+from .signals import products_bulk_saved
+
+
+class StockError(Exception):
+	'''
+	reserve()失敗時raise，missing為不存在的product id，insufficient為庫存不足的product id
+	'''
+	def __init__(self, missing, insufficient):
+		super().__init__(missing, insufficient)
+		self.missing = missing
+		self.insufficient = insufficient
+
+
+def reserve(quantities):
+	'''
+	扣除庫存，quantities為{product id : 數量}
+	每個product只執行一個 UPDATE ... SET stock = stock - n WHERE id = ? AND stock >= n，
+	不需要先讀取product，同時結帳的request不會覆蓋彼此的結果，庫存也不會變成負數
+	所有product都在同一個transaction中，任何一個失敗時全部rollback並raise StockError
+	'''
+	now = timezone.now()
+	with transaction.atomic():
+		#依照id的順序UPDATE，同時扣除多個product的request不會互相deadlock
+		failed = [
+			pk for pk, quantity in sorted(quantities.items())
+			if not Product.objects.filter(pk=pk, stock__gte=quantity).update(stock=F('stock') - quantity, updated_at=now)
+			]
+		if failed:
+			#只有失敗時才查詢product是否存在
+			existing = set(Product.objects.filter(pk__in=failed).values_list('id' , flat=True))
+			raise StockError([pk for pk in failed if pk not in existing], [pk for pk in failed if pk in existing])
+		products_bulk_saved.send(sender=Product, pks=list(quantities), created=False)
@@ -0,0 +1,44 @@
+import hashlib
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+#ContentAddressedStorage產生的檔名 : <目錄>/<hash的前2個字>/<SHA-256>[.副檔名]
+CONTENT_NAME_RE = re.compile(r'^(?:.+/)?([0-9a-f]{2})/\1[0-9a-f]{62}(?:\.\w+)?$')
+
+
+def is_content_addressed(name):
+	'''
+	name是否為ContentAddressedStorage產生的檔名，之前以FileSystemStorage上傳的檔案(例如 media/1_FhoNTPK.jpg)不是
+	'''
+	return CONTENT_NAME_RE.match(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+	'''
+	以檔案內容的SHA-256作為檔名 : media/guitar.png 存為 media/3f/3f9a...c1.png
+	相同內容的檔案只會存放一次，不會再產生 1_FhoNTPK.jpg 這種重複的檔案，
+	檔名不變時內容就不會改變，apiapp/media.py可以回傳immutable的Cache-Control(is_content_addressed())
+	'''
+	def content_name(self, name, content):
+		sha256 = hashlib.sha256()
+		for chunk in content.chunks():
+			sha256.update(chunk)
+		digest = sha256.hexdigest()
+		extension = posixpath.splitext(name)[1].lower()
+		return posixpath.join(posixpath.dirname(name), digest[:2], digest + extension)
+
+	def save(self, name, content, max_length=None):
+		if name is None:
+			name = content.name
+		if not hasattr(content, 'chunks'):
+			content = File(content, name)
+		name = self.content_name(name.replace('\\', '/'), content)
+		if self.exists(name):
+			#已經有相同內容的檔案，不需要再寫入
+			return name
+		return super().save(name, content, max_length)
@@ -0,0 +1,39 @@
+from .renderers import dumps
+
+
+def _serialized_chunks(queryset, serializer, chunk_size):
+	'''
+	使用iterator()一次只從資料庫取得chunk_size筆資料，再交給read serializer(apiapp/serializers.py)序列化，
+	PostgreSQL會使用server-side cursor，記憶體用量不會隨著資料筆數增加
+	'''
+	chunk = []
+	for row in serializer.get_rows(queryset).iterator(chunk_size=chunk_size):
+		chunk.append(row)
+		if len(chunk) == chunk_size:
+			yield serializer.many(chunk)
+			chunk = []
+	if chunk:
+		yield serializer.many(chunk)
+
+def stream_json_array(queryset, serializer, chunk_size=1000):
+	'''
+	產生一個JSON array，每個chunk只包含chunk_size筆資料
+	'''
+	yield b'['
+	first = True
+	for data in _serialized_chunks(queryset, serializer, chunk_size):
+		#與REST framework的JSONRenderer相同 : compact的separators、不跳脫中文
+		body = b','.join(dumps(item) for item in data)
+		if first:
+			first = False
+		else:
+			body = b',' + body
+		yield body
+	yield b']'
+
+def stream_ndjson(queryset, serializer, chunk_size=1000):
+	'''
+	產生NDJSON(newline delimited JSON)，每一行為一筆資料
+	'''
+	for data in _serialized_chunks(queryset, serializer, chunk_size):
+		yield b''.join(dumps(item) + b'\n' for item in data)
@@ -1,7 +1,37 @@
-from django.test import TestCase , Client
+import datetime
+import decimal
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from unittest import mock
+
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TestCase , Client , override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
 from django.contrib.auth.models import User
 
-from .models import Category , Product
+from PIL import Image
+
+from . import changes , compression , database , images , media , metrics , renderers , search , stats , stock
+from .models import Category , CategoryStats , Product , ProductChange
+from .serializers import CategorySerializer , ProductSerializer , CategoryReadSerializer , ProductReadSerializer , UserSerializer
+from .streaming import stream_json_array
+from .cache import product_cache
+from .pagination import KeysetPagination
+from .parsers import FastJSONParser
 
 class CategoriesListTest(TestCase): #測試CategoryList的GET和POST，分為匿名user和已驗證過的user。
 	##建立categoet的資料，方便AssertEqual時重複使用
@@ -37,7 +67,7 @@ class CategoriesListTest(TestCase): #測試CategoryList的GET和POST，分為匿
 		response = self.client.get('/apis/categories/')
 		
 		self.assertEqual(response.status_code , 200)
-		self.assertEqual(response.data , self.category_list_data)
+		self.assertEqual(response.data['results'] , self.category_list_data)
 		
 	def test_AuthenticatedUser_get(self): #測試已驗證的user使用get method
 		JWT = self.get_JSON_Web_Token()
@@ -47,7 +77,7 @@ class CategoriesListTest(TestCase): #測試CategoryList的GET和POST，分為匿
 		response = c.get('/apis/categories/')
 		
 		self.assertEqual(response.status_code , 200)
-		self.assertEqual(response.data, self.category_list_data)
+		self.assertEqual(response.data['results'], self.category_list_data)
 	
 	def test_AnonymousUser_post(self): #測試未驗證的user使用post method
 		response = self.client.post('/apis/categories/' , {'name':'CD'})
@@ -63,6 +93,34 @@ class CategoriesListTest(TestCase): #測試CategoryList的GET和POST，分為匿
 		
 		self.assertEqual(response.status_code , 201)
 		self.assertEqual(response.data , {'id': 3 , 'name':'CD'} )
+	
+	def test_AuthenticatedUser_post_duplicate_name(self): #category的name為unique
+		JWT = self.get_JSON_Web_Token()
+		
+		c = Client(HTTP_AUTHORIZATION='Bearer ' + JWT['access'])
+		response = c.post('/apis/categories/' , {'name':'book'})
+		
+		self.assertEqual(response.status_code , 400)
+		self.assertEqual(Category.objects.count() , 2)
+	
+	def test_AnonymousUser_get_cached(self): #第二次GET從category_list_cache取得，不查詢資料庫
+		self.client.get('/apis/categories/')
+		with self.assertNumQueries(0):
+			response = self.client.get('/apis/categories/')
+		self.assertEqual(response.json()['results'] , self.category_list_data)
+		#每一頁各有一個entry
+		response = self.client.get('/apis/categories/?page_size=1')
+		self.assertEqual(response.json()['results'] , self.category_list_data[:1])
+	
+	def test_AuthenticatedUser_post_invalidates_cache(self): #新增、修改、刪除category時invalidate
+		self.client.get('/apis/categories/')
+		JWT = self.get_JSON_Web_Token()
+		c = Client(HTTP_AUTHORIZATION='Bearer ' + JWT['access'])
+		c.post('/apis/categories/' , {'name':'CD'})
+		self.assertEqual([category['name'] for category in self.client.get('/apis/categories/').json()['results']] , ['book' , 'guitar' , 'CD'])
+		
+		Category.objects.get(name='CD').delete()
+		self.assertEqual(self.client.get('/apis/categories/').json()['results'] , self.category_list_data)
 		
 class CategoryDetailTest(TestCase):  #測試CategoryDetail的GET、PUT和DELET，分為匿名user和已驗證過的user。
 	
@@ -171,7 +229,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 		response = self.client.get('/apis/products/')
 		
 		self.assertEqual(response.status_code , 200)
-		self.assertEqual(response.data , 
+		self.assertEqual(response.data['results'] , 
 			[
 				{
 					'id': 1,
@@ -179,6 +237,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 					'name': '科班出身的MVC網頁開發：使用Python+Django',
 					'description': '書中內容來自於團隊實際專案開發經驗和相關知識按系統撰寫而成。',
 					'image': None ,
+					'thumbnails': None ,
 					'stock': 10,
 					'price': 550,
 					'owner': 'jacob'
@@ -189,6 +248,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 					'name' : 'Python Web介面開發與自動化測試' , 
 					'description' : '本書從Web介面開發講起，理解介面是如何開發後，再學習介面測試自然就變得非常簡單。',
 					'image': None ,
+					'thumbnails': None ,
 					'stock': 5,
 					'price': 450,
 					'owner': 'jacob'
@@ -204,7 +264,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 		response = c.get('/apis/products/')
 		
 		self.assertEqual(response.status_code , 200)
-		self.assertEqual(response.data , 
+		self.assertEqual(response.data['results'] , 
 			[
 				{
 					'id': 1,
@@ -212,6 +272,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 					'name': '科班出身的MVC網頁開發：使用Python+Django',
 					'description': '書中內容來自於團隊實際專案開發經驗和相關知識按系統撰寫而成。',
 					'image': None ,
+					'thumbnails': None ,
 					'stock': 10,
 					'price': 550,
 					'owner': 'jacob'
@@ -222,6 +283,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 					'name' : 'Python Web介面開發與自動化測試' , 
 					'description' : '本書從Web介面開發講起，理解介面是如何開發後，再學習介面測試自然就變得非常簡單。',
 					'image': None ,
+					'thumbnails': None ,
 					'stock': 5,
 					'price': 450,
 					'owner': 'jacob'
@@ -268,6 +330,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 				'name': 'Strandberg Boden Original 6',
 				'description': '方便攜帶的無頭琴',
 				'image': None ,
+				'thumbnails': None ,
 				'stock': 2,
 				'price': 72800,
 				'owner': 'jacob'
@@ -278,7 +341,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 		response = self.client.get('/apis/products/?category=book')
 		
 		self.assertEqual(response.status_code , 200)
-		self.assertEqual(response.data , 
+		self.assertEqual(response.data['results'] , 
 			[
 				{
 					'id': 1,
@@ -286,6 +349,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 					'name': '科班出身的MVC網頁開發：使用Python+Django',
 					'description': '書中內容來自於團隊實際專案開發經驗和相關知識按系統撰寫而成。',
 					'image': None ,
+					'thumbnails': None ,
 					'stock': 10,
 					'price': 550,
 					'owner': 'jacob'
@@ -296,6 +360,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 					'name' : 'Python Web介面開發與自動化測試' , 
 					'description' : '本書從Web介面開發講起，理解介面是如何開發後，再學習介面測試自然就變得非常簡單。',
 					'image': None ,
+					'thumbnails': None ,
 					'stock': 5,
 					'price': 450,
 					'owner': 'jacob'
@@ -307,13 +372,13 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 		response = self.client.get('/apis/products/?category=guitar')
 		
 		self.assertEqual(response.status_code , 200)
-		self.assertEqual(response.data , [])
+		self.assertEqual(response.data['results'] , [])
 		
 	def test_AnonymousUser_get_through_username_filter(self):
 		response = self.client.get('/apis/products/?username=jacob')
 		
 		self.assertEqual(response.status_code , 200)
-		self.assertEqual(response.data , 
+		self.assertEqual(response.data['results'] , 
 			[
 				{
 					'id': 1,
@@ -321,6 +386,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 					'name': '科班出身的MVC網頁開發：使用Python+Django',
 					'description': '書中內容來自於團隊實際專案開發經驗和相關知識按系統撰寫而成。',
 					'image': None ,
+					'thumbnails': None ,
 					'stock': 10,
 					'price': 550,
 					'owner': 'jacob'
@@ -331,6 +397,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 					'name' : 'Python Web介面開發與自動化測試' , 
 					'description' : '本書從Web介面開發講起，理解介面是如何開發後，再學習介面測試自然就變得非常簡單。',
 					'image': None ,
+					'thumbnails': None ,
 					'stock': 5,
 					'price': 450,
 					'owner': 'jacob'
@@ -342,7 +409,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 		response = self.client.get('/apis/products/?username=jacob&category=book')
 		
 		self.assertEqual(response.status_code , 200)
-		self.assertEqual(response.data , 
+		self.assertEqual(response.data['results'] , 
 			[
 				{
 					'id': 1,
@@ -350,6 +417,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 					'name': '科班出身的MVC網頁開發：使用Python+Django',
 					'description': '書中內容來自於團隊實際專案開發經驗和相關知識按系統撰寫而成。',
 					'image': None ,
+					'thumbnails': None ,
 					'stock': 10,
 					'price': 550,
 					'owner': 'jacob'
@@ -360,6 +428,7 @@ class ProductListTest(TestCase):  #測試ProductList的GET、POST，分為匿名
 					'name' : 'Python Web介面開發與自動化測試' , 
 					'description' : '本書從Web介面開發講起，理解介面是如何開發後，再學習介面測試自然就變得非常簡單。',
 					'image': None ,
+					'thumbnails': None ,
 					'stock': 5,
 					'price': 450,
 					'owner': 'jacob'
@@ -421,6 +490,7 @@ class ProductDetailTest(TestCase): #測試ProductDetail的GET、PUT和DELET，
 				'name': '科班出身的MVC網頁開發：使用Python+Django',
 				'description': '書中內容來自於團隊實際專案開發經驗和相關知識按系統撰寫而成。',
 				'image': None ,
+				'thumbnails': None ,
 				'stock': 10,
 				'price': 550,
 				'owner': 'jacob'
@@ -435,6 +505,7 @@ class ProductDetailTest(TestCase): #測試ProductDetail的GET、PUT和DELET，
 				'name': '科班出身的MVC網頁開發：使用Python+Django',
 				'description': '書中內容來自於團隊實際專案開發經驗和相關知識按系統撰寫而成，put http method test。',
 				'image': None ,
+				'thumbnails': None ,
 				'stock': 10,
 				'price': 550,
 				'owner': 'jacob'
@@ -463,6 +534,7 @@ class ProductDetailTest(TestCase): #測試ProductDetail的GET、PUT和DELET，
 				'name': '科班出身的MVC網頁開發：使用Python+Django',
 				'description': '書中內容來自於團隊實際專案開發經驗和相關知識按系統撰寫而成。',
 				'image': None ,
+				'thumbnails': None ,
 				'stock': 10,
 				'price': 550,
 				'owner': 'jacob'
@@ -494,6 +566,7 @@ class ProductDetailTest(TestCase): #測試ProductDetail的GET、PUT和DELET，
 				'name': '科班出身的MVC網頁開發：使用Python+Django',
 				'description': '書中內容來自於團隊實際專案開發經驗和相關知識按系統撰寫而成，put http method test。',
 				'image': None ,
+				'thumbnails': None ,
 				'stock': 10,
 				'price': 550,
 				'owner': 'jacob'
@@ -524,6 +597,7 @@ class ProductDetailTest(TestCase): #測試ProductDetail的GET、PUT和DELET，
 				'name': '科班出身的MVC網頁開發：使用Python+Django',
 				'description': '書中內容來自於團隊實際專案開發經驗和相關知識按系統撰寫而成。',
 				'image': None ,
+				'thumbnails': None ,
 				'stock': 10,
 				'price': 550,
 				'owner': 'jacob'
@@ -557,4 +631,1671 @@ class ProductDetailTest(TestCase): #測試ProductDetail的GET、PUT和DELET，
 		response = c.delete('/apis/product/1/')
 		
 		self.assertEqual(response.status_code , 403)
-		
\ No newline at end of file
+				
+class ProductListPaginationTest(TestCase): #測試ProductList的keyset(cursor)分頁
+	def setUp(self):
+		#建立test database，然後新增兩個普通user、兩個Category的instance、五個Product的instance
+		jacob = User.objects.create_user(username='jacob',  password='top1secret23')
+		kevin = User.objects.create_user(username='kevin',  password='pass12word23')
+		
+		bookcategory = Category.objects.create(name = 'book')
+		guitarcategory = Category.objects.create(name = 'guitar')
+		
+		for i in range(5):
+			Product.objects.create(
+				category = bookcategory if i % 2 == 0 else guitarcategory ,
+				name = 'product%d' % i , 
+				stock = i , 
+				price = 100 * i , 
+				owner = jacob if i < 3 else kevin
+				)
+	
+	def test_AnonymousUser_get_without_pagination_args(self): #沒有分頁參數時使用預設的page_size
+		with mock.patch.object(KeysetPagination , 'page_size' , 2):
+			response = self.client.get('/apis/products/')
+		
+		self.assertEqual(response.status_code , 200)
+		self.assertEqual([p['id'] for p in response.data['results']] , [1 , 2])
+		self.assertIsNotNone(response.data['next'])
+	
+	def test_AnonymousUser_get_with_too_large_page_size(self): #page_size超過上限時只回傳max_page_size筆
+		with mock.patch.object(KeysetPagination , 'max_page_size' , 3):
+			response = self.client.get('/apis/products/?page_size=100')
+		
+		self.assertEqual(len(response.data['results']) , 3)
+	
+	def test_AnonymousUser_get_follow_next_and_previous(self): #依照next、previous的URL取得前後頁
+		response = self.client.get('/apis/products/?page_size=2')
+		
+		self.assertEqual(response.status_code , 200)
+		self.assertEqual([p['id'] for p in response.data['results']] , [1 , 2])
+		self.assertIsNone(response.data['previous'])
+		
+		response = self.client.get(response.data['next'])
+		self.assertEqual([p['id'] for p in response.data['results']] , [3 , 4])
+		
+		last = self.client.get(response.data['next'])
+		self.assertEqual([p['id'] for p in last.data['results']] , [5])
+		self.assertIsNone(last.data['next'])
+		
+		response = self.client.get(last.data['previous'])
+		self.assertEqual([p['id'] for p in response.data['results']] , [3 , 4])
+	
+	def test_AnonymousUser_get_with_filters(self): #分頁與category、username filter一起使用
+		response = self.client.get('/apis/products/?category=book&username=jacob&page_size=1')
+		
+		self.assertEqual([p['id'] for p in response.data['results']] , [1])
+		
+		response = self.client.get(response.data['next'])
+		self.assertEqual([p['id'] for p in response.data['results']] , [3])
+		self.assertIsNone(response.data['next'])
+	
+	def test_AnonymousUser_get_with_invalid_cursor(self): #無法解析的cursor
+		response = self.client.get('/apis/products/?cursor=notacursor')
+		
+		self.assertEqual(response.status_code , 404)
+		
+class QueryCountTest(TestCase): #測試各endpoint的SQL query數量固定，不會隨著資料筆數增加(N+1)
+	def setUp(self):
+		#建立test database，然後新增三個普通user、兩個Category的instance、每個user各三個Product的instance
+		self.users = [
+			User.objects.create_user(username='user%d' % i , password='top1secret23')
+			for i in range(3)
+			]
+		
+		bookcategory = Category.objects.create(name = 'book')
+		guitarcategory = Category.objects.create(name = 'guitar')
+		
+		for user in self.users:
+			for i in range(3):
+				Product.objects.create(
+					category = bookcategory if i % 2 == 0 else guitarcategory ,
+					name = '%s product%d' % (user.username , i) ,
+					stock = i , 
+					price = 100 * i , 
+					owner = user
+					)
+	
+	def get_JSON_Web_Token(self):
+		##由於PUT method需要使用JWT驗證，故建立此method，方便重複使用
+		obtaintJsonWebToken = self.client.post('/api/token/' , 
+			{'username':'user0' , 'password':'top1secret23'} , 
+			content_type='application/json'
+			)
+		JWT = obtaintJsonWebToken.data
+		
+		return JWT
+	
+	def test_product_list(self): #不論有幾筆product，都只需要ETag的aggregate query與資料的query
+		with self.assertNumQueries(2):
+			response = self.client.get('/apis/products/')
+		self.assertEqual(len(response.data['results']) , 9)
+	
+	def test_product_list_with_filters(self):
+		with self.assertNumQueries(2):
+			response = self.client.get('/apis/products/?category=book&username=user1')
+		self.assertEqual(len(response.data['results']) , 2)
+	
+	def test_product_list_paginated(self):
+		with self.assertNumQueries(2):
+			response = self.client.get('/apis/products/?page_size=5')
+		self.assertEqual(len(response.data['results']) , 5)
+	
+	def test_product_detail(self):
+		with self.assertNumQueries(2):
+			response = self.client.get('/apis/product/1/')
+		self.assertEqual(response.data['owner'] , 'user0')
+	
+	def test_product_detail_put(self): #JWT的user、product、category驗證、UPDATE
+		JWT = self.get_JSON_Web_Token()
+		c = Client(HTTP_AUTHORIZATION='Bearer ' + JWT['access'])
+		
+		with self.assertNumQueries(4):
+			response = c.put('/apis/product/1/' , 
+				{'category': 2 , 'name': 'renamed' , 'stock': 1 , 'price': 1} , 
+				content_type='application/json'
+				)
+		self.assertEqual(response.status_code , 200)
+		self.assertEqual(response.data['owner'] , 'user0')
+	
+	def test_category_list(self):
+		with self.assertNumQueries(2):
+			self.client.get('/apis/categories/')
+	
+	def test_category_detail(self):
+		with self.assertNumQueries(2):
+			self.client.get('/apis/category/1/')
+		
+class ProductListStreamTest(TestCase): #測試ProductList的streaming匯出
+	def setUp(self):
+		#建立test database，然後新增一個普通user、兩個Category的instance、三個Product的instance
+		user = User.objects.create_user(username='jacob',  password='top1secret23')
+		
+		bookcategory = Category.objects.create(name = 'book')
+		guitarcategory = Category.objects.create(name = 'guitar')
+		
+		for i in range(3):
+			Product.objects.create(
+				category = bookcategory if i % 2 == 0 else guitarcategory ,
+				name = '產品%d' % i , 
+				stock = i , 
+				price = 100 * i , 
+				owner = user
+				)
+	
+	def test_AnonymousUser_stream_json(self): #stream=1的內容與一般的list相同
+		response = self.client.get('/apis/products/?stream=1')
+		
+		self.assertEqual(response.status_code , 200)
+		self.assertTrue(response.streaming)
+		self.assertEqual(response['Content-Type'] , 'application/json; charset=utf-8')
+		content = b''.join(response.streaming_content).decode('utf-8')
+		self.assertIn('尚未有產品說明' , content) #中文不會被跳脫為\u
+		self.assertEqual(json.loads(content) , self.client.get('/apis/products/').data['results'])
+	
+	def test_AnonymousUser_stream_ndjson_with_filter(self): #stream=ndjson每一行為一筆product
+		response = self.client.get('/apis/products/?stream=ndjson&category=book')
+		
+		self.assertEqual(response.status_code , 200)
+		lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+		self.assertEqual([json.loads(line)['name'] for line in lines] , ['產品0' , '產品2'])
+	
+	def test_AnonymousUser_stream_empty(self):
+		response = self.client.get('/apis/products/?stream=1&category=CD')
+		
+		self.assertEqual(b''.join(response.streaming_content) , b'[]')
+	
+	def test_AnonymousUser_stream_true(self):
+		response = self.client.get('/apis/products/?stream=true')
+		
+		self.assertTrue(response.streaming)
+		self.assertEqual(len(json.loads(b''.join(response.streaming_content).decode('utf-8'))) , 3)
+	
+	def test_AnonymousUser_not_stream(self): #stream=0、stream=(空字串)回傳一般的list
+		expected = self.client.get('/apis/products/').data
+		for value in ('0' , ''):
+			response = self.client.get('/apis/products/?stream=%s' % value)
+			
+			self.assertEqual(response.status_code , 200)
+			self.assertFalse(response.streaming)
+			self.assertEqual(response.data , expected)
+	
+	def test_stream_json_array_across_chunks(self): #資料筆數超過chunk_size時，JSON array仍然正確
+		content = b''.join(stream_json_array(Product.objects.order_by('id') , ProductReadSerializer() , chunk_size=2))
+		
+		self.assertEqual([p['name'] for p in json.loads(content.decode('utf-8'))] , ['產品0' , '產品1' , '產品2'])
+		
+class ReadSerializerTest(TestCase): #測試GET專用的快速序列化與ModelSerializer輸出的bytes完全相同
+	def setUp(self):
+		#建立test database，然後新增一個普通user、兩個Category的instance、兩個Product的instance(其中一個有圖片)
+		user = User.objects.create_user(username='jacob',  password='top1secret23')
+		
+		bookcategory = Category.objects.create(name = 'book')
+		Category.objects.create(name = '吉他')
+		
+		Product.objects.create(category = bookcategory ,
+			name = '科班出身的MVC網頁開發：使用Python+Django' , 
+			image = 'media/2013120517752b.jpg' , 
+			stock = 10 , 
+			price = 550 , 
+			owner = user
+			)
+		Product.objects.create(category = bookcategory ,
+			name = 'Python Web介面開發與自動化測試' , 
+			description = '本書從Web介面開發講起。' , 
+			stock = 0 , 
+			price = 450 , 
+			owner = user
+			)
+		
+		self.context = {'request': APIRequestFactory().get('/apis/products/')}
+	
+	def assertSameBytes(self, expected, actual):
+		self.assertEqual(JSONRenderer().render(expected) , JSONRenderer().render(actual))
+	
+	def test_product_many(self):
+		queryset = Product.objects.select_related('owner').order_by('id')
+		
+		read_serializer = ProductReadSerializer(self.context)
+		self.assertSameBytes(
+			ProductSerializer(queryset , many=True , context=self.context).data ,
+			read_serializer.many(read_serializer.get_rows(queryset))
+			)
+	
+	def test_product_image_url(self): #image為absolute URL，沒有圖片時為None
+		read_serializer = ProductReadSerializer(self.context)
+		data = read_serializer.many(read_serializer.get_rows(Product.objects.order_by('id')))
+		
+		self.assertEqual(data[0]['image'] , 'http://testserver/media/media/2013120517752b.jpg')
+		self.assertIsNone(data[1]['image'])
+	
+	def test_product_without_request(self):
+		product = Product.objects.get(pk=1)
+		
+		read_serializer = ProductReadSerializer()
+		self.assertSameBytes(
+			ProductSerializer(product).data ,
+			read_serializer.to_representation(read_serializer.get_rows(Product.objects.filter(pk=1)).get())
+			)
+	
+	def test_category_many(self):
+		queryset = Category.objects.order_by('id')
+		
+		read_serializer = CategoryReadSerializer(self.context)
+		self.assertSameBytes(
+			CategorySerializer(queryset , many=True).data ,
+			read_serializer.many(read_serializer.get_rows(queryset))
+			)
+	
+	def test_endpoints(self): #endpoint回傳的bytes與ModelSerializer相同
+		product = Product.objects.get(pk=1)
+		
+		response = self.client.get('/apis/product/1/')
+		self.assertEqual(response.content , 
+			JSONRenderer().render(ProductSerializer(product , context=self.context).data))
+		
+		response = self.client.get('/apis/product/3/')
+		self.assertEqual(response.status_code , 404)
+		
+class ProductDetailCacheTest(TestCase): #測試ProductDetail的response cache與invalidation
+	def setUp(self):
+		#建立test database，然後新增一個普通user、一個Category的instance、兩個Product的instance
+		self.user = User.objects.create_user(username='jacob',  password='top1secret23')
+		
+		bookcategory = Category.objects.create(name = 'book')
+		
+		for i in range(2):
+			Product.objects.create(
+				category = bookcategory ,
+				name = 'product%d' % i , 
+				stock = 10 , 
+				price = 550 , 
+				owner = self.user
+				)
+	
+	def get_JSON_Web_Token(self):
+		##由於PUT、DELETE method需要使用JWT驗證，故建立此method，方便重複使用
+		obtaintJsonWebToken = self.client.post('/api/token/' , 
+			{'username':'jacob' , 'password':'top1secret23'} , 
+			content_type='application/json'
+			)
+		JWT = obtaintJsonWebToken.data
+		
+		return JWT
+	
+	def test_AnonymousUser_get_twice(self): #第二次GET直接使用cache，不查詢資料庫
+		hits = product_cache.stats()['hits']
+		first = self.client.get('/apis/product/1/')
+		
+		with self.assertNumQueries(0):
+			second = self.client.get('/apis/product/1/')
+		
+		self.assertEqual(second.status_code , 200)
+		self.assertEqual(second.content , first.content)
+		self.assertEqual(second['ETag'] , first['ETag'])
+		self.assertEqual(second['Content-Type'] , 'application/json')
+		self.assertEqual(product_cache.stats()['hits'] , hits + 1)
+	
+	def test_AuthenticatedUser_put_invalidates(self): #PUT之後GET取得新的資料
+		self.client.get('/apis/product/1/')
+		self.client.get('/apis/product/2/')
+		
+		JWT = self.get_JSON_Web_Token()
+		c = Client(HTTP_AUTHORIZATION='Bearer ' + JWT['access'])
+		c.put('/apis/product/1/' , 
+			{'category': 1 , 'name': 'renamed' , 'stock': 1 , 'price': 1} , 
+			content_type='application/json'
+			)
+		
+		self.assertEqual(self.client.get('/apis/product/1/').data['name'] , 'renamed')
+		with self.assertNumQueries(0): #其他product的cache不受影響
+			self.client.get('/apis/product/2/')
+	
+	def test_AuthenticatedUser_delete_invalidates(self):
+		self.client.get('/apis/product/1/')
+		
+		JWT = self.get_JSON_Web_Token()
+		c = Client(HTTP_AUTHORIZATION='Bearer ' + JWT['access'])
+		c.delete('/apis/product/1/')
+		
+		self.assertEqual(self.client.get('/apis/product/1/').status_code , 404)
+	
+	def test_category_delete_invalidates(self): #刪除category時cascade刪除的product
+		self.client.get('/apis/product/1/')
+		
+		Category.objects.get(name = 'book').delete()
+		
+		self.assertEqual(self.client.get('/apis/product/1/').status_code , 404)
+	
+	def test_username_change_invalidates(self): #owner的username改變時
+		self.client.get('/apis/product/1/')
+		
+		user = User.objects.get(username = 'jacob')
+		user.username = 'jacob2'
+		user.save()
+		
+		self.assertEqual(self.client.get('/apis/product/1/').data['owner'] , 'jacob2')
+	
+	def test_other_user_field_change_keeps_cache(self): #username以外的欄位改變時不需要invalidate
+		self.client.get('/apis/product/1/')
+		
+		user = User.objects.get(username = 'jacob')
+		user.first_name = 'Jacob'
+		user.save()
+		
+		with self.assertNumQueries(0):
+			self.client.get('/apis/product/1/')
+	
+	def test_deferred_username(self): #only()沒有讀取username時，不會另外查詢username
+		self.client.get('/apis/product/1/')
+		
+		with self.assertNumQueries(1):
+			user = User.objects.only('id').get(username = 'jacob')
+		user.first_name = 'Jacob'
+		user.save(update_fields=['first_name'])
+		
+		with self.assertNumQueries(0):
+			self.client.get('/apis/product/1/')
+	
+	def test_cache_stats(self):
+		response = self.client.get('/apis/cache/stats/')
+		
+		self.assertEqual(response.status_code , 200)
+		self.assertEqual(set(response.data['product']) , {'hits' , 'misses' , 'compressed_hits' , 'invalidations'})
+		
+class ConditionalGetTest(TestCase): #測試ETag、Last-Modified與304
+	def setUp(self):
+		#建立test database，然後新增一個普通user、兩個Category的instance、兩個Product的instance
+		self.user = User.objects.create_user(username='jacob',  password='top1secret23')
+		
+		bookcategory = Category.objects.create(name = 'book')
+		Category.objects.create(name = 'guitar')
+		
+		for i in range(2):
+			Product.objects.create(
+				category = bookcategory ,
+				name = 'product%d' % i , 
+				stock = 10 , 
+				price = 550 , 
+				owner = self.user
+				)
+	
+	def test_product_list_etag(self): #ETag相同時只執行一個query並回傳304
+		response = self.client.get('/apis/products/?category=book')
+		self.assertEqual(response.status_code , 200)
+		self.assertNotIn('Last-Modified' , response)
+		
+		with self.assertNumQueries(1):
+			response = self.client.get('/apis/products/?category=book' , HTTP_IF_NONE_MATCH=response['ETag'])
+		self.assertEqual(response.status_code , 304)
+		self.assertEqual(response.content , b'')
+	
+	def test_product_list_if_modified_since_after_delete(self): #list不使用If-Modified-Since，刪除後仍然回傳新的資料
+		last_modified = self.client.get('/apis/product/1/')['Last-Modified']
+		Product.objects.get(pk=2).delete()
+		
+		for url in ('/apis/products/' , '/apis/products/?page_size=1'):
+			response = self.client.get(url , HTTP_IF_MODIFIED_SINCE=last_modified)
+			self.assertEqual(response.status_code , 200)
+			self.assertNotIn('Last-Modified' , response)
+	
+	def test_product_list_etag_changes(self): #新增、修改、刪除product後ETag改變
+		etag = self.client.get('/apis/products/')['ETag']
+		
+		product = Product.objects.get(pk=1)
+		product.price = 600
+		product.save()
+		response = self.client.get('/apis/products/' , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 200)
+		
+		etag = response['ETag']
+		Product.objects.get(pk=2).delete()
+		response = self.client.get('/apis/products/' , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 200)
+		self.assertEqual(len(response.data['results']) , 1)
+	
+	def test_product_list_etag_only_depends_on_page(self): #這一頁以外的product改變時ETag不變，新增下一頁時改變
+		etag = self.client.get('/apis/products/?page_size=1')['ETag']
+		
+		product = Product.objects.get(pk=2)
+		product.price = 600
+		product.save()
+		response = self.client.get('/apis/products/?page_size=1' , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 304)
+		
+		etag = self.client.get('/apis/products/?page_size=2')['ETag']
+		Product.objects.create(category_id = 1 , name = 'product2' , owner = self.user)
+		response = self.client.get('/apis/products/?page_size=2' , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 200)
+		self.assertIsNotNone(response.data['next'])
+	
+	def test_product_list_etag_depends_on_query(self): #不同的filter、分頁有不同的ETag
+		etag = self.client.get('/apis/products/')['ETag']
+		
+		response = self.client.get('/apis/products/?page_size=1' , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 200)
+	
+	def test_product_detail_etag_from_cache(self): #cache中的response同樣可以回傳304，不查詢資料庫
+		etag = self.client.get('/apis/product/1/')['ETag']
+		
+		with self.assertNumQueries(0):
+			response = self.client.get('/apis/product/1/' , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 304)
+	
+	def test_product_detail_etag_without_cache(self): #cache中沒有資料時只讀取updated_at
+		etag = self.client.get('/apis/product/1/')['ETag']
+		product_cache.invalidate([1])
+		
+		with self.assertNumQueries(1):
+			response = self.client.get('/apis/product/1/' , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 304)
+	
+	def test_product_detail_username_change(self): #owner的username改變時ETag改變
+		etag = self.client.get('/apis/product/1/')['ETag']
+		
+		self.user.username = 'jacob2'
+		self.user.save()
+		
+		response = self.client.get('/apis/product/1/' , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 200)
+		self.assertEqual(response.data['owner'] , 'jacob2')
+	
+	def test_category_list_and_detail(self):
+		etag = self.client.get('/apis/categories/')['ETag']
+		response = self.client.get('/apis/categories/' , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 304)
+		
+		etag = self.client.get('/apis/category/1/')['ETag']
+		response = self.client.get('/apis/category/1/' , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 304)
+		
+		category = Category.objects.get(pk=1)
+		category.name = 'books'
+		category.save()
+		response = self.client.get('/apis/category/1/' , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 200)
+	
+	def test_missing_object(self):
+		response = self.client.get('/apis/product/99/')
+		self.assertEqual(response.status_code , 404)
+		
+class ProductBulkTest(TestCase): #測試ProductBulk的POST、PUT、DELETE
+	def setUp(self):
+		#建立test database，然後新增兩個普通user、兩個Category的instance、jacob的兩個Product、kevin的一個Product
+		jacob = User.objects.create_user(username='jacob',  password='top1secret23')
+		kevin = User.objects.create_user(username='kevin',  password='pass12word23')
+		
+		Category.objects.create(name = 'book')
+		Category.objects.create(name = 'guitar')
+		
+		for i , owner in enumerate([jacob , jacob , kevin]):
+			Product.objects.create(category_id = 1 , name = 'product%d' % i , stock = 1 , price = 100 , owner = owner)
+	
+	def get_client(self):
+		##建立有Authorization: Bearer + access token的header的Client() instance
+		obtaintJsonWebToken = self.client.post('/api/token/' , 
+			{'username':'jacob' , 'password':'top1secret23'} , 
+			content_type='application/json'
+			)
+		return Client(HTTP_AUTHORIZATION='Bearer ' + obtaintJsonWebToken.data['access'])
+	
+	def test_AnonymousUser_post(self):
+		response = self.client.post('/apis/products/bulk/' , [] , content_type='application/json')
+		
+		self.assertEqual(response.status_code , 401)
+	
+	def test_AuthenticatedUser_post(self): #新增多筆product，category只需要一個query
+		c = self.get_client()
+		items = [{'category': 1 + i % 2 , 'name': 'new%d' % i , 'stock': i , 'price': 10 * i} for i in range(20)]
+		
+		with self.assertNumQueries(6): #JWT的user、category、bulk INSERT、取得id以及transaction的savepoint
+			response = c.post('/apis/products/bulk/' , items , content_type='application/json')
+		
+		self.assertEqual(response.status_code , 201)
+		self.assertEqual(len(response.data) , 20)
+		self.assertEqual(response.data[0] , 
+			{
+				'id': 4,
+				'category': 1,
+				'name': 'new0',
+				'description': '尚未有產品說明',
+				'image': None ,
+				'thumbnails': None ,
+				'stock': 0,
+				'price': 0,
+				'owner': 'jacob'
+			}
+		)
+		self.assertEqual([p['id'] for p in response.data] , list(range(4 , 24)))
+		self.assertEqual(Product.objects.get(pk=23).name , 'new19')
+	
+	def test_AuthenticatedUser_post_invalid_items(self): #任何一筆驗證失敗時都不會寫入
+		c = self.get_client()
+		items = [
+			{'category': 1 , 'name': 'ok'},
+			{'category': 99 , 'name': 'missing category'},
+			{'category': 'x' , 'name': 'wrong type'},
+			{'category': 2},
+			]
+		
+		response = c.post('/apis/products/bulk/' , items , content_type='application/json')
+		
+		self.assertEqual(response.status_code , 400)
+		self.assertEqual(response.data[0] , {})
+		self.assertEqual(response.data[1]['category'][0].code , 'does_not_exist')
+		self.assertEqual(response.data[2]['category'][0].code , 'incorrect_type')
+		self.assertEqual(list(response.data[3]) , ['name'])
+		self.assertEqual(Product.objects.count() , 3)
+	
+	def test_AuthenticatedUser_post_not_a_list(self):
+		c = self.get_client()
+		
+		response = c.post('/apis/products/bulk/' , {'category': 1 , 'name': 'x'} , content_type='application/json')
+		self.assertEqual(response.status_code , 400)
+	
+	def test_AuthenticatedUser_put(self):
+		c = self.get_client()
+		self.client.get('/apis/product/1/') #建立cache，確認PUT之後會invalidate
+		
+		response = c.put('/apis/products/bulk/' , 
+			[
+				{'id': 1 , 'category': 2 , 'name': 'renamed1' , 'stock': 5 , 'price': 1},
+				{'id': 2 , 'category': 2 , 'name': 'renamed2' , 'stock': 6 , 'price': 2},
+			] , 
+			content_type='application/json'
+			)
+		
+		self.assertEqual(response.status_code , 200)
+		self.assertEqual([p['name'] for p in response.data] , ['renamed1' , 'renamed2'])
+		self.assertEqual(self.client.get('/apis/product/1/').data['name'] , 'renamed1')
+		self.assertEqual(Product.objects.get(pk=2).category_id , 2)
+	
+	def test_AuthenticatedUser_put_not_owner_or_missing(self): #不是owner、不存在或重複的id
+		c = self.get_client()
+		
+		response = c.put('/apis/products/bulk/' , 
+			[
+				{'id': 1 , 'category': 2 , 'name': 'renamed1'},
+				{'id': 3 , 'category': 2 , 'name': 'not mine'},
+				{'id': 99 , 'category': 2 , 'name': 'missing'},
+				{'id': 1 , 'category': 2 , 'name': 'duplicate'},
+			] , 
+			content_type='application/json'
+			)
+		
+		self.assertEqual(response.status_code , 400)
+		self.assertEqual(response.data[0] , {})
+		self.assertIn('detail' , response.data[1])
+		self.assertIn('id' , response.data[2])
+		self.assertIn('id' , response.data[3])
+		self.assertEqual(Product.objects.get(pk=1).name , 'product0')
+	
+	def test_AuthenticatedUser_delete(self):
+		c = self.get_client()
+		
+		response = c.delete('/apis/products/bulk/' , [1 , 2] , content_type='application/json')
+		
+		self.assertEqual(response.status_code , 204)
+		self.assertEqual(list(Product.objects.values_list('id' , flat=True)) , [3])
+	
+	def test_AuthenticatedUser_delete_not_owner(self):
+		c = self.get_client()
+		
+		response = c.delete('/apis/products/bulk/' , [1 , 3] , content_type='application/json')
+		
+		self.assertEqual(response.status_code , 400)
+		self.assertEqual(Product.objects.count() , 3)
+	
+	def test_AuthenticatedUser_out_of_range_id(self): #超過64 bit或不是正數的id視為不存在，而不是500
+		c = self.get_client()
+		
+		response = c.delete('/apis/products/bulk/' , [1 , 18446744073709551615 , 0 , -1] , content_type='application/json')
+		self.assertEqual(response.status_code , 400)
+		self.assertEqual(response.data[0] , {})
+		for error in response.data[1:]:
+			self.assertIn('id' , error)
+		
+		response = c.put('/apis/products/bulk/' , 
+			[{'id': 18446744073709551615 , 'category': 2 , 'name': 'huge'}] , 
+			content_type='application/json'
+			)
+		self.assertEqual(response.status_code , 400)
+		self.assertIn('id' , response.data[0])
+		self.assertEqual(Product.objects.count() , 3)
+		
+class CachedJWTAuthenticationTest(TestCase): #測試CachedJWTAuthentication的user cache與invalidation
+	def setUp(self):
+		#建立test database，然後新增一個普通user、一個Category的instance
+		self.user = User.objects.create_user(username='jacob',  password='top1secret23')
+		
+		Category.objects.create(name = 'book')
+		
+		obtaintJsonWebToken = self.client.post('/api/token/' , 
+			{'username':'jacob' , 'password':'top1secret23'} , 
+			content_type='application/json'
+			)
+		self.c = Client(HTTP_AUTHORIZATION='Bearer ' + obtaintJsonWebToken.data['access'])
+	
+	def test_AuthenticatedUser_second_request_without_user_query(self):
+		with self.assertNumQueries(3): #user、updated_at、category
+			self.c.get('/apis/category/1/')
+		
+		with self.assertNumQueries(2):
+			response = self.c.get('/apis/category/1/')
+		self.assertEqual(response.status_code , 200)
+	
+	def test_deactivated_user(self): #停用的user無法再使用token
+		self.c.get('/apis/category/1/')
+		
+		self.user.is_active = False
+		self.user.save()
+		
+		response = self.c.post('/apis/categories/' , {'name':'CD'} , content_type='application/json')
+		self.assertEqual(response.status_code , 401)
+	
+	def test_deleted_user(self):
+		self.c.get('/apis/category/1/')
+		
+		self.user.delete()
+		
+		response = self.c.post('/apis/categories/' , {'name':'CD'} , content_type='application/json')
+		self.assertEqual(response.status_code , 401)
+	
+	def test_username_change(self): #新增product時owner為修改後的username
+		self.c.get('/apis/category/1/')
+		
+		self.user.username = 'jacob2'
+		self.user.save()
+		
+		response = self.c.post('/apis/products/' , {'category': 1 , 'name': 'new'} , content_type='application/json')
+		self.assertEqual(response.status_code , 201)
+		self.assertEqual(response.data['owner'] , 'jacob2')
+
+class SparseFieldsTest(TestCase): #測試ProductList、ProductDetail的?fields=
+	def setUp(self):
+		#建立test database，然後新增一個普通user、一個Category的instance、兩個Product的instance
+		self.user = User.objects.create_user(username='jacob',  password='top1secret23')
+		
+		bookcategory = Category.objects.create(name = 'book')
+		
+		for i in range(2):
+			Product.objects.create(
+				category = bookcategory ,
+				name = 'product%d' % i , 
+				description = 'x' * 2000 ,
+				stock = 10 , 
+				price = 550 , 
+				owner = self.user
+				)
+	
+	def test_product_list_fields(self): #只輸出指定的欄位，順序與ProductSerializer相同
+		response = self.client.get('/apis/products/?fields=price,name,id')
+		self.assertEqual(response.status_code , 200)
+		self.assertEqual(response.json()['results'] , [
+			{'id': 1 , 'name': 'product0' , 'price': 550},
+			{'id': 2 , 'name': 'product1' , 'price': 550},
+			])
+	
+	def test_product_list_does_not_select_unrequested_columns(self):
+		with CaptureQueriesContext(connection) as queries:
+			self.client.get('/apis/products/?fields=name')
+		sql = queries.captured_queries[-1]['sql']
+		self.assertNotIn('description' , sql)
+		self.assertNotIn('auth_user' , sql)
+	
+	def test_product_list_fields_paginated(self): #沒有要求id時cursor分頁仍然可以使用
+		response = self.client.get('/apis/products/?fields=name&page_size=1')
+		self.assertEqual(response.data['results'] , [{'name': 'product0'}])
+		response = self.client.get(response.data['next'])
+		self.assertEqual(response.data['results'] , [{'name': 'product1'}])
+	
+	def test_product_list_fields_stream(self):
+		response = self.client.get('/apis/products/?fields=id,image&stream=ndjson')
+		lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+		self.assertEqual([json.loads(line) for line in lines] , [{'id': 1 , 'image': None} , {'id': 2 , 'image': None}])
+	
+	def test_invalid_field(self):
+		response = self.client.get('/apis/products/?fields=id,password')
+		self.assertEqual(response.status_code , 400)
+		self.assertEqual(response.data , {'fields': ['Invalid field "password".']})
+	
+	def test_empty_fields(self): #fields為空字串時輸出所有欄位
+		self.assertEqual(self.client.get('/apis/products/?fields=').json() , self.client.get('/apis/products/').json())
+	
+	def test_product_detail_fields_cached_separately(self): #不同的fields使用不同的cache entry
+		full = self.client.get('/apis/product/1/')
+		sparse = self.client.get('/apis/product/1/?fields=id,owner')
+		self.assertEqual(sparse.json() , {'id': 1 , 'owner': 'jacob'})
+		self.assertNotEqual(sparse['ETag'] , full['ETag'])
+		
+		with self.assertNumQueries(0):
+			self.assertEqual(self.client.get('/apis/product/1/?fields=id,owner').content , sparse.content)
+			self.assertEqual(self.client.get('/apis/product/1/').content , full.content)
+
+class ProductImageTest(TestCase): #測試上傳圖片後由worker產生縮圖
+	def setUp(self):
+		#上傳的圖片存放在暫存資料夾，不會寫入settings.MEDIA_ROOT
+		self.media_root = tempfile.TemporaryDirectory()
+		self.addCleanup(self.media_root.cleanup)
+		media_settings = override_settings(MEDIA_ROOT=self.media_root.name)
+		media_settings.enable()
+		self.addCleanup(media_settings.disable)
+		
+		self.user = User.objects.create_user(username='jacob',  password='top1secret23')
+		Category.objects.create(name = 'book')
+		
+		obtaintJsonWebToken = self.client.post('/api/token/' , 
+			{'username':'jacob' , 'password':'top1secret23'} , 
+			content_type='application/json'
+			)
+		self.c = Client(HTTP_AUTHORIZATION='Bearer ' + obtaintJsonWebToken.data['access'])
+	
+	def upload(self, size=(1600, 1200), content=None):
+		if content is None:
+			data = io.BytesIO()
+			Image.new('RGB' , size , 'red').save(data, 'PNG')
+			content = data.getvalue()
+		with mock.patch.object(images, 'schedule') as schedule:
+			response = self.c.post('/apis/products/' , 
+				{'category': 1 , 'name': 'guitar' , 'image': SimpleUploadedFile('guitar.png' , content , 'image/png')})
+		return response, schedule
+	
+	def test_upload_schedules_processing(self): #POST只寫入原圖，縮圖交給worker
+		response, schedule = self.upload()
+		
+		self.assertEqual(response.status_code , 201)
+		self.assertIsNone(response.data['thumbnails'])
+		self.assertEqual(Product.objects.get(pk=1).image_status , Product.IMAGE_PENDING)
+		schedule.assert_called_once_with(1)
+	
+	def test_process_image(self):
+		self.upload()
+		self.assertIsNone(self.client.get('/apis/product/1/').data['thumbnails'])
+		
+		images.process_image(1)
+		
+		product = Product.objects.get(pk=1)
+		self.assertEqual(product.image_status , Product.IMAGE_READY)
+		#worker更新image_status後cache被invalidate
+		thumbnails = self.client.get('/apis/product/1/').data['thumbnails']
+		self.assertEqual(set(thumbnails) , set(images.THUMBNAIL_SIZES))
+		for variant, size in images.THUMBNAIL_SIZES.items():
+			name = images.thumbnail_name(product.image.name, variant)
+			self.assertEqual(thumbnails[variant] , 'http://testserver/media/' + name)
+			with Image.open(os.path.join(self.media_root.name, name)) as thumbnail:
+				self.assertEqual(thumbnail.format , 'WEBP')
+				self.assertEqual(max(thumbnail.size) , size)
+		
+		#ProductReadSerializer與ProductSerializer的輸出相同
+		self.assertEqual(self.client.get('/apis/products/?fields=thumbnails').json()['results'] , [{'thumbnails': thumbnails}])
+	
+	def test_update_without_new_image(self): #沒有上傳新的圖片時不需要重新產生縮圖
+		self.upload()
+		images.process_image(1)
+		
+		with mock.patch.object(images, 'schedule') as schedule:
+			response = self.c.put('/apis/product/1/' , {'category': 1 , 'name': 'bass'} , content_type='application/json')
+		self.assertEqual(response.status_code , 200)
+		self.assertIsNotNone(response.data['thumbnails'])
+		schedule.assert_not_called()
+	
+	def test_too_many_pixels(self):
+		self.upload()
+		with mock.patch.object(images, 'MAX_IMAGE_PIXELS' , 1000), self.assertLogs('apiapp.images' , 'WARNING'):
+			images.process_image(1)
+		
+		self.assertEqual(Product.objects.get(pk=1).image_status , Product.IMAGE_FAILED)
+		self.assertIsNone(self.client.get('/apis/product/1/').data['thumbnails'])
+	
+	def test_backfill(self): #縮圖功能之前上傳的圖片image_status為空字串，由manage.py process_product_images產生縮圖
+		self.upload()
+		Product.objects.create(category_id=1 , name='no image' , owner=self.user)
+		Product.objects.filter(pk=1).update(image_status='')
+		
+		out = io.StringIO()
+		call_command('process_product_images' , stdout=out)
+		self.assertEqual(out.getvalue() , 'Processed images of 1 products.\n')
+		self.assertEqual(Product.objects.get(pk=1).image_status , Product.IMAGE_READY)
+		self.assertIsNotNone(self.client.get('/apis/product/1/').data['thumbnails'])
+		self.assertEqual(Product.objects.get(pk=2).image_status , '')
+		
+		#已經有縮圖的product只有--all時才重新處理
+		self.assertEqual(images.backfill() , 0)
+		self.assertEqual(images.backfill(reprocess=True) , 1)
+	
+	def test_upload_too_large(self):
+		with mock.patch('apiapp.serializers.MAX_UPLOAD_SIZE' , 100):
+			response, schedule = self.upload()
+		self.assertEqual(response.status_code , 400)
+		self.assertIn('image' , response.data)
+		schedule.assert_not_called()
+	
+	def test_identical_uploads_stored_once(self): #相同內容的圖片只存放一次
+		content = io.BytesIO()
+		Image.new('RGB' , (10, 10) , 'blue').save(content, 'PNG')
+		self.upload(content=content.getvalue())
+		self.upload(content=content.getvalue())
+		
+		first, second = Product.objects.order_by('id')
+		self.assertEqual(first.image.name , second.image.name)
+		self.assertEqual(first.image.name , 'media/%s/%s.png' % (first.image.name[6:8] , hashlib.sha256(content.getvalue()).hexdigest()))
+		self.assertEqual(len(os.listdir(os.path.dirname(first.image.path))) , 1)
+
+class MediaServeTest(TestCase): #測試apiapp/media.py的serve_media
+	def setUp(self):
+		self.media_root = tempfile.TemporaryDirectory()
+		self.addCleanup(self.media_root.cleanup)
+		media_settings = override_settings(MEDIA_ROOT=self.media_root.name)
+		media_settings.enable()
+		self.addCleanup(media_settings.disable)
+		
+		os.mkdir(os.path.join(self.media_root.name , 'media'))
+		self.content = bytes(range(256)) * 4
+		with open(os.path.join(self.media_root.name , 'media' , 'a.jpg') , 'wb') as file:
+			file.write(self.content)
+		#ContentAddressedStorage的檔名
+		self.hashed = 'media/%s/%s.jpg' % (hashlib.sha256(self.content).hexdigest()[:2] , hashlib.sha256(self.content).hexdigest())
+		os.makedirs(os.path.dirname(os.path.join(self.media_root.name , self.hashed)))
+		with open(os.path.join(self.media_root.name , self.hashed) , 'wb') as file:
+			file.write(self.content)
+	
+	def test_get(self):
+		response = self.client.get('/media/media/a.jpg')
+		self.assertEqual(response.status_code , 200)
+		self.assertEqual(b''.join(response.streaming_content) , self.content)
+		self.assertEqual(response['Content-Type'] , 'image/jpeg')
+		self.assertEqual(response['Content-Length'] , '1024')
+		self.assertEqual(response['Accept-Ranges'] , 'bytes')
+		self.assertEqual(response['Cache-Control'] , 'public, no-cache')
+		self.assertTrue(response.has_header('ETag'))
+		self.assertTrue(response.has_header('Last-Modified'))
+	
+	def test_not_modified(self):
+		etag = self.client.get('/media/' + self.hashed)['ETag']
+		response = self.client.get('/media/' + self.hashed , HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code , 304)
+		self.assertIn('immutable' , response['Cache-Control'])
+	
+	def test_cache_control(self): #只有ContentAddressedStorage的原圖與它的縮圖是immutable
+		self.assertIn('immutable' , self.client.get('/media/' + self.hashed)['Cache-Control'])
+		digest = self.hashed[9:-4]
+		for path, immutable in (
+				(self.hashed , True) ,
+				('thumbnails/%s_small_200.webp' % self.hashed[:-4] , True) ,
+				('thumbnails/%s_extra_large_1600.webp' % self.hashed[:-4] , True) ,
+				('media/a.jpg' , False) ,
+				('media/1_FhoNTPK.jpg' , False) ,
+				('thumbnails/media/1_small_200.webp' , False) ,
+				('thumbnails/media/%s/%s_small.webp' % (digest[:2] , digest) , False) , #尺寸不在檔名中的舊縮圖
+				):
+			self.assertEqual(media.cache_control(path) == media.IMMUTABLE_CACHE_CONTROL , immutable , path)
+	
+	def test_range(self):
+		response = self.client.get('/media/media/a.jpg' , HTTP_RANGE='bytes=100-199')
+		self.assertEqual(response.status_code , 206)
+		self.assertEqual(b''.join(response.streaming_content) , self.content[100:200])
+		self.assertEqual(response['Content-Range'] , 'bytes 100-199/1024')
+		self.assertEqual(response['Content-Length'] , '100')
+		
+		response = self.client.get('/media/media/a.jpg' , HTTP_RANGE='bytes=-24')
+		self.assertEqual(b''.join(response.streaming_content) , self.content[-24:])
+		self.assertEqual(response['Content-Range'] , 'bytes 1000-1023/1024')
+		
+		response = self.client.get('/media/media/a.jpg' , HTTP_RANGE='bytes=1000-')
+		self.assertEqual(b''.join(response.streaming_content) , self.content[1000:])
+	
+	def test_range_not_satisfiable(self):
+		response = self.client.get('/media/media/a.jpg' , HTTP_RANGE='bytes=2000-')
+		self.assertEqual(response.status_code , 416)
+		self.assertEqual(response['Content-Range'] , 'bytes */1024')
+	
+	def test_if_range_changed(self): #If-Range的ETag不同時回傳完整的檔案
+		response = self.client.get('/media/media/a.jpg' , HTTP_RANGE='bytes=0-9' , HTTP_IF_RANGE='"old"')
+		self.assertEqual(response.status_code , 200)
+	
+	def test_missing_and_outside_media_root(self):
+		self.assertEqual(self.client.get('/media/media/b.jpg').status_code , 404)
+		self.assertEqual(self.client.get('/media/media/').status_code , 404)
+		self.assertEqual(self.client.get('/media/../settings.py').status_code , 404)
+	
+	def test_x_accel_redirect(self): #由nginx傳送檔案內容
+		with override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect'):
+			response = self.client.get('/media/media/a.jpg')
+		self.assertEqual(response['X-Accel-Redirect'] , '/protected-media/media/a.jpg')
+		self.assertEqual(response.content , b'')
+		self.assertEqual(response['Cache-Control'] , 'public, no-cache')
+		
+		#之前上傳的檔名可能有空白與中文
+		with open(os.path.join(self.media_root.name , 'media' , '吉他 1.jpg') , 'wb') as file:
+			file.write(self.content)
+		with override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect'):
+			response = self.client.get('/media/media/%E5%90%89%E4%BB%96%201.jpg')
+		self.assertEqual(response.status_code , 200)
+		self.assertEqual(response['X-Accel-Redirect'] , '/protected-media/media/%E5%90%89%E4%BB%96%201.jpg')
+
+class ProductSearchTest(TestCase): #測試/apis/products/search/的全文搜尋
+	def setUp(self):
+		#建立test database，然後新增一個普通user、一個Category的instance、三個Product的instance
+		user = User.objects.create_user(username='jacob',  password='top1secret23')
+		bookcategory = Category.objects.create(name = 'book')
+		
+		for name, description in (
+				('Strandberg Boden Original 6' , '方便攜帶的無頭琴') ,
+				('Python Web介面開發與自動化測試' , '本書從Web介面開發講起。Python Python') ,
+				('科班出身的MVC網頁開發：使用Python+Django' , '尚未有產品說明')):
+			Product.objects.create(category = bookcategory , name = name , description = description , owner = user)
+	
+	def search(self, q, **params):
+		response = self.client.get('/apis/products/search/' , dict(params , q=q))
+		self.assertEqual(response.status_code , 200)
+		return response.data
+	
+	def test_search_chinese(self):
+		data = self.search('尚未有產品')
+		self.assertEqual(data['count'] , 1)
+		self.assertEqual(data['results'][0]['id'] , 3)
+		
+		self.assertEqual([p['id'] for p in self.search('無頭琴')['results']] , [1])
+	
+	def test_search_ranked(self): #出現較多次的排在前面
+		self.assertEqual([p['id'] for p in self.search('python')['results']] , [2 , 3])
+	
+	def test_search_all_terms(self): #每一個詞都需要符合
+		self.assertEqual([p['id'] for p in self.search('python django')['results']] , [3])
+	
+	def test_search_short_term(self): #少於3個字時使用icontains
+		self.assertEqual([p['id'] for p in self.search('開發')['results']] , [2 , 3])
+	
+	def test_search_fts5_syntax_is_escaped(self):
+		self.assertEqual(self.search('"python" OR NEAR(')['count'] , 0)
+	
+	def test_search_paginated(self):
+		data = self.search('python' , page_size=1 , fields='id,name')
+		self.assertEqual(data['results'] , [{'id': 2 , 'name': 'Python Web介面開發與自動化測試'}])
+		self.assertEqual(self.client.get(data['next']).data['results'][0]['id'] , 3)
+	
+	def test_index_follows_update_and_delete(self): #save、update()、delete都會更新index
+		Product.objects.filter(pk=1).update(description = '電吉他')
+		self.assertEqual(self.search('無頭琴')['count'] , 0)
+		self.assertEqual(self.search('電吉他')['count'] , 1)
+		
+		Product.objects.get(pk=1).delete()
+		self.assertEqual(self.search('電吉他')['count'] , 0)
+	
+	def test_missing_q(self):
+		response = self.client.get('/apis/products/search/')
+		self.assertEqual(response.status_code , 400)
+
+class ProductFilterTest(TestCase): #測試ProductList的範圍filter與排序(apiapp/filters.py)
+	def setUp(self):
+		#建立test database，然後新增一個普通user、三個Category的instance、五個Product的instance
+		user = User.objects.create_user(username='jacob',  password='top1secret23')
+		book = Category.objects.create(name = 'book')
+		guitar = Category.objects.create(name = 'guitar')
+		Category.objects.create(name = 'CD')
+		
+		for category, price, stock in ((book, 300, 1) , (guitar, 100, 0) , (book, 200, 5) , (guitar, 300, 2) , (book, 50, 0)):
+			Product.objects.create(category = category , name = 'p%d' % price , price = price , stock = stock , owner = user)
+	
+	def ids(self, query):
+		response = self.client.get('/apis/products/?' + query)
+		self.assertEqual(response.status_code , 200)
+		return [p['id'] for p in response.data['results']]
+	
+	def test_price_range(self):
+		self.assertEqual(self.ids('price_min=100&price_max=300') , [1 , 2 , 3 , 4])
+		self.assertEqual(self.ids('price_min=100&price_max=200') , [2 , 3])
+	
+	def test_in_stock(self):
+		self.assertEqual(self.ids('in_stock=true') , [1 , 3 , 4])
+		self.assertEqual(self.ids('in_stock=false') , [2 , 5])
+	
+	def test_multiple_categories(self):
+		self.assertEqual(self.ids('category=book,guitar') , [1 , 2 , 3 , 4 , 5])
+		self.assertEqual(self.ids('category=guitar,CD') , [2 , 4])
+	
+	def test_ordering(self): #價錢相同時依照id，方向與第一個排序欄位相同
+		self.assertEqual(self.ids('ordering=price') , [5 , 2 , 3 , 1 , 4])
+		self.assertEqual(self.ids('ordering=-price') , [4 , 1 , 3 , 2 , 5])
+		self.assertEqual(self.ids('ordering=price,-id') , [5 , 2 , 3 , 4 , 1])
+		self.assertEqual(self.ids('category=book&in_stock=true&ordering=-price') , [1 , 3])
+	
+	def test_ordering_paginated_with_fields(self): #cursor分頁使用相同的排序，fields沒有price時也可以分頁
+		response = self.client.get('/apis/products/?ordering=price&page_size=2&fields=name')
+		names = [p['name'] for p in response.data['results']]
+		while response.data['next']:
+			response = self.client.get(response.data['next'])
+			names.extend(p['name'] for p in response.data['results'])
+		self.assertEqual(names , ['p50' , 'p100' , 'p200' , 'p300' , 'p300'])
+	
+	def test_invalid_values(self): #不在白名單中的排序欄位、錯誤的數值回傳400
+		response = self.client.get('/apis/products/?ordering=description&price_min=abc&in_stock=maybe')
+		self.assertEqual(response.status_code , 400)
+		self.assertEqual(set(response.data) , {'ordering' , 'price_min' , 'in_stock'})
+		
+		self.assertEqual(self.client.get('/apis/products/?price_max=-1').status_code , 400)
+		#超過PositiveIntegerField的上限
+		response = self.client.get('/apis/products/?price_min=100000000000000000000&price_max=2147483648')
+		self.assertEqual(response.status_code , 400)
+		self.assertEqual(set(response.data) , {'price_min' , 'price_max'})
+		self.assertEqual(self.ids('price_max=2147483647') , [1 , 2 , 3 , 4 , 5])
+		self.assertEqual(self.client.get('/apis/products/?ordering=price&stream=1').status_code , 200)
+
+class ProductStockTest(TestCase): #測試ProductStock、ProductStockBatch扣除庫存
+	def setUp(self):
+		#建立test database，然後新增一個普通user、一個Category的instance、兩個Product的instance
+		user = User.objects.create_user(username='jacob',  password='top1secret23')
+		Category.objects.create(name = 'book')
+		Product.objects.create(category_id = 1 , name = 'product0' , stock = 5 , owner = user)
+		Product.objects.create(category_id = 1 , name = 'product1' , stock = 1 , owner = user)
+		
+		obtaintJsonWebToken = self.client.post('/api/token/' , 
+			{'username':'jacob' , 'password':'top1secret23'} , 
+			content_type='application/json'
+			)
+		self.c = Client(HTTP_AUTHORIZATION='Bearer ' + obtaintJsonWebToken.data['access'])
+	
+	def stock(self):
+		return list(Product.objects.order_by('id').values_list('stock' , flat=True))
+	
+	def test_AnonymousUser_post(self):
+		response = self.client.post('/apis/product/1/stock/' , {'quantity': 1} , content_type='application/json')
+		self.assertEqual(response.status_code , 401)
+	
+	def test_reserve(self): #JWT的user之後只需要一個UPDATE
+		self.c.post('/apis/product/1/stock/' , {'quantity': 1} , content_type='application/json')
+		with self.assertNumQueries(3): #SAVEPOINT、UPDATE、RELEASE SAVEPOINT
+			response = self.c.post('/apis/product/1/stock/' , {'quantity': 3} , content_type='application/json')
+		self.assertEqual(response.status_code , 204)
+		self.assertEqual(self.stock() , [1 , 1])
+	
+	def test_insufficient_stock(self):
+		response = self.c.post('/apis/product/1/stock/' , {'quantity': 6} , content_type='application/json')
+		self.assertEqual(response.status_code , 409)
+		self.assertEqual(self.stock() , [5 , 1])
+	
+	def test_invalid_quantity_and_missing_product(self):
+		response = self.c.post('/apis/product/1/stock/' , {'quantity': 0} , content_type='application/json')
+		self.assertEqual(response.status_code , 400)
+		response = self.c.post('/apis/product/9/stock/' , {'quantity': 1} , content_type='application/json')
+		self.assertEqual(response.status_code , 404)
+	
+	def test_reserve_invalidates_cache(self):
+		self.client.get('/apis/product/1/')
+		self.c.post('/apis/product/1/stock/' , {'quantity': 2} , content_type='application/json')
+		self.assertEqual(self.client.get('/apis/product/1/').data['stock'] , 3)
+	
+	def test_batch(self): #同一個product出現多次時合併數量
+		response = self.c.post('/apis/products/stock/' , 
+			[{'id': 1 , 'quantity': 2} , {'id': 2 , 'quantity': 1} , {'id': 1 , 'quantity': 3}] , content_type='application/json')
+		self.assertEqual(response.status_code , 204)
+		self.assertEqual(self.stock() , [0 , 0])
+	
+	def test_batch_all_or_nothing(self): #任何一個product庫存不足時全部不扣除
+		response = self.c.post('/apis/products/stock/' , 
+			[{'id': 1 , 'quantity': 2} , {'id': 2 , 'quantity': 2}] , content_type='application/json')
+		self.assertEqual(response.status_code , 409)
+		self.assertEqual(response.data , [{} , {'quantity': ['Insufficient stock.']}])
+		self.assertEqual(self.stock() , [5 , 1])
+		
+		response = self.c.post('/apis/products/stock/' , 
+			[{'id': 9 , 'quantity': 1} , {'id': 1 , 'quantity': 1}] , content_type='application/json')
+		self.assertEqual(response.status_code , 400)
+		self.assertEqual(list(response.data[0]) , ['id'])
+		self.assertEqual(self.stock() , [5 , 1])
+	
+	def test_batch_invalid(self):
+		response = self.c.post('/apis/products/stock/' , {'id': 1} , content_type='application/json')
+		self.assertEqual(response.status_code , 400)
+		response = self.c.post('/apis/products/stock/' , [{'id': 1 , 'quantity': -1}] , content_type='application/json')
+		self.assertEqual(response.status_code , 400)
+	
+	def test_out_of_range(self): #超過資料庫整數範圍的quantity、id回傳400，而不是500
+		response = self.c.post('/apis/product/1/stock/' , {'quantity': 100000000000000000000} , content_type='application/json')
+		self.assertEqual(response.status_code , 400)
+		response = self.c.post('/apis/product/1/stock/' , {'quantity': 2147483648} , content_type='application/json')
+		self.assertEqual(response.status_code , 400)
+		
+		response = self.c.post('/apis/products/stock/' , 
+			[{'id': 18446744073709551615 , 'quantity': 1}] , content_type='application/json')
+		self.assertEqual(response.status_code , 400)
+		self.assertEqual(list(response.data[0]) , ['id'])
+		response = self.c.post('/apis/products/stock/' , 
+			[{'id': 1 , 'quantity': 100000000000000000000}] , content_type='application/json')
+		self.assertEqual(response.status_code , 400)
+		self.assertEqual(self.stock() , [5 , 1])
+
+class CategoryStatsTest(TestCase): #測試/apis/categories/stats/與trigger維護的統計
+	def setUp(self):
+		#建立test database，然後新增一個普通user、三個Category的instance、四個Product的instance
+		self.user = User.objects.create_user(username='jacob',  password='top1secret23')
+		self.book = Category.objects.create(name = 'book')
+		self.guitar = Category.objects.create(name = 'guitar')
+		Category.objects.create(name = 'CD')
+		
+		for category, price, stock in ((self.book, 300, 1) , (self.book, 100, 4) , (self.guitar, 5000, 2) , (self.guitar, 7000, 0)):
+			Product.objects.create(category = category , name = 'p%d' % price , price = price , stock = stock , owner = self.user)
+	
+	def expected(self):
+		#直接從apiapp_product計算的結果
+		data = []
+		for category in Category.objects.order_by('id'):
+			products = list(Product.objects.filter(category=category))
+			prices = [p.price for p in products]
+			data.append({
+				'id': category.id ,
+				'name': category.name ,
+				'product_count': len(products) ,
+				'total_stock': sum(p.stock for p in products) ,
+				'total_value': sum(p.stock * p.price for p in products) ,
+				'min_price': min(prices) if prices else None ,
+				'max_price': max(prices) if prices else None ,
+				'avg_price': round(sum(prices) / len(prices) , 2) if prices else None
+				})
+		return data
+	
+	def drop_triggers(self, module):
+		#TestCase的transaction結束時rollback，trigger會回復
+		with connection.cursor() as cursor:
+			for trigger in module.TRIGGERS:
+				cursor.execute('DROP TRIGGER %s' % trigger)
+	
+	def test_stats(self):
+		self.client.get('/apis/categories/stats/') #第一次request檢查trigger是否存在
+		with self.assertNumQueries(1):
+			response = self.client.get('/apis/categories/stats/')
+		self.assertEqual(response.status_code , 200)
+		self.assertEqual(response.data['results'][0] , {'id': 1 , 'name': 'book' , 'product_count': 2 , 'total_stock': 5 , 
+			'total_value': 700 , 'min_price': 100 , 'max_price': 300 , 'avg_price': 200})
+		self.assertEqual(response.data['results'] , self.expected())
+	
+	def test_save_update_and_delete(self): #save()、update()、bulk、扣除庫存與刪除都會更新統計
+		product = Product.objects.get(name = 'p100')
+		product.price = 50
+		product.category = self.guitar
+		product.save()
+		Product.objects.filter(name = 'p300').update(stock = 10 , price = 20)
+		Product.objects.bulk_create([Product(category = self.book , name = 'bulk' , price = 900 , stock = 3 , owner = self.user)])
+		self.assertEqual(self.client.get('/apis/categories/stats/').data['results'] , self.expected())
+		
+		Product.objects.filter(name = 'p7000').delete()
+		self.guitar.delete()
+		self.assertEqual(self.client.get('/apis/categories/stats/').data['results'] , self.expected())
+	
+	def test_missing_triggers(self): #trigger不存在時回傳501，不回傳過期的統計
+		self.drop_triggers(stats)
+		with mock.patch.dict(database._installed , clear=True):
+			response = self.client.get('/apis/categories/stats/')
+		self.assertEqual(response.status_code , 501)
+		self.assertEqual(response.data['detail'].code , 'stats_unavailable')
+	
+	def test_signals_without_triggers(self): #SQLite以外的資料庫由apiapp/signals.py維護統計
+		self.drop_triggers(stats)
+		with mock.patch('apiapp.stats.uses_triggers' , return_value=False):
+			product = Product.objects.get(name = 'p100')
+			product.price = 50
+			product.category = self.guitar
+			product.save()
+			stock.reserve({product.pk: 3})
+			Product.objects.create(category = self.book , name = 'new' , price = 900 , stock = 3 , owner = self.user)
+			self.assertEqual(self.client.get('/apis/categories/stats/').data['results'] , self.expected())
+			
+			#ProductBulk的bulk_update將product移到另一個類別
+			JWT = self.client.post('/api/token/' , {'username':'jacob' , 'password':'top1secret23'} , content_type='application/json').data
+			c = Client(HTTP_AUTHORIZATION='Bearer ' + JWT['access'])
+			p5000 = Product.objects.get(name = 'p5000')
+			response = c.put('/apis/products/bulk/' , [{'id': p5000.pk , 'category': self.book.pk , 'name': 'moved' , 'price': 10 , 'stock': 1}] , 
+				content_type='application/json')
+			self.assertEqual(response.status_code , 200)
+			self.assertEqual(self.client.get('/apis/categories/stats/').data['results'] , self.expected())
+			
+			Product.objects.filter(name = 'p7000').delete()
+			self.book.delete()
+			self.assertEqual(self.client.get('/apis/categories/stats/').data['results'] , self.expected())
+	
+	def test_rebuild_command(self):
+		CategoryStats.objects.all().delete()
+		out = io.StringIO()
+		call_command('rebuild_category_stats' , stdout=out)
+		self.assertEqual(out.getvalue().strip() , 'Rebuilt statistics for 2 categories.')
+		self.assertEqual(self.client.get('/apis/categories/stats/').data['results'] , self.expected())
+
+class UserListTest(TestCase): #測試UserList的products、product_count以及POST時products的驗證
+	def setUp(self):
+		#建立test database，然後新增一個admin user、兩個普通user、一個Category的instance以及五個Product的instance
+		User.objects.create_superuser(username='admin' , email='admin@example.com' , password='top1secret23')
+		self.jacob = User.objects.create_user(username='jacob',  password='top1secret23')
+		self.kevin = User.objects.create_user(username='kevin',  password='pass12word23')
+		book = Category.objects.create(name = 'book')
+		for i in range(5):
+			Product.objects.create(category = book , name = 'book%d' % i , owner = self.jacob if i < 4 else self.kevin)
+		
+		JWT = self.client.post('/api/token/' , {'username':'admin' , 'password':'top1secret23'} , content_type='application/json').data
+		self.admin_client = Client(HTTP_AUTHORIZATION='Bearer ' + JWT['access'])
+	
+	def test_AnonymousUser_get(self):
+		response = self.client.get('/apis/users/')
+		self.assertEqual(response.status_code , 200)
+		jacob = response.data['results'][1]
+		self.assertEqual(jacob['products'] , list(self.jacob.products.order_by('id').values_list('id' , flat=True)))
+		self.assertEqual(jacob['product_count'] , 4)
+		self.assertEqual(jacob['products_url'] , 'http://testserver/apis/products/?username=jacob')
+		self.assertEqual(response.data['results'][0]['products'] , [])
+		self.assertEqual(response.data['results'][0]['product_count'] , 0)
+	
+	def test_products_preview(self): #products只列出前PREVIEW_SIZE個，product_count為全部的數量
+		with mock.patch.object(UserSerializer , 'PREVIEW_SIZE' , 2):
+			response = self.client.get('/apis/users/')
+		jacob = response.data['results'][1]
+		self.assertEqual(jacob['products'] , list(self.jacob.products.order_by('id').values_list('id' , flat=True)[:2]))
+		self.assertEqual(jacob['product_count'] , 4)
+	
+	def test_get_query_count(self): #user的數量不影響query數
+		with CaptureQueriesContext(connection) as queries:
+			self.client.get('/apis/users/')
+		for i in range(10):
+			User.objects.create_user(username='user%d' % i)
+		with self.assertNumQueries(len(queries)):
+			self.client.get('/apis/users/')
+	
+	def test_AdminUser_post(self):
+		pks = list(self.jacob.products.values_list('id' , flat=True)[:2])
+		#products以一個IN query驗證
+		with CaptureQueriesContext(connection) as queries:
+			response = self.admin_client.post('/apis/users/' , {'username': 'mary' , 'products': pks} , content_type='application/json')
+		self.assertEqual(response.status_code , 201)
+		self.assertEqual(response.data['products'] , sorted(pks))
+		self.assertEqual(response.data['product_count'] , 2)
+		self.assertEqual(sum(query['sql'].startswith('SELECT') and '"apiapp_product"."id" IN' in query['sql'] for query in queries.captured_queries) , 1)
+		self.assertEqual(set(Product.objects.filter(owner__username='mary').values_list('id' , flat=True)) , set(pks))
+	
+	def test_AdminUser_post_invalid_products(self):
+		response = self.admin_client.post('/apis/users/' , {'username': 'mary' , 'products': [1 , 999 , 'x']} , content_type='application/json')
+		self.assertEqual(response.status_code , 400)
+		self.assertIn('products' , response.data)
+		self.assertFalse(User.objects.filter(username='mary').exists())
+
+class DatabaseBackendTest(TestCase): #測試apiapp/backends/sqlite3的OPTIONS以及connection的health check
+	def test_pragmas(self):
+		with connection.cursor() as cursor:
+			cursor.execute('PRAGMA synchronous')
+			self.assertEqual(cursor.fetchone()[0] , 1) #NORMAL
+			cursor.execute('PRAGMA busy_timeout')
+			self.assertEqual(cursor.fetchone()[0] , 20000)
+	
+	def test_custom_options_not_passed_to_sqlite3(self):
+		params = connection.get_connection_params()
+		self.assertNotIn('pragmas' , params)
+		self.assertNotIn('transaction_mode' , params)
+		self.assertEqual(params['timeout'] , 20)
+	
+	def test_begin_immediate(self):
+		with mock.patch.object(connection , 'cursor') as cursor:
+			connection._start_transaction_under_autocommit()
+		cursor.return_value.execute.assert_called_once_with('BEGIN IMMEDIATE')
+	
+	def test_check_connections(self): #無法使用的connection在request開始時關閉
+		usable = mock.Mock(connection=object() , settings_dict={'CONN_MAX_AGE': 60} , in_atomic_block=False)
+		usable.is_usable.return_value = True
+		broken = mock.Mock(connection=object() , settings_dict={'CONN_MAX_AGE': 60} , in_atomic_block=False)
+		broken.is_usable.return_value = False
+		with mock.patch.object(database , 'connections') as connections:
+			connections.all.return_value = [usable , broken]
+			database.check_connections()
+		usable.close.assert_not_called()
+		broken.close.assert_called_once_with()
+	
+	def test_other_backends(self): #PostgreSQL等沒有SQLite trigger、FTS5的資料庫
+		user = User.objects.create_user(username='jacob' , password='top1secret23')
+		book = Category.objects.create(name='book')
+		Product.objects.create(category=book , name='guitar' , description='headless guitar' , owner=user)
+		with mock.patch.object(connection , 'vendor' , 'postgresql'):
+			#不建立trigger、FTS5 table
+			with self.assertNumQueries(0):
+				search.install()
+				stats.install()
+			self.assertFalse(database.uses_triggers('default'))
+			self.assertTrue(stats.available())
+			#全文搜尋改用icontains
+			with CaptureQueriesContext(connection) as queries:
+				response = self.client.get('/apis/products/search/' , {'q': 'headless'})
+			self.assertEqual([p['name'] for p in response.data['results']] , ['guitar'])
+			self.assertFalse(any(search.TABLE in query['sql'] for query in queries.captured_queries))
+
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsTest(TestCase): #測試apiapp/metrics.py的Server-Timing與/metrics
+	def setUp(self):
+		metrics.registry.clear()
+		user = User.objects.create_user(username='jacob' , password='top1secret23')
+		category = Category.objects.create(name='phone')
+		self.product = Product.objects.create(category=category , name='iphone' , stock=3 , price=100 , owner=user)
+	
+	def test_server_timing(self):
+		response = self.client.get('/apis/product/%d/' % self.product.pk)
+		self.assertEqual(response.status_code , 200)
+		timing = response['Server-Timing']
+		self.assertRegex(timing , r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, render;dur=[\d.]+, compress;dur=[\d.]+, app;dur=[\d.]+, total;dur=[\d.]+$')
+	
+	def test_metrics_endpoint(self):
+		self.client.get('/apis/product/%d/' % self.product.pk)
+		self.client.get('/apis/product/%d/' % self.product.pk)
+		self.client.get('/does-not-exist/')
+		response = self.client.get('/metrics')
+		self.assertEqual(response.status_code , 200)
+		self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+		body = response.content.decode()
+		self.assertIn('# TYPE productapi_request_duration_seconds histogram' , body)
+		self.assertIn('productapi_request_duration_seconds_count{route="apis/product/<int:pk>/",method="GET"} 2' , body)
+		self.assertIn('productapi_request_duration_seconds_count{route="unmatched",method="GET"} 1' , body)
+		self.assertIn('productapi_request_phase_duration_seconds_count{route="apis/product/<int:pk>/",method="GET",phase="db"} 2' , body)
+		self.assertIn('productapi_request_queries_bucket{route="apis/product/<int:pk>/",method="GET",le="+Inf"} 2' , body)
+	
+	def test_timed_excludes_queries(self): #serialize中執行的SQL只算在db
+		def slow(execute, sql, params, many, context):
+			time.sleep(0.05)
+			return execute(sql, params, many, context)
+		
+		request_metrics = metrics.RequestMetrics()
+		metrics._local.metrics = request_metrics
+		try:
+			with connection.execute_wrapper(request_metrics.execute) , connection.execute_wrapper(slow):
+				with metrics.timed('serialize'):
+					Product.objects.count()
+		finally:
+			metrics._local.metrics = None
+		self.assertEqual(request_metrics.queries , 1)
+		self.assertGreaterEqual(request_metrics.durations['db'] , 0.05)
+		self.assertLess(request_metrics.durations['serialize'] , 0.05)
+	
+	def test_render_excludes_later_middleware(self): #render()結束時停止計時，之後的middleware不算在render
+		def get_response(request):
+			response = Response({'id': 1})
+			response.accepted_renderer = JSONRenderer()
+			response.accepted_media_type = 'application/json'
+			response.renderer_context = {}
+			response = middleware.process_template_response(request , response)
+			response.render()
+			time.sleep(0.05) #render之後的middleware
+			return response
+		
+		middleware = metrics.MetricsMiddleware(get_response)
+		response = middleware(APIRequestFactory().get('/apis/products/'))
+		timing = {phase: float(dur) for phase, dur in re.findall(r'(\w+);dur=([\d.]+)' , response['Server-Timing'])}
+		self.assertLess(timing['render'] , 50)
+		self.assertGreaterEqual(timing['app'] , 50)
+	
+	@override_settings(COMPRESSION_MIN_SIZE=0)
+	def test_render_excludes_compress(self): #CompressionMiddleware在render之後壓縮，壓縮的時間只算在compress
+		compress = compression.GzipCodec.compress
+		def slow(codec, data):
+			time.sleep(0.05)
+			return compress(codec, data)
+		
+		with mock.patch.object(compression.GzipCodec , 'compress' , slow):
+			response = self.client.get('/apis/products/' , HTTP_ACCEPT_ENCODING='gzip')
+		self.assertEqual(response['Content-Encoding'] , 'gzip')
+		timing = {phase: float(dur) for phase, dur in re.findall(r'(\w+);dur=([\d.]+)' , response['Server-Timing'])}
+		self.assertGreaterEqual(timing['compress'] , 50)
+		self.assertLess(timing['render'] , 50)
+		self.assertLess(timing['app'] , 50)
+	
+	@override_settings(METRICS_ENABLED=False)
+	def test_disabled(self):
+		response = self.client.get('/apis/product/%d/' % self.product.pk)
+		self.assertFalse(response.has_header('Server-Timing'))
+		self.assertEqual(self.client.get('/metrics').status_code , 404)
+
+
+
+class FastJSONTest(TestCase): #測試apiapp/renderers.py、parsers.py與REST framework的JSONRenderer、JSONParser相同
+	data = {
+		'name': '手機' ,
+		'description': '尚未有產品說明\u2028第二行' ,
+		'price': decimal.Decimal('12.50') ,
+		'updated_at': datetime.datetime(2020, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc) ,
+		'ids': [1 , 2 , 3] ,
+		1: None ,
+		}
+	
+	def test_same_bytes_as_json_renderer(self):
+		expected = JSONRenderer().render(self.data)
+		self.assertEqual(renderers.FastJSONRenderer().render(self.data) , expected)
+		self.assertIn('手機'.encode('utf-8') , expected)
+		with mock.patch.object(renderers , 'orjson' , None):
+			self.assertEqual(renderers.FastJSONRenderer().render(self.data) , expected)
+	
+	def test_fallback(self):
+		#orjson無法處理超過64 bit的整數，改用json module
+		self.assertEqual(renderers.dumps({'n': 2 ** 70}) , b'{"n":1180591620717411303424}')
+		self.assertEqual(renderers.FastJSONRenderer().render(None) , b'')
+		self.assertEqual(renderers.FastJSONRenderer().render({'a': 1} , 'application/json; indent=2') , b'{\n  "a": 1\n}')
+	
+	def test_parser(self):
+		parser = FastJSONParser()
+		self.assertEqual(parser.parse(io.BytesIO('{"name": "手機"}'.encode('utf-8'))) , {'name': '手機'})
+		for body in (b'{"name": ' , b'[NaN]'):
+			with self.assertRaises(ParseError):
+				parser.parse(io.BytesIO(body))
+		#超過64 bit的整數與JSONParser相同，仍然是int
+		for body in (b'{"id": 100000000000000000000}' , b'[-9223372036854775809 , 18446744073709551615 , 1e20]'):
+			self.assertEqual(parser.parse(io.BytesIO(body)) , JSONParser().parse(io.BytesIO(body)))
+		self.assertEqual(parser.parse(io.BytesIO(b'{"id": 100000000000000000000}')) , {'id': 10 ** 20})
+	
+	def test_response_not_escaped(self):
+		user = User.objects.create_user(username='jacob' , password='top1secret23')
+		category = Category.objects.create(name='手機')
+		product = Product.objects.create(category=category , name='iphone' , stock=3 , price=100 , owner=user)
+		response = self.client.get('/apis/product/%d/' % product.pk)
+		self.assertIn('"description":"尚未有產品說明"'.encode('utf-8') , response.content)
+		self.assertNotIn(b'\\u' , response.content)
+
+
+
+class CompressionTest(TestCase): #測試apiapp/compression.py的壓縮以及response cache中壓縮後的bytes
+	def setUp(self):
+		user = User.objects.create_user(username='jacob' , password='top1secret23')
+		category = Category.objects.create(name='book')
+		for i in range(30):
+			Product.objects.create(category=category , name='product%d' % i , stock=10 , price=550 , owner=user)
+		self.product = Product.objects.order_by('id').first()
+	
+	def test_negotiate(self):
+		with mock.patch.dict(compression.CODECS , {'br': compression.GzipCodec}):
+			self.assertEqual(compression.negotiate('gzip, deflate, br') , 'br')
+			self.assertEqual(compression.negotiate('br;q=0.5, gzip') , 'gzip')
+			self.assertEqual(compression.negotiate('br;q=0, *') , 'gzip')
+		self.assertEqual(compression.negotiate('gzip;q=0') , None)
+		self.assertEqual(compression.negotiate('identity') , None)
+		self.assertEqual(compression.negotiate('') , None)
+	
+	def test_list_gzip(self):
+		plain = self.client.get('/apis/products/')
+		self.assertFalse(plain.has_header('Content-Encoding'))
+		self.assertIn('Accept-Encoding' , plain['Vary'])
+		
+		response = self.client.get('/apis/products/' , HTTP_ACCEPT_ENCODING='gzip')
+		self.assertEqual(response['Content-Encoding'] , 'gzip')
+		self.assertEqual(int(response['Content-Length']) , len(response.content))
+		self.assertLess(len(response.content) , len(plain.content))
+		self.assertEqual(gzip.decompress(response.content) , plain.content)
+	
+	def test_strong_etag_becomes_weak(self):
+		response = HttpResponse(b'x' * 2000 , content_type='application/json')
+		response['ETag'] = '"abc"'
+		compression.set_encoded(response , 'gzip' , compression.compress('gzip' , response.content))
+		self.assertEqual(response['ETag'] , 'W/"abc"')
+		self.assertEqual(gzip.decompress(response.content) , b'x' * 2000)
+	
+	def test_small_response_not_compressed(self):
+		response = self.client.get('/apis/categories/' , HTTP_ACCEPT_ENCODING='gzip')
+		self.assertFalse(response.has_header('Content-Encoding'))
+	
+	def test_stream(self):
+		plain = b''.join(self.client.get('/apis/products/?stream=1').streaming_content)
+		response = self.client.get('/apis/products/?stream=1' , HTTP_ACCEPT_ENCODING='gzip')
+		self.assertEqual(response['Content-Encoding'] , 'gzip')
+		self.assertEqual(gzip.decompress(b''.join(response.streaming_content)) , plain)
+	
+	@override_settings(COMPRESSION_MIN_SIZE=0)
+	def test_cached_response_compressed_once(self): #cache hit時使用cache中壓縮後的bytes，不再壓縮
+		url = '/apis/product/%d/' % self.product.pk
+		plain = self.client.get(url)
+		with mock.patch('apiapp.cache.compress' , wraps=compression.compress) as compress:
+			first = self.client.get(url , HTTP_ACCEPT_ENCODING='gzip')
+			hits = product_cache.stats()['compressed_hits']
+			second = self.client.get(url , HTTP_ACCEPT_ENCODING='gzip')
+		self.assertEqual(compress.call_count , 1)
+		self.assertEqual(product_cache.stats()['compressed_hits'] , hits + 1)
+		self.assertEqual(second['Content-Encoding'] , 'gzip')
+		self.assertEqual(second.content , first.content)
+		self.assertEqual(gzip.decompress(second.content) , plain.content)
+		self.assertEqual(second['ETag'] , plain['ETag'])
+		#壓縮的ETag與沒有壓縮的相同(weak比較)，If-None-Match仍然回傳304
+		self.assertEqual(self.client.get(url , HTTP_ACCEPT_ENCODING='gzip' , HTTP_IF_NONE_MATCH=second['ETag']).status_code , 304)
+	
+	@override_settings(COMPRESSION_MIN_SIZE=0)
+	def test_cache_miss_compressed_for_request(self): #cache miss時壓縮後的bytes也存入cache
+		url = '/apis/product/%d/' % self.product.pk
+		first = self.client.get(url , HTTP_ACCEPT_ENCODING='gzip')
+		self.assertEqual(first['Content-Encoding'] , 'gzip')
+		with mock.patch('apiapp.cache.compress') as compress:
+			second = self.client.get(url , HTTP_ACCEPT_ENCODING='gzip')
+		compress.assert_not_called()
+		self.assertEqual(second.content , first.content)
+
+
+
+class ProductChangesTest(TestCase): #測試/apis/products/changes/與apiapp/changes.py的trigger、compaction
+	def setUp(self):
+		self.user = User.objects.create_user(username='jacob' , password='top1secret23')
+		self.other = User.objects.create_user(username='edgar' , password='top1secret23')
+		self.book = Category.objects.create(name='book')
+		self.phone = Category.objects.create(name='phone')
+		self.products = [
+			Product.objects.create(category=self.book , name='product%d' % i , stock=10 , price=550 , owner=self.user)
+			for i in range(3)
+			]
+		self.cursor = self.client.get('/apis/products/changes/').data['cursor']
+	
+	def get_changes(self, since=None, **params):
+		params['since'] = self.cursor if since is None else since
+		response = self.client.get('/apis/products/changes/' , params)
+		self.assertEqual(response.status_code , 200)
+		return response.data
+	
+	def test_head(self):
+		data = self.client.get('/apis/products/changes/').data
+		self.assertEqual(data , {'cursor': self.cursor , 'next': None , 'results': []})
+		self.assertEqual(self.get_changes() , {'cursor': self.cursor , 'next': None , 'results': []})
+	
+	def test_changes_collapsed_in_commit_order(self):
+		first , second , third = self.products
+		second.name = 'renamed'
+		second.save()
+		Product.objects.filter(pk=first.pk).update(stock=0) #update()也會記錄
+		second.save()
+		third_id = third.pk
+		third.delete()
+		new = Product.objects.create(category=self.phone , name='new' , stock=1 , price=1 , owner=self.other)
+		
+		with self.assertNumQueries(2):
+			data = self.get_changes()
+		self.assertEqual([(row['product_id'] , row['action']) for row in data['results']] , 
+			[(first.pk , 'updated') , (second.pk , 'updated') , (third_id , 'deleted') , (new.pk , 'created')])
+		self.assertEqual(data['results'][0]['product']['stock'] , 0)
+		self.assertEqual(data['results'][1]['product']['name'] , 'renamed')
+		self.assertIsNone(data['results'][2]['product'])
+		self.assertEqual(data['results'][3]['product']['owner'] , 'edgar')
+		self.assertEqual(data['cursor'] , data['results'][-1]['id'])
+		self.assertEqual(self.get_changes(data['cursor'])['results'] , [])
+	
+	def test_cascade_delete(self): #Category、User刪除時cascade刪除的product也有tombstone
+		Product.objects.create(category=self.phone , name='phone' , stock=1 , price=1 , owner=self.other)
+		cursor = self.get_changes()['cursor']
+		self.book.delete()
+		self.other.delete()
+		results = self.get_changes(cursor)['results']
+		self.assertEqual(len(results) , 4)
+		self.assertTrue(all(row['action'] == 'deleted' and row['product'] is None for row in results))
+	
+	def test_owner_rename(self):
+		self.user.username = 'jacob2'
+		self.user.save()
+		results = self.get_changes()['results']
+		self.assertEqual([row['product']['owner'] for row in results] , ['jacob2'] * 3)
+	
+	def test_page_size(self):
+		for product in self.products:
+			product.save()
+		data = self.get_changes(page_size=2)
+		self.assertEqual(len(data['results']) , 2)
+		self.assertIn('since=%d' % data['cursor'] , data['next'])
+		response = self.client.get(data['next'])
+		self.assertEqual([row['product_id'] for row in response.data['results']] , [self.products[2].pk])
+		self.assertIsNone(response.data['next'])
+	
+	def test_largest_since(self):
+		self.assertEqual(self.get_changes(2 ** 63 - 1)['results'] , [])
+	
+	def test_missing_triggers(self): #trigger不存在時回傳501，不回傳看起來正常的空結果
+		with connection.cursor() as cursor:
+			for trigger in changes.TRIGGERS:
+				cursor.execute('DROP TRIGGER %s' % trigger)
+		with mock.patch.dict(database._installed , clear=True):
+			for params in ({} , {'since': self.cursor}):
+				response = self.client.get('/apis/products/changes/' , params)
+				self.assertEqual(response.status_code , 501)
+				self.assertEqual(response.data['detail'].code , 'changes_unavailable')
+	
+	def test_signals_without_triggers(self): #SQLite以外的資料庫由apiapp/signals.py記錄變更
+		with connection.cursor() as cursor:
+			for trigger in changes.TRIGGERS:
+				cursor.execute('DROP TRIGGER %s' % trigger)
+		first , second , third = [product.pk for product in self.products]
+		with mock.patch('apiapp.changes.uses_triggers' , return_value=False):
+			self.products[0].save()
+			new = Product.objects.create(category=self.phone , name='new' , stock=1 , price=1 , owner=self.other)
+			stock.reserve({second: 1})
+			self.other.username = 'edgar2'
+			self.other.save()
+			serializer = UserSerializer(data={'username': 'kevin' , 'products': [third]})
+			self.assertTrue(serializer.is_valid() , serializer.errors)
+			serializer.save()
+			self.book.delete()
+			
+			rows = list(ProductChange.objects.filter(id__gt=self.cursor).values_list('product_id' , 'action'))
+			results = self.get_changes()['results']
+		self.assertEqual(rows[:5] , [(first , 'updated') , (new.pk , 'created') , (second , 'updated') , (new.pk , 'updated') , (third , 'updated')])
+		#cascade刪除的順序由Django決定
+		self.assertEqual(sorted(rows[5:]) , [(first , 'deleted') , (second , 'deleted') , (third , 'deleted')])
+		self.assertEqual((results[0]['product_id'] , results[0]['action']) , (new.pk , 'updated'))
+		self.assertEqual(results[0]['product']['owner'] , 'edgar2')
+		self.assertEqual(sorted((row['product_id'] , row['action']) for row in results[1:]) , sorted(rows[5:]))
+	
+	def test_invalid_since(self):
+		for since in ('abc' , '-1' , '' , '100000000000000000000' , str(2 ** 63)):
+			response = self.client.get('/apis/products/changes/' , {'since': since})
+			self.assertEqual(response.status_code , 400)
+	
+	def test_compact(self):
+		first = self.products[0]
+		first.save()
+		first.save()
+		#product的前兩筆變更被最新的一筆取代
+		self.assertEqual(changes.compact(datetime.timedelta(days=30)) , 2)
+		self.assertEqual(ProductChange.objects.filter(product_id=first.pk).count() , 1)
+		self.assertEqual([row['product_id'] for row in self.get_changes(0)['results']] , [self.products[1].pk , self.products[2].pk , first.pk])
+		
+		#超過保留期間的紀錄被刪除，比最後一筆舊的cursor回傳410
+		ProductChange.objects.update(changed_at=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=31))
+		cursor = self.get_changes(0)['cursor']
+		first.save()
+		out = io.StringIO()
+		call_command('compact_product_changes' , days=30 , stdout=out)
+		self.assertEqual(out.getvalue() , 'Deleted 2 product changes.\n')
+		response = self.client.get('/apis/products/changes/' , {'since': 0})
+		self.assertEqual(response.status_code , 410)
+		self.assertEqual(response.data['detail'].code , 'cursor_expired')
+		self.assertEqual([row['product_id'] for row in self.get_changes(cursor)['results']] , [first.pk])
@@ -4,11 +4,18 @@ from django.urls import path
 
 urlpatterns = [
 	path('apis/categories/', views.CategoryList.as_view()),
+	path('apis/categories/stats/', views.CategoryStatsList.as_view()),
 	path('apis/category/<int:pk>/', views.CategoryDetail.as_view()),
 	path('apis/products/', views.ProductList.as_view()),
+	path('apis/products/bulk/', views.ProductBulk.as_view()),
+	path('apis/products/changes/', views.ProductChanges.as_view()),
+	path('apis/products/search/', views.ProductSearch.as_view()),
+	path('apis/products/stock/', views.ProductStockBatch.as_view()),
 	path('apis/product/<int:pk>/', views.ProductDetail.as_view()),
+	path('apis/product/<int:pk>/stock/', views.ProductStock.as_view()),
 	path('apis/users/', views.UserList.as_view()),
 	path('apis/user/<int:pk>/', views.UserDetail.as_view()),
+	path('apis/cache/stats/', views.CacheStats.as_view()),
 	]
 
 #urlpatterns = format_suffix_patterns(urlpatterns)
\ No newline at end of file
@@ -1,12 +1,40 @@
-from .models import Category,Product
+from .models import Category,Product,ProductChange
 from .serializers import CategorySerializer,ProductSerializer,UserSerializer
+from .serializers import CategoryReadSerializer,ProductReadSerializer
+from .serializers import StockReservationSerializer , BulkStockReservationSerializer
+from .mixins import ReadListModelMixin , ReadRetrieveModelMixin , CachedListMixin , CachedRetrieveMixin
+from .mixins import ConditionalListMixin , ConditionalRetrieveMixin , SparseFieldsMixin
+from .cache import category_list_cache , product_cache , registered_caches
+from .metrics import timed
+from .signals import products_bulk_saved
 from .permissions import IsOwnerOrReadOnly , ReadOnly
+from .pagination import KeysetPagination , SearchPagination
+from .filters import ProductFilterBackend
+from .search import search_products
+from .stats import StatsUnavailable , available as stats_available
+from .changes import ChangesUnavailable , available as changes_available , changes_since , head
+from .stock import StockError , reserve
+from .streaming import stream_json_array , stream_ndjson
 
 from rest_framework import generics
 from rest_framework import mixins
 from rest_framework import permissions
+from rest_framework import status
+from rest_framework.exceptions import NotFound , PermissionDenied , ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
 
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count , OuterRef , Subquery
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+#每個user的product數量，correlated subquery只為回傳的user讀取(owner, id)的index，不需要JOIN、GROUP BY整個apiapp_product
+product_counts = Product.objects.filter(owner=OuterRef('pk')).order_by().values('owner').annotate(count=Count('id')).values('count')
+users_with_product_count = User.objects.annotate(product_count=Coalesce(Subquery(product_counts), 0))
 
 class UserList(mixins.ListModelMixin,
 				mixins.CreateModelMixin,
@@ -15,7 +43,7 @@ class UserList(mixins.ListModelMixin,
 	user.is_staff為True時才會允許POST權限，未身分驗證以及一般使用者只能GET。
 	'''
 	permission_classes = [permissions.IsAdminUser|ReadOnly] #使用 OR (|) 結合兩種不同的權限管理
-	queryset = User.objects.all()
+	queryset = users_with_product_count
 	serializer_class = UserSerializer
 	
 	def get(self, request, *args, **kwargs):
@@ -29,19 +57,24 @@ class UserDetail(generics.RetrieveAPIView):
 	user.is_staff為True時才會允許權限。
 	'''
 	permission_classes = [permissions.IsAdminUser]
-	queryset = User.objects.all()
+	queryset = users_with_product_count
 	serializer_class = UserSerializer
 
 
-class CategoryList(mixins.ListModelMixin,
+class CategoryList(CachedListMixin,
+					ConditionalListMixin,
+					ReadListModelMixin,
 					mixins.CreateModelMixin,
 					generics.GenericAPIView):
 	'''
 	只有驗證過的user可以寫入，未驗證的user只有readonly
+	category很少改變而每個頁面都會讀取，GET的response存放在category_list_cache，category改變時invalidate
 	'''
 	permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 	queryset = Category.objects.all()
 	serializer_class = CategorySerializer
+	read_serializer_class = CategoryReadSerializer
+	response_cache = category_list_cache
 	
 	
 	def get(self, request, *args, **kwargs):
@@ -50,7 +83,44 @@ class CategoryList(mixins.ListModelMixin,
 	def post(self, request, *args, **kwargs):
 		return self.create(request, *args, **kwargs)
 
-class CategoryDetail(mixins.RetrieveModelMixin,
+class CategoryStatsList(generics.GenericAPIView):
+	'''
+	每個類別的product數量、庫存總和、庫存價值以及最低、最高、平均價錢
+	讀取apiapp_categorystats(apiapp/stats.py)，只需要一個query，與product的數量無關
+	統計沒有被維護(SQLite的trigger不存在)時回傳501，不回傳過期的數字
+	'''
+	permission_classes = [ReadOnly]
+	queryset = Category.objects.all()
+	columns = ('id' , 'name' , 'stats__product_count' , 'stats__total_stock' , 'stats__total_value' , 
+		'stats__price_sum' , 'stats__min_price' , 'stats__max_price')
+	
+	def get(self, request, *args, **kwargs):
+		if not stats_available(self.get_queryset().db):
+			raise StatsUnavailable()
+		page = self.paginate_queryset(self.get_queryset().values_list(*self.columns, named=True))
+		with timed('serialize'):
+			data = self.represent(page)
+		return self.get_paginated_response(data)
+	
+	def represent(self, page):
+		data = []
+		for id, name, count, stock, value, price_sum, min_price, max_price in page:
+			#還沒有product的類別沒有統計資料
+			count = count or 0
+			data.append({
+				'id': id ,
+				'name': name ,
+				'product_count': count ,
+				'total_stock': stock or 0 ,
+				'total_value': value or 0 ,
+				'min_price': min_price ,
+				'max_price': max_price ,
+				'avg_price': round(price_sum / count , 2) if count else None
+				})
+		return data
+
+class CategoryDetail(ConditionalRetrieveMixin,
+					mixins.RetrieveModelMixin,
 					mixins.UpdateModelMixin,
 					mixins.DestroyModelMixin,
 				generics.GenericAPIView):
@@ -70,7 +140,9 @@ class CategoryDetail(mixins.RetrieveModelMixin,
 	def delete(self, request, *args, **kwargs):
 		return self.destroy(request, *args, **kwargs)
 
-class ProductList(mixins.ListModelMixin,
+class ProductList(ConditionalListMixin,
+					SparseFieldsMixin,
+					ReadListModelMixin,
 					mixins.CreateModelMixin,
 					generics.GenericAPIView):
 	'''
@@ -79,32 +151,116 @@ class ProductList(mixins.ListModelMixin,
 	permission_classes = [permissions.IsAuthenticatedOrReadOnly , IsOwnerOrReadOnly]
 	#queryset = Product.objects.all()
 	serializer_class = ProductSerializer	
+	read_serializer_class = ProductReadSerializer #GET使用values_list()的快速序列化
+	filter_backends = [ProductFilterBackend] #category、username、price_min、price_max、in_stock、ordering
 	
 	def get_queryset(self):
 		"""
-		透過override get_queryset() 完成filter的功能
-		使用可以使用查詢參數category、username對product進行filter
-		example : /products/?category=book&username=edgar
+		filter與排序由ProductFilterBackend(apiapp/filters.py)處理
+		example : /products/?category=book,guitar&username=edgar&price_min=100&price_max=1000&in_stock=true&ordering=price,-id
+		依照預設的keyset分頁，page_size參數指定每頁筆數，之後使用回傳的next URL : /products/?category=book&page_size=100
+		只需要部分欄位時加上fields參數 : /products/?fields=id,name,price
 		"""
-		queryset = Product.objects.all()
-		category = self.request.query_params.get('category' , None)
-		username = self.request.query_params.get('username' , None)
-		if category is not None:
-			queryset = queryset.filter(category__name=category)
-		if username is not None:
-			queryset = queryset.filter(owner__username=username)
-		return queryset
+		return Product.objects.select_related('owner') #owner.username與product一起以JOIN取得，避免N+1 query
 	
 	def get(self, request, *args, **kwargs):
+		stream = request.query_params.get('stream' , None)
+		if stream in ('1' , 'true' , 'ndjson'): #其他的值(例如stream=0)回傳一般的list
+			return self.stream(request, stream)
 		return self.list(request, *args, **kwargs)
 
 	def post(self, request, *args, **kwargs):
 		return self.create(request, *args, **kwargs)
+	
+	def stream(self, request, mode):
+		'''
+		匯出完整的product資料 : /products/?stream=1(或true) 回傳JSON array，/products/?stream=ndjson 回傳NDJSON
+		使用StreamingHttpResponse一邊查詢一邊輸出，記憶體用量固定，client也能更快收到第一個byte
+		'''
+		queryset = self.filter_queryset(self.get_queryset())
+		serializer = self.get_read_serializer()
+		if mode == 'ndjson':
+			content = stream_ndjson(queryset, serializer)
+			content_type = 'application/x-ndjson; charset=utf-8'
+		else:
+			content = stream_json_array(queryset, serializer)
+			content_type = 'application/json; charset=utf-8'
+		return StreamingHttpResponse(content, content_type=content_type)
 		
 	def perform_create(self, serializer):
 		serializer.save(owner=self.request.user)
 
-class ProductDetail(mixins.RetrieveModelMixin,
+class ProductSearch(SparseFieldsMixin,
+					ReadListModelMixin,
+					generics.GenericAPIView):
+	'''
+	全文搜尋product的name與description : /apis/products/search/?q=無頭琴
+	使用apiapp/search.py的FTS5 trigram index，結果依照相關程度排序並分頁(page、page_size)
+	'''
+	permission_classes = [ReadOnly]
+	serializer_class = ProductSerializer
+	read_serializer_class = ProductReadSerializer
+	pagination_class = SearchPagination
+	
+	def get_queryset(self):
+		q = self.request.query_params.get('q' , '').strip()
+		if not q:
+			raise ValidationError({'q': ['This field is required.']})
+		return search_products(Product.objects.all(), q)
+	
+	def get(self, request, *args, **kwargs):
+		return self.list(request, *args, **kwargs)
+
+class ProductChanges(generics.GenericAPIView):
+	'''
+	since之後的product變更 : /apis/products/changes/?since=<cursor>，依照commit的順序，同一個product只回傳最新的狀態
+	刪除的product為tombstone(action為deleted、product為null)，讀取的是變更紀錄(apiapp/changes.py)，成本與product的總數無關
+	沒有since時只回傳目前的cursor : client先取得cursor再下載/apis/products/，之後以cursor取得變更
+	每次最多回傳page_size筆變更，還有更多變更時next為下一次的URL；cursor的變更紀錄已經被清除時回傳410
+	變更沒有被記錄(SQLite的trigger不存在)時回傳501，不回傳看起來正常的空結果
+	'''
+	permission_classes = [ReadOnly]
+	queryset = Product.objects.select_related('owner')
+	pagination_class = KeysetPagination #只使用get_page_size()
+	max_since = 2 ** 63 - 1 #超過64 bit的整數SQLite無法bind
+	
+	def get_since(self, request):
+		try:
+			since = int(request.query_params['since'])
+		except ValueError:
+			since = -1
+		if since < 0 or since > self.max_since:
+			raise ValidationError({'since': ['A valid integer is required.']})
+		return since
+	
+	def get(self, request, *args, **kwargs):
+		if not changes_available(self.get_queryset().db):
+			raise ChangesUnavailable()
+		if 'since' not in request.query_params:
+			return Response({'cursor': head() , 'next': None , 'results': []})
+		changes, cursor, more = changes_since(self.get_since(request), self.paginator.get_page_size(request))
+		
+		serializer = ProductReadSerializer(self.get_serializer_context())
+		pks = [product_id for id, product_id, action in changes if action != ProductChange.DELETED]
+		rows = {row.id: row for row in serializer.get_rows(self.get_queryset().filter(id__in=pks))} if pks else {}
+		results = []
+		with timed('serialize'):
+			for id, product_id, action in changes:
+				row = rows.get(product_id)
+				#修改之後又被刪除的product，刪除的紀錄在之後的cursor中，這裡同樣回傳tombstone
+				results.append({
+					'id': id ,
+					'action': action if row is not None else ProductChange.DELETED ,
+					'product_id': product_id ,
+					'product': serializer.to_representation(row) if row is not None else None
+					})
+		next = replace_query_param(request.build_absolute_uri(), 'since', cursor) if more else None
+		return Response({'cursor': cursor , 'next': next , 'results': results})
+
+class ProductDetail(CachedRetrieveMixin,
+					ConditionalRetrieveMixin,
+					SparseFieldsMixin,
+					ReadRetrieveModelMixin,
 					mixins.UpdateModelMixin,
 					mixins.DestroyModelMixin,
 				generics.GenericAPIView):
@@ -112,8 +268,10 @@ class ProductDetail(mixins.RetrieveModelMixin,
 	只有驗證過的owner可以寫入，未驗證的user、有驗證但非owner只有readonly
 	'''
 	permission_classes = [permissions.IsAuthenticatedOrReadOnly , IsOwnerOrReadOnly]
-	queryset = Product.objects.all()
+	queryset = Product.objects.select_related('owner')
 	serializer_class = ProductSerializer
+	read_serializer_class = ProductReadSerializer
+	response_cache = product_cache #GET的response會被cache，Product、User的signals會invalidate
 	
 	def get(self, request, *args, **kwargs):
 		return self.retrieve(request, *args, **kwargs)
@@ -122,4 +280,178 @@ class ProductDetail(mixins.RetrieveModelMixin,
 		return self.update(request, *args, **kwargs)
 
 	def delete(self, request, *args, **kwargs):
-		return self.destroy(request, *args, **kwargs)
\ No newline at end of file
+		return self.destroy(request, *args, **kwargs)
+
+class ProductBulk(generics.GenericAPIView):
+	'''
+	一次新增(POST)、修改(PUT)、刪除(DELETE)多筆product，request body為JSON array
+	POST、PUT的每一筆資料與ProductList、ProductDetail相同，PUT需要加上id，DELETE為id的array
+	全部資料都通過驗證才會在同一個transaction中寫入，否則回傳400以及每一筆資料的錯誤(順序與request相同，沒有錯誤的為{})
+	PUT、DELETE時每一筆都以IsOwnerOrReadOnly檢查是否為owner
+	'''
+	permission_classes = [permissions.IsAuthenticated]
+	queryset = Product.objects.select_related('owner')
+	serializer_class = ProductSerializer
+	max_items = 10000 #一個request最多的資料筆數
+	batch_size = 500 #DELETE每次的id數量，bulk_create、bulk_update則由Django依照資料庫的參數上限決定
+	max_id = 2 ** 63 - 1 #超過64 bit的整數SQLite無法bind，這個範圍以外的id一定不存在
+	update_fields = ['category' , 'name' , 'description' , 'image' , 'stock' , 'price' , 'updated_at']
+	
+	def get_items(self, request):
+		items = request.data
+		if not isinstance(items, list):
+			raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+		if len(items) > self.max_items:
+			raise ValidationError({'non_field_errors': ['Ensure this list has no more than %d items.' % self.max_items]})
+		return items
+	
+	def get_products(self, request, pks):
+		'''
+		以一個query取得所有product，回傳(products, errors)
+		不存在、重複或不是owner的product會在errors中對應的位置記錄錯誤
+		'''
+		valid = [pk for pk in pks if type(pk) is int and 1 <= pk <= self.max_id]
+		existing = self.get_queryset().in_bulk(valid)
+		permission = IsOwnerOrReadOnly()
+		products, errors, seen = [], [], set()
+		for pk in pks:
+			product = existing.get(pk) if type(pk) is int else None
+			if product is None:
+				errors.append({'id': [NotFound.default_detail]})
+			elif pk in seen:
+				errors.append({'id': ['Duplicate id.']})
+			elif not permission.has_object_permission(request, self, product):
+				errors.append({'detail': PermissionDenied.default_detail})
+			else:
+				errors.append({})
+			if product is not None:
+				seen.add(pk)
+			products.append(product)
+		return products, errors
+	
+	def represent(self, products):
+		#寫入後的instance已經在記憶體中，直接以ProductReadSerializer組成response，不需要再查詢
+		serializer = ProductReadSerializer(self.get_serializer_context())
+		with timed('serialize'):
+			return [serializer.to_representation(serializer.instance_row(product)) for product in products]
+	
+	def bulk_create(self, products):
+		Product.objects.bulk_create(products)
+		if products and products[0].pk is None:
+			#SQLite的bulk_create不會回傳id，寫入的transaction會lock整個資料庫，
+			#且AUTOINCREMENT的id依照寫入順序遞增，因此最後的len(products)個id就是這次新增的資料
+			pks = Product.objects.order_by('-id').values_list('id' , flat=True)[:len(products)]
+			for product, pk in zip(products, reversed(list(pks))):
+				product.pk = pk
+	
+	def post(self, request, *args, **kwargs):
+		serializer = self.get_serializer(data=self.get_items(request), many=True)
+		serializer.is_valid(raise_exception=True)
+		
+		products = [Product(owner=request.user, **data) for data in serializer.validated_data]
+		with transaction.atomic():
+			self.bulk_create(products)
+			products_bulk_saved.send(sender=Product, pks=[product.pk for product in products], created=True)
+		
+		return Response(self.represent(products), status=status.HTTP_201_CREATED)
+	
+	def put(self, request, *args, **kwargs):
+		items = self.get_items(request)
+		products, errors = self.get_products(request, [item.get('id') if isinstance(item, dict) else None for item in items])
+		
+		serializer = self.get_serializer(data=items, many=True)
+		if not serializer.is_valid():
+			for error, serializer_error in zip(errors, serializer.errors):
+				error.update(serializer_error)
+		if any(errors):
+			return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+		
+		now = timezone.now()
+		categories = {product.category_id for product in products}
+		for product, data in zip(products, serializer.validated_data):
+			for attr, value in data.items():
+				setattr(product, attr, value)
+			product.updated_at = now #bulk_update不會更新auto_now的欄位
+		with transaction.atomic():
+			Product.objects.bulk_update(products, self.update_fields)
+			products_bulk_saved.send(sender=Product, pks=[product.pk for product in products], created=False, categories=categories)
+		
+		return Response(self.represent(products))
+	
+	def delete(self, request, *args, **kwargs):
+		pks = self.get_items(request)
+		products, errors = self.get_products(request, pks)
+		if any(errors):
+			return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+		
+		#queryset.delete()會對每一筆product送出post_delete(apiapp/signals.py)
+		with transaction.atomic():
+			for i in range(0, len(pks), self.batch_size):
+				Product.objects.filter(pk__in=pks[i:i + self.batch_size]).delete()
+		
+		return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ProductStock(generics.GenericAPIView):
+	'''
+	結帳時扣除一個product的庫存 : POST {"quantity": 2}
+	以一個條件式UPDATE扣除(apiapp/stock.py)，成功時回傳204，庫存不足時回傳409，不會超賣
+	'''
+	permission_classes = [permissions.IsAuthenticated]
+	serializer_class = StockReservationSerializer
+	
+	def post(self, request, *args, **kwargs):
+		serializer = self.get_serializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		try:
+			reserve({self.kwargs['pk']: serializer.validated_data['quantity']})
+		except StockError as e:
+			if e.missing:
+				raise NotFound
+			return Response({'detail': 'Insufficient stock.'}, status=status.HTTP_409_CONFLICT)
+		return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ProductStockBatch(generics.GenericAPIView):
+	'''
+	一次扣除多個product的庫存 : POST [{"id": 1, "quantity": 2}, {"id": 3, "quantity": 1}]
+	全部成功才會寫入，否則回傳每一筆資料的錯誤(順序與request相同，沒有錯誤的為{}) :
+	不存在的product回傳400，庫存不足回傳409
+	'''
+	permission_classes = [permissions.IsAuthenticated]
+	serializer_class = BulkStockReservationSerializer
+	max_items = 1000 #一個request最多的資料筆數
+	
+	def post(self, request, *args, **kwargs):
+		items = request.data
+		if not isinstance(items, list) or not items:
+			raise ValidationError({'non_field_errors': ['Expected a non-empty list of items.']})
+		if len(items) > self.max_items:
+			raise ValidationError({'non_field_errors': ['Ensure this list has no more than %d items.' % self.max_items]})
+		serializer = self.get_serializer(data=items, many=True)
+		serializer.is_valid(raise_exception=True)
+		
+		#同一個product出現多次時合併數量
+		quantities = {}
+		for item in serializer.validated_data:
+			quantities[item['id']] = quantities.get(item['id'] , 0) + item['quantity']
+		try:
+			reserve(quantities)
+		except StockError as e:
+			errors = []
+			for item in serializer.validated_data:
+				if item['id'] in e.missing:
+					errors.append({'id': [NotFound.default_detail]})
+				elif item['id'] in e.insufficient:
+					errors.append({'quantity': ['Insufficient stock.']})
+				else:
+					errors.append({})
+			return Response(errors, status=status.HTTP_400_BAD_REQUEST if e.missing else status.HTTP_409_CONFLICT)
+		return Response(status=status.HTTP_204_NO_CONTENT)
+
+class CacheStats(APIView):
+	'''
+	列出apiapp/cache.py中每個cache的hit、miss、invalidation次數(目前process的累計值)
+	'''
+	permission_classes = [ReadOnly]
+	
+	def get(self, request, *args, **kwargs):
+		return Response({prefix: cache.stats() for prefix, cache in registered_caches.items()})
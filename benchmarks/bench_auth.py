@@ -0,0 +1,53 @@
+"""
+比較simplejwt的JWTAuthentication與apiapp的CachedJWTAuthentication每個request的驗證成本
+
+python benchmarks/bench_auth.py
+"""
+import argparse
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--repeat', type=int, default=2000)
+	args = parser.parse_args()
+
+	common.setup('bench_1000.sqlite3')
+	common.seed(1000)
+
+	from django.contrib.auth.models import User
+	from django.db import connection
+	from django.test.utils import CaptureQueriesContext
+	from rest_framework.test import APIRequestFactory
+	from rest_framework.views import APIView
+	from rest_framework_simplejwt.authentication import JWTAuthentication
+	from rest_framework_simplejwt.tokens import AccessToken
+	from apiapp.authentication import CachedJWTAuthentication
+
+	user = User.objects.order_by('id').first()
+	token = str(AccessToken.for_user(user))
+	factory = APIRequestFactory()
+	view = APIView()
+
+	rows = []
+	for authentication_class in (JWTAuthentication, CachedJWTAuthentication):
+		authentication = authentication_class()
+		request = view.initialize_request(factory.get('/apis/products/', HTTP_AUTHORIZATION='Bearer ' + token))
+
+		def authenticate():
+			assert authentication.authenticate(request)[0].pk == user.pk
+
+		result = common.measure(authenticate, args.repeat, warmup=10)
+		with CaptureQueriesContext(connection) as queries:
+			authenticate()
+		result['queries'] = len(queries)
+		rows.append((authentication_class.__name__, result))
+
+	common.report('authenticate() per request', rows)
+	for label, result in rows:
+		print('%-32s %d queries' % (label, result['queries']))
+
+
+if __name__ == '__main__':
+	main()
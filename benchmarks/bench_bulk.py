@@ -0,0 +1,59 @@
+"""
+比較逐筆POST /apis/products/ 與一次POST /apis/products/bulk/ 新增product的throughput
+
+python benchmarks/bench_bulk.py --items 10000
+"""
+import argparse
+import time
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--items', type=int, default=10000)
+	args = parser.parse_args()
+
+	common.setup('bench_bulk.sqlite3')
+	common.seed(1000)
+
+	from django.contrib.auth.models import User
+	from rest_framework.test import APIClient
+	from apiapp.models import Category, Product
+
+	user = User.objects.order_by('id').first()
+	user.set_password('top1secret23')
+	user.save()
+	client = APIClient()
+	token = client.post('/api/token/', {'username': user.username, 'password': 'top1secret23'}, format='json').data
+	client.credentials(HTTP_AUTHORIZATION='Bearer ' + token['access'])
+
+	category_ids = list(Category.objects.values_list('id', flat=True))
+	items = [
+		{'category': category_ids[i % len(category_ids)], 'name': 'bulk%d' % i, 'stock': i % 10, 'price': i}
+		for i in range(args.items)
+	]
+
+	start = time.perf_counter()
+	for item in items:
+		response = client.post('/apis/products/', item, format='json')
+		assert response.status_code == 201, response.data
+	loop = time.perf_counter() - start
+
+	start = time.perf_counter()
+	response = client.post('/apis/products/bulk/', items, format='json')
+	assert response.status_code == 201, response.status_code
+	bulk = time.perf_counter() - start
+
+	#刪除這次新增的資料，下次執行時資料庫維持相同的大小
+	Product.objects.filter(name__startswith='bulk').delete()
+
+	print('%d items' % args.items)
+	print('%-32s %10s %14s' % ('', 'total(s)', 'items/s'))
+	print('%-32s %10.2f %14.0f' % ('POST /apis/products/ loop', loop, args.items / loop))
+	print('%-32s %10.2f %14.0f' % ('POST /apis/products/bulk/', bulk, args.items / bulk))
+	print('speedup: %.1fx' % (loop / bulk))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,69 @@
+"""
+比較CategoryList第一頁在category_list_cache中(hit)與每次都invalidate(miss)時的latency
+以及沒有分頁時一次回傳所有category的latency
+
+python benchmarks/bench_category_list.py --categories 20000
+"""
+import argparse
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--categories', type=int, default=20000)
+	parser.add_argument('--repeat', type=int, default=50)
+	args = parser.parse_args()
+
+	common.setup('bench_categories_%d.sqlite3' % args.categories)
+	common.seed(1000, categories=args.categories)
+
+	from rest_framework import generics
+	from rest_framework.test import APIClient, APIRequestFactory
+	from apiapp.cache import LIST_KEY, category_list_cache
+	from apiapp.mixins import ConditionalListMixin, ReadListModelMixin
+	from apiapp.views import CategoryList
+
+	class OriginalCategoryList(ConditionalListMixin, ReadListModelMixin, generics.GenericAPIView):
+		#沒有分頁、沒有cache的CategoryList
+		queryset = CategoryList.queryset
+		read_serializer_class = CategoryList.read_serializer_class
+		pagination_class = None
+
+		def get(self, request, *args, **kwargs):
+			return self.list(request, *args, **kwargs)
+
+	client = APIClient()
+	factory = APIRequestFactory()
+	original = OriginalCategoryList.as_view()
+
+	def unpaginated():
+		response = original(factory.get('/apis/categories/'))
+		response.render()
+		assert response.status_code == 200, response.status_code
+
+	def get(url):
+		def request():
+			response = client.get(url)
+			assert response.status_code == 200, response.status_code
+		return request
+
+	def miss(url):
+		request = get(url)
+		def invalidated():
+			category_list_cache.invalidate([LIST_KEY])
+			request()
+		return invalidated
+
+	rows = [
+		('page_size=50 hit', common.measure(get('/apis/categories/'), args.repeat)),
+		('page_size=50 miss', common.measure(miss('/apis/categories/'), args.repeat)),
+		('page_size=500 hit', common.measure(get('/apis/categories/?page_size=500'), args.repeat)),
+		('page_size=500 miss', common.measure(miss('/apis/categories/?page_size=500'), args.repeat)),
+	]
+	rows.append(('unpaginated, uncached', common.measure(unpaginated, min(args.repeat, 10), warmup=1)))
+	common.report('%d categories, GET /apis/categories/' % args.categories, rows)
+
+
+if __name__ == '__main__':
+	main()
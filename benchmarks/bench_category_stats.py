@@ -0,0 +1,65 @@
+"""
+比較/apis/categories/stats/(trigger維護的apiapp_categorystats)與每次request都GROUP BY整個apiapp_product的latency
+以及trigger對新增、修改product的影響
+
+python benchmarks/bench_category_stats.py --products 1000000
+"""
+import argparse
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=100000)
+	parser.add_argument('--repeat', type=int, default=50)
+	args = parser.parse_args()
+
+	common.setup('bench_%d.sqlite3' % args.products)
+	common.seed(args.products)
+
+	from django.contrib.auth.models import User
+	from django.db.models import BigIntegerField, Count, F, Max, Min, Sum
+	from rest_framework.test import APIClient
+	from apiapp.models import Category, Product
+
+	client = APIClient()
+
+	def stats():
+		response = client.get('/apis/categories/stats/')
+		assert response.status_code == 200, response.status_code
+
+	def aggregate():
+		#沒有summary table時每次都需要掃描所有product
+		list(Product.objects.order_by().values('category').annotate(
+			product_count=Count('id'),
+			total_stock=Sum('stock'),
+			total_value=Sum(F('stock') * F('price'), output_field=BigIntegerField()),
+			min_price=Min('price'),
+			max_price=Max('price'),
+			))
+
+	category = Category.objects.order_by('id').first()
+	owner = User.objects.order_by('id').first()
+	created = []
+
+	def create():
+		created.append(Product.objects.create(category=category, owner=owner, name='bench', price=500, stock=3))
+
+	def update_price():
+		product = created[-1]
+		product.price += 1
+		product.save()
+
+	rows = [
+		('stats endpoint', common.measure(stats, args.repeat)),
+		('GROUP BY apiapp_product', common.measure(aggregate, min(args.repeat, 10), warmup=1)),
+		('create product', common.measure(create, args.repeat)),
+		('update price', common.measure(update_price, args.repeat)),
+	]
+	Product.objects.filter(pk__in=[product.pk for product in created]).delete()
+	common.report('%d products' % args.products, rows)
+
+
+if __name__ == '__main__':
+	main()
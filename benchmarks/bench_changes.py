@@ -0,0 +1,87 @@
+"""
+比較client同步product的兩種方式 : 每次重新下載全部的product(/apis/products/?stream=1)
+與以cursor讀取變更(/apis/products/changes/?since=<cursor>)，以及trigger寫入變更紀錄對UPDATE的影響
+
+python benchmarks/bench_changes.py --products 100000
+"""
+import argparse
+
+import common
+
+CHANGES = (10, 100, 1000)
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=100000)
+	parser.add_argument('--repeat', type=int, default=10)
+	args = parser.parse_args()
+
+	common.setup('bench_changes_%d.sqlite3' % args.products)
+	common.seed(args.products)
+
+	from django.db import connection, transaction
+	from rest_framework.test import APIClient
+	from apiapp import changes
+	from apiapp.models import Product, ProductChange
+
+	changes.install()
+	client = APIClient()
+	product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+
+	def full():
+		response = client.get('/apis/products/?stream=1')
+		assert response.status_code == 200, response.status_code
+		return len(b''.join(response.streaming_content))
+
+	size = full()
+	rows = [('full download (%d products)' % args.products, common.measure(full, args.repeat))]
+	sizes = [size]
+	for count in CHANGES:
+		cursor = changes.head()
+		with transaction.atomic():
+			Product.objects.filter(id__in=product_ids[:count * 2:2]).update(stock=1)
+		url = '/apis/products/changes/?since=%d&page_size=500' % cursor
+
+		def sync():
+			#依照next讀取到沒有更多變更為止
+			next, size, results = url, 0, 0
+			while next:
+				response = client.get(next)
+				assert response.status_code == 200, response.status_code
+				next = response.data['next']
+				size += len(response.content)
+				results += len(response.data['results'])
+			assert results == count, results
+			return size
+
+		sizes.append(sync())
+		rows.append(('changes since cursor (%d changed)' % count, common.measure(sync, args.repeat)))
+	common.report('sync %d products' % args.products, rows)
+	print()
+	for (label, _), size in zip(rows, sizes):
+		print('%-40s %10d bytes' % (label, size))
+	print()
+
+	#每次UPDATE 1000筆，比較有trigger與沒有trigger
+	ids = product_ids[:1000]
+
+	def update():
+		with transaction.atomic():
+			Product.objects.filter(id__in=ids).update(stock=2)
+
+	rows = [('UPDATE 1000 products with triggers', common.measure(update, args.repeat))]
+	with connection.cursor() as cursor:
+		for trigger in changes.TRIGGERS:
+			cursor.execute('DROP TRIGGER IF EXISTS %s' % trigger)
+	try:
+		rows.append(('UPDATE 1000 products without triggers', common.measure(update, args.repeat)))
+	finally:
+		changes.install()
+	common.report('trigger overhead', rows)
+	print()
+	print('%d rows in %s' % (ProductChange.objects.count(), changes.TABLE))
+
+
+if __name__ == '__main__':
+	main()
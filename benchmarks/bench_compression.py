@@ -0,0 +1,70 @@
+"""
+比較gzip、br、zstd(有安裝時)每個level壓縮API response的CPU時間與節省的bytes，
+以及CategoryList的cache hit使用cache中壓縮後的bytes與每次hit都重新壓縮的latency
+
+python benchmarks/bench_compression.py --products 10000
+"""
+import argparse
+from unittest import mock
+
+import common
+
+LEVELS = {'gzip': (1, 6, 9), 'br': (1, 4, 6, 9, 11), 'zstd': (1, 3, 6, 12, 19)}
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=10000)
+	parser.add_argument('--categories', type=int, default=1000)
+	parser.add_argument('--repeat', type=int, default=30)
+	args = parser.parse_args()
+
+	common.setup('bench_compression_%d.sqlite3' % args.products)
+	common.seed(args.products, categories=args.categories)
+
+	from rest_framework.test import APIClient
+	from apiapp import compression
+	from apiapp.models import Product
+
+	client = APIClient()
+	product_id = Product.objects.order_by('id').values_list('id', flat=True)[0]
+	payloads = []
+	for url in ('/apis/product/%d/' % product_id, '/apis/products/?page_size=50', '/apis/products/?page_size=500',
+			'/apis/products/?stream=1'):
+		response = client.get(url)
+		content = b''.join(response.streaming_content) if response.streaming else response.content
+		payloads.append((url, content))
+
+	print('%d products, compression of response bodies (not installed: %s)' % (args.products,
+		', '.join(encoding for encoding in LEVELS if encoding not in compression.CODECS) or '-'))
+	print('%-32s %-8s %6s %10s %10s %8s %10s %14s' % ('', 'encoding', 'level', 'bytes', 'saved', 'ratio', 'p50(ms)', 'ms per MB saved'))
+	for url, content in payloads:
+		print('%-32s %-8s %6s %10d' % (url, 'identity', '-', len(content)))
+		for encoding, levels in LEVELS.items():
+			if encoding not in compression.CODECS:
+				continue
+			for level in levels:
+				codec = compression.CODECS[encoding](level)
+				compressed = codec.compress(content)
+				result = common.measure(lambda: codec.compress(content), args.repeat)
+				saved = len(content) - len(compressed)
+				print('%-32s %-8s %6d %10d %10d %7.1f%% %10.2f %14.2f' % ('', encoding, level, len(compressed), saved,
+					len(compressed) * 100 / len(content), result['p50'], result['p50'] / (saved / 1e6) if saved > 0 else 0))
+	print()
+
+	#CategoryList的response在category_list_cache中，比較hit時使用保存的gzip bytes與每次由middleware重新壓縮
+	url = '/apis/categories/?page_size=500'
+
+	def get():
+		response = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+		assert response.status_code == 200 and response['Content-Encoding'] == 'gzip', response.status_code
+
+	rows = [('cache hit, stored gzip bytes', common.measure(get, args.repeat))]
+	#cache不保存壓縮後的bytes時，CompressionMiddleware每次都要壓縮
+	with mock.patch('apiapp.cache.choose_encoding', return_value=None):
+		rows.append(('cache hit, compressed per hit', common.measure(get, args.repeat)))
+	common.report('GET %s, Accept-Encoding: gzip' % url, rows)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,107 @@
+"""
+以500個同時的connection測試productapi/wsgi.py的throughput與p99
+比較一次只處理一個request的WSGI server(blocking worker)與每個connection一個thread的WSGI server
+
+Django 2.2沒有ASGI、async view與async ORM(分別需要Django 3.0、3.1、4.1)，所以只比較WSGI的兩種server
+server在另一個process中執行，client以asyncio同時送出request，兩者不會互相搶GIL
+
+python benchmarks/bench_concurrency.py --connections 500 --requests 5000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import socketserver
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+import common
+
+HOST = '127.0.0.1'
+
+
+class QuietHandler(WSGIRequestHandler):
+	def log_message(self, format, *args):
+		pass
+
+
+class BlockingServer(WSGIServer):
+	request_queue_size = 1024 #500個connection同時連線時不會被拒絕
+
+
+class ThreadedServer(socketserver.ThreadingMixIn, BlockingServer):
+	daemon_threads = True
+
+
+def serve(server_class, db_name, port, ready):
+	common.setup(db_name)
+	from django.core.wsgi import get_wsgi_application
+	server = server_class((HOST, port), QuietHandler)
+	server.set_app(get_wsgi_application())
+	ready.set()
+	server.serve_forever()
+
+
+async def fetch(path, port):
+	start = time.perf_counter()
+	reader, writer = await asyncio.open_connection(HOST, port)
+	writer.write(('GET %s HTTP/1.0\r\nHost: %s\r\n\r\n' % (path, HOST)).encode('ascii'))
+	await writer.drain()
+	response = await reader.read()
+	writer.close()
+	assert response.startswith(b'HTTP/1.0 200'), response[:100]
+	return (time.perf_counter() - start) * 1000
+
+
+async def load(path, port, connections, requests):
+	'''
+	以connections個同時的connection送出requests個request，回傳(每秒request數, latency的list)
+	'''
+	latencies = []
+	remaining = iter(range(requests))
+
+	async def worker():
+		for _ in remaining:
+			latencies.append(await fetch(path, port))
+
+	start = time.perf_counter()
+	await asyncio.gather(*[worker() for _ in range(connections)])
+	return requests / (time.perf_counter() - start), sorted(latencies)
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=100000)
+	parser.add_argument('--connections', type=int, default=500)
+	parser.add_argument('--requests', type=int, default=5000)
+	parser.add_argument('--port', type=int, default=8765)
+	args = parser.parse_args()
+
+	db_name = 'bench_%d.sqlite3' % args.products
+	common.setup(db_name)
+	common.seed(args.products)
+
+	from apiapp.models import Product
+	product_id = Product.objects.order_by('id').values_list('id', flat=True)[0]
+	paths = ['/apis/products/?page_size=50', '/apis/product/%d/' % product_id, '/apis/categories/']
+
+	print('%d products, %d connections, %d requests per endpoint' % (args.products, args.connections, args.requests))
+	print('%-16s %-32s %10s %10s %10s' % ('server', 'endpoint', 'req/s', 'p50(ms)', 'p99(ms)'))
+	for label, server_class in (('blocking', BlockingServer), ('threaded', ThreadedServer)):
+		ready = multiprocessing.Event()
+		process = multiprocessing.Process(target=serve, args=(server_class, db_name, args.port, ready), daemon=True)
+		process.start()
+		ready.wait()
+		try:
+			for path in paths:
+				#先送出幾個request，讓cache與connection準備好
+				asyncio.run(load(path, args.port, 4, 20))
+				throughput, latencies = asyncio.run(load(path, args.port, args.connections, args.requests))
+				print('%-16s %-32s %10.0f %10.2f %10.2f' % (label, path, throughput,
+					latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]))
+		finally:
+			process.terminate()
+			process.join()
+
+
+if __name__ == '__main__':
+	main()
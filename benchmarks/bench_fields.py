@@ -0,0 +1,53 @@
+"""
+比較ProductList完整輸出與?fields=id,name,price的response大小、latency以及只有資料庫查詢的時間
+description平均2KB
+
+python benchmarks/bench_fields.py --products 10000
+"""
+import argparse
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=10000)
+	parser.add_argument('--repeat', type=int, default=20)
+	args = parser.parse_args()
+
+	common.setup('bench_fields_%d.sqlite3' % args.products)
+	common.seed(args.products, description='商品說明' * 170 + 'description ' * 2) #約2KB(UTF-8)
+
+	from rest_framework.test import APIClient
+	from apiapp.models import Product
+	from apiapp.serializers import ProductReadSerializer
+
+	client = APIClient()
+	queryset = Product.objects.order_by('id')
+
+	rows = []
+	sizes = []
+	for label, fields in (('all fields', None), ('fields=id,name,price', ['id', 'name', 'price'])):
+		url = '/apis/products/' if fields is None else '/apis/products/?fields=' + ','.join(fields)
+		serializer = ProductReadSerializer(fields=fields)
+
+		def request():
+			response = client.get(url)
+			assert response.status_code == 200, response.status_code
+			return response
+
+		def query():
+			list(serializer.get_rows(queryset.all()))
+
+		sizes.append((label, len(request().content)))
+		rows.append(('GET ' + label, common.measure(request, args.repeat, warmup=1)))
+		rows.append(('DB only ' + label, common.measure(query, args.repeat, warmup=1)))
+
+	common.report('%d products, 2KB descriptions' % args.products, rows)
+	print()
+	for label, size in sizes:
+		print('%-32s %10d bytes' % (label, size))
+
+
+if __name__ == '__main__':
+	main()
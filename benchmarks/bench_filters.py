@@ -0,0 +1,84 @@
+"""
+列出ProductList每一種filter、排序組合的query plan(EXPLAIN QUERY PLAN)與第一頁的latency
+確認每一種組合都使用index，而不是掃描整個apiapp_product
+
+python benchmarks/bench_filters.py --products 100000
+"""
+import argparse
+
+import common
+
+COMBINATIONS = [
+	'',
+	'ordering=-id',
+	'ordering=price',
+	'ordering=-price',
+	'category=category1',
+	'category=category1&ordering=price',
+	'category=category1&ordering=-price',
+	'category=category1,category2',
+	'category=category1,category2&ordering=price',
+	'username=user3',
+	'price_min=100&price_max=200',
+	'price_min=100&price_max=200&ordering=price',
+	'category=category1&price_min=100&price_max=20000&ordering=price',
+	'in_stock=true',
+	'in_stock=true&ordering=price',
+	'in_stock=false',
+	'category=category1&in_stock=true&ordering=price',
+]
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=100000)
+	parser.add_argument('--repeat', type=int, default=50)
+	args = parser.parse_args()
+
+	common.setup('bench_%d.sqlite3' % args.products)
+	common.seed(args.products)
+
+	from django.db import connection
+	from rest_framework.test import APIClient, APIRequestFactory
+	from apiapp.views import ProductList
+
+	client = APIClient()
+	factory = APIRequestFactory()
+
+	def query_plan(query):
+		#與ProductList.list()相同的queryset(第一頁50筆)
+		view = ProductList()
+		view.request = view.initialize_request(factory.get('/apis/products/?' + query))
+		view.format_kwarg = None
+		queryset = view.get_read_serializer().get_rows(view.filter_queryset(view.get_queryset()))[:50]
+		sql, params = queryset.query.sql_with_params()
+		with connection.cursor() as cursor:
+			cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+			steps = [row[-1] for row in cursor.fetchall()]
+		return [step for step in steps if 'apiapp_product' in step or 'TEMP B-TREE' in step]
+
+	rows = []
+	plans = []
+	for query in COMBINATIONS:
+		url = '/apis/products/?page_size=50' + ('&' + query if query else '')
+
+		def request():
+			response = client.get(url)
+			assert response.status_code == 200, response.status_code
+
+		steps = query_plan(query)
+		#沒有filter時依照id讀取table本身(rowid的B-tree)，也屬於index scan
+		full_scan = any(step == 'SCAN apiapp_product' for step in steps) and query not in ('', 'ordering=-id')
+		plans.append((query or '(none)', 'FULL SCAN' if full_scan else 'index', steps))
+		rows.append((query or '(none)', common.measure(request, args.repeat, warmup=2)))
+
+	common.report('%d products, GET /apis/products/?page_size=50&...' % args.products, rows)
+	print()
+	for query, kind, steps in plans:
+		print('%-64s %s' % (query, kind))
+		for step in steps:
+			print('    ' + step)
+
+
+if __name__ == '__main__':
+	main()
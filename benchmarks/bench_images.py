@@ -0,0 +1,80 @@
+"""
+比較上傳圖片時在request中產生縮圖與交給worker pool(apiapp/images.py)的POST latency，
+以及原圖與縮圖的大小
+
+python benchmarks/bench_images.py --width 2400 --height 1800
+"""
+import argparse
+import io
+import os
+import tempfile
+from unittest import mock
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--width', type=int, default=2400)
+	parser.add_argument('--height', type=int, default=1800)
+	parser.add_argument('--repeat', type=int, default=10)
+	args = parser.parse_args()
+
+	common.setup('bench_images.sqlite3')
+	common.seed(100)
+
+	from django.contrib.auth.models import User
+	from django.core.files.uploadedfile import SimpleUploadedFile
+	from django.test import override_settings
+	from PIL import Image
+	from rest_framework.test import APIClient
+	from apiapp import images
+	from apiapp.models import Category, Product
+
+	#上傳的圖片存放在暫存資料夾，不會寫入settings.MEDIA_ROOT
+	media_root = tempfile.TemporaryDirectory()
+	override_settings(MEDIA_ROOT=media_root.name).enable()
+
+	#雜訊圖片讓JPEG無法有效壓縮，接近相機拍攝的照片大小
+	data = io.BytesIO()
+	Image.frombytes('RGB', (args.width, args.height), os.urandom(args.width * args.height * 3)).save(data, 'JPEG', quality=80)
+	content = data.getvalue()
+
+	client = APIClient()
+	client.force_authenticate(User.objects.order_by('id').first())
+	category = Category.objects.order_by('id').first()
+	pks = []
+
+	def post():
+		response = client.post('/apis/products/', {
+			'category': category.id, 'name': 'photo',
+			'image': SimpleUploadedFile('photo.jpg', content, 'image/jpeg')}, format='multipart')
+		assert response.status_code == 201, response.data
+		pks.append(response.data['id'])
+
+	def post_inline():
+		#舊的做法 : 在request中解碼並產生縮圖
+		post()
+		images.process_image(pks[-1])
+
+	rows = [('thumbnails in worker pool', common.measure(post, args.repeat, warmup=1))]
+	#等待worker完成後再量測，inline時不交給worker
+	images.executor.submit(lambda: None).result()
+	with mock.patch.object(images, 'schedule'):
+		rows.append(('thumbnails inside request', common.measure(post_inline, args.repeat, warmup=1)))
+	images.executor.shutdown(wait=True)
+
+	product = Product.objects.get(pk=pks[-1])
+	common.report('POST /apis/products/ with a %dx%d JPEG (%d bytes)' % (args.width, args.height, len(content)), rows)
+	print()
+	storage = product.image.storage
+	print('%-32s %10d bytes' % ('original', storage.size(product.image.name)))
+	for variant in images.THUMBNAIL_SIZES:
+		print('%-32s %10d bytes' % (variant, storage.size(images.thumbnail_name(product.image.name, variant))))
+
+	Product.objects.filter(pk__in=pks).delete()
+	media_root.cleanup()
+
+
+if __name__ == '__main__':
+	main()
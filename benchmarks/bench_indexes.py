@@ -0,0 +1,83 @@
+"""
+比較加上index前後，ProductList的category、username filter的query plan與latency
+
+before : Category.name沒有index，Product只有category_id、owner_id的單欄位index(0001_initial的schema)
+after  : Category.name unique index，Product(category_id, id)、(owner_id, id) composite index
+
+python benchmarks/bench_indexes.py --products 1000000
+"""
+import argparse
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=1000000)
+	parser.add_argument('--categories', type=int, default=2000)
+	parser.add_argument('--users', type=int, default=5000)
+	parser.add_argument('--repeat', type=int, default=100)
+	args = parser.parse_args()
+
+	common.setup('bench_indexes_%d.sqlite3' % args.products)
+	common.seed(args.products, categories=args.categories, users=args.users)
+
+	from django.db import connection, models
+	from rest_framework.test import APIClient
+	from apiapp.models import Category, Product
+	from apiapp.serializers import ProductReadSerializer
+
+	client = APIClient()
+	category = 'category%d' % (args.categories // 2)
+	username = 'user%d' % (args.users // 2)
+	cases = [
+		('?category=', {'category__name': category}, 'category=%s' % category),
+		('?username=', {'owner__username': username}, 'username=%s' % username),
+		('?category=&username=', {'category__name': category, 'owner__username': username},
+			'category=%s&username=%s' % (category, username)),
+	]
+
+	def run(label):
+		rows = []
+		for name, filters, query in cases:
+			queryset = ProductReadSerializer().get_rows(Product.objects.filter(**filters).order_by('id'))[:50]
+			print('[%s] %s' % (label, name))
+			print(queryset.explain())
+			url = '/apis/products/?page_size=50&%s' % query
+			rows.append(('%s %s' % (label, name), common.measure(lambda: client.get(url), args.repeat)))
+		print()
+		return rows
+
+	after = run('after')
+
+	#回到0001_initial的index配置
+	name_field = Category._meta.get_field('name')
+	plain_name = models.CharField(max_length=50)
+	plain_name.set_attributes_from_name('name')
+	plain_name.model = Category
+	single_indexes = [
+		models.Index(fields=['category'], name='bench_product_category_idx'),
+		models.Index(fields=['owner'], name='bench_product_owner_idx'),
+	]
+	with connection.schema_editor() as editor:
+		for index in Product._meta.indexes:
+			editor.remove_index(Product, index)
+		for index in single_indexes:
+			editor.add_index(Product, index)
+		editor.alter_field(Category, name_field, plain_name)
+
+	try:
+		before = run('before')
+	finally:
+		with connection.schema_editor() as editor:
+			editor.alter_field(Category, plain_name, name_field)
+			for index in single_indexes:
+				editor.remove_index(Product, index)
+			for index in Product._meta.indexes:
+				editor.add_index(Product, index)
+
+	common.report('GET /apis/products/?page_size=50 (%d products)' % args.products, before + after)
+
+
+if __name__ == '__main__':
+	main()
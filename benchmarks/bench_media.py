@@ -0,0 +1,81 @@
+"""
+比較django.views.static.serve(原本的static())與apiapp/media.py的serve_media
+量測完整GET、帶ETag的重新驗證(304)、X-Accel-Redirect，以及相同圖片上傳多次時的磁碟用量
+
+python benchmarks/bench_media.py --size 2000000
+"""
+import argparse
+import os
+import tempfile
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--size', type=int, default=2000000)
+	parser.add_argument('--uploads', type=int, default=20)
+	parser.add_argument('--repeat', type=int, default=50)
+	args = parser.parse_args()
+
+	common.setup('bench_1000.sqlite3')
+
+	from django.core.files.base import ContentFile
+	from django.core.files.storage import FileSystemStorage
+	from django.test import RequestFactory, override_settings
+	from django.views.static import serve
+	from apiapp.media import serve_media
+	from apiapp.storage import ContentAddressedStorage
+
+	media_root = tempfile.TemporaryDirectory()
+	override_settings(MEDIA_ROOT=media_root.name).enable()
+	os.mkdir(os.path.join(media_root.name, 'media'))
+	content = os.urandom(args.size)
+	with open(os.path.join(media_root.name, 'media', 'photo.jpg'), 'wb') as file:
+		file.write(content)
+
+	factory = RequestFactory()
+	etag = serve_media(factory.get('/media/media/photo.jpg'), 'media/photo.jpg')['ETag']
+
+	def consume(response):
+		assert response.status_code in (200, 304), response.status_code
+		if response.streaming:
+			for chunk in response.streaming_content:
+				pass
+		response.close()
+
+	def static_serve():
+		consume(serve(factory.get('/media/media/photo.jpg'), 'media/photo.jpg', document_root=media_root.name))
+
+	def media_serve():
+		consume(serve_media(factory.get('/media/media/photo.jpg'), 'media/photo.jpg'))
+
+	def media_revalidate():
+		consume(serve_media(factory.get('/media/media/photo.jpg', HTTP_IF_NONE_MATCH=etag), 'media/photo.jpg'))
+
+	def media_accel_redirect():
+		with override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect'):
+			consume(serve_media(factory.get('/media/media/photo.jpg'), 'media/photo.jpg'))
+
+	common.report('GET a %d byte media file (Python side)' % args.size, [
+		('django.views.static.serve', common.measure(static_serve, args.repeat, warmup=2)),
+		('serve_media', common.measure(media_serve, args.repeat, warmup=2)),
+		('serve_media If-None-Match (304)', common.measure(media_revalidate, args.repeat, warmup=2)),
+		('serve_media X-Accel-Redirect', common.measure(media_accel_redirect, args.repeat, warmup=2)),
+	])
+	print()
+
+	for storage_class in (FileSystemStorage, ContentAddressedStorage):
+		label = storage_class.__name__
+		location = os.path.join(media_root.name, label)
+		storage = storage_class(location=location)
+		for i in range(args.uploads):
+			storage.save('media/photo.jpg', ContentFile(content))
+		used = sum(os.path.getsize(os.path.join(root, name)) for root, dirs, names in os.walk(location) for name in names)
+		print('%-32s %d uploads -> %10d bytes on disk' % (label, args.uploads, used))
+
+	media_root.cleanup()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,55 @@
+"""
+比較MetricsMiddleware(apiapp/metrics.py)關閉與開啟時各endpoint的latency，並列出開啟時的Server-Timing
+
+python benchmarks/bench_metrics.py --products 100000
+"""
+import argparse
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=100000)
+	parser.add_argument('--repeat', type=int, default=200)
+	args = parser.parse_args()
+
+	common.setup('bench_%d.sqlite3' % args.products)
+	common.seed(args.products)
+
+	from django.test.utils import override_settings
+	from rest_framework.test import APIClient
+	from apiapp.models import Product
+
+	product_id = Product.objects.order_by('id').values_list('id', flat=True)[0]
+	urls = [
+		'/apis/product/%d/' % product_id,
+		'/apis/products/?page_size=50',
+		'/apis/products/?page_size=500',
+		'/apis/categories/stats/',
+	]
+
+	rows = []
+	timings = []
+	for url in urls:
+		for enabled in (False, True):
+			#middleware在第一個request時載入，每個設定使用新的client
+			with override_settings(METRICS_ENABLED=enabled):
+				client = APIClient()
+
+				def request():
+					response = client.get(url)
+					assert response.status_code == 200, response.status_code
+					return response
+
+				rows.append(('%s %s' % ('on ' if enabled else 'off', url), common.measure(request, args.repeat, warmup=5)))
+				if enabled:
+					timings.append((url, request()['Server-Timing']))
+	common.report('%d products, MetricsMiddleware off / on' % args.products, rows)
+	print()
+	for url, timing in timings:
+		print('%-32s %s' % (url, timing))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,62 @@
+"""
+比較ProductList的keyset(cursor)分頁與OFFSET分頁在不同頁數時的latency
+
+python benchmarks/bench_pagination.py --products 100000 --page-size 10
+"""
+import argparse
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=100000)
+	parser.add_argument('--page-size', type=int, default=10)
+	parser.add_argument('--repeat', type=int, default=50)
+	args = parser.parse_args()
+
+	common.setup('bench_%d.sqlite3' % args.products)
+	common.seed(args.products)
+
+	from rest_framework.pagination import Cursor
+	from rest_framework.test import APIClient
+	from apiapp.models import Product
+	from apiapp.pagination import KeysetPagination
+
+	client = APIClient()
+	paginator = KeysetPagination()
+	paginator.base_url = 'http://testserver/apis/products/'
+	first_id = Product.objects.order_by('id').values_list('id', flat=True)[0]
+
+	last_page = args.products // args.page_size
+	pages = [p for p in (1, 10, 100, 1000, 10000, 100000) if p <= last_page]
+
+	keyset_rows = []
+	offset_rows = []
+	for page in pages:
+		offset = (page - 1) * args.page_size
+		if page == 1:
+			url = '%s?page_size=%d' % (paginator.base_url, args.page_size)
+		else:
+			#上一頁最後一筆的id就是cursor的position
+			paginator.page_size = args.page_size
+			cursor = Cursor(offset=0, reverse=False, position=str(first_id + offset - 1))
+			url = paginator.encode_cursor(cursor) + '&page_size=%d' % args.page_size
+
+		def keyset():
+			response = client.get(url)
+			assert response.status_code == 200, response.status_code
+
+		def offset_query():
+			list(Product.objects.select_related('owner').order_by('id')[offset:offset + args.page_size])
+
+		keyset_rows.append(('page %d' % page, common.measure(keyset, args.repeat)))
+		offset_rows.append(('page %d' % page, common.measure(offset_query, args.repeat)))
+
+	common.report('GET /apis/products/ keyset (cursor) pagination', keyset_rows)
+	print()
+	common.report('ORM OFFSET query (query only, no serialization)', offset_rows)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,76 @@
+"""
+比較REST framework的JSONRenderer、JSONParser(json module)與apiapp的FastJSONRenderer、FastJSONParser(orjson)
+render、parse /apis/products/ 10000筆資料的時間，response的大小(以及ensure_ascii=True時跳脫中文的大小)，
+以及GET /apis/products/?page_size=500、?stream=1 的latency
+
+python benchmarks/bench_renderers.py --products 10000
+"""
+import argparse
+import io
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=10000)
+	parser.add_argument('--repeat', type=int, default=20)
+	args = parser.parse_args()
+
+	common.setup('bench_renderers_%d.sqlite3' % args.products)
+	common.seed(args.products, description=lambda i: '尚未有產品說明，第%d號產品，適合送禮。' % i)
+
+	from rest_framework.parsers import JSONParser
+	from rest_framework.renderers import JSONRenderer
+	from rest_framework.test import APIClient, APIRequestFactory
+	from apiapp import renderers
+	from apiapp.models import Product
+	from apiapp.parsers import FastJSONParser
+	from apiapp.serializers import ProductReadSerializer
+	from apiapp.views import ProductList
+
+	request = APIRequestFactory().get('/apis/products/')
+	serializer = ProductReadSerializer({'request': request})
+	data = serializer.many(serializer.get_rows(Product.objects.order_by('id')))
+	assert len(data) == args.products, len(data)
+
+	class EscapedJSONRenderer(JSONRenderer):
+		ensure_ascii = True
+
+	body = JSONRenderer().render(data)
+	assert renderers.FastJSONRenderer().render(data) == body
+	rows = [
+		('render JSONRenderer', common.measure(lambda: JSONRenderer().render(data), args.repeat)),
+		('render FastJSONRenderer', common.measure(lambda: renderers.FastJSONRenderer().render(data), args.repeat)),
+		('parse JSONParser', common.measure(lambda: JSONParser().parse(io.BytesIO(body)), args.repeat)),
+		('parse FastJSONParser', common.measure(lambda: FastJSONParser().parse(io.BytesIO(body)), args.repeat)),
+	]
+
+	client = APIClient()
+	renderer_classes = ProductList.renderer_classes
+	for label, renderer_class in (('json', JSONRenderer), ('orjson', renderers.FastJSONRenderer)):
+		ProductList.renderer_classes = [renderer_class]
+		orjson = renderers.orjson
+		if renderer_class is JSONRenderer:
+			#stream=1使用renderers.dumps()，沒有orjson時與json module相同
+			renderers.orjson = None
+		try:
+			for url in ('?page_size=500', '?stream=1'):
+				def get():
+					response = client.get('/apis/products/' + url)
+					assert response.status_code == 200, response.status_code
+					if response.streaming:
+						b''.join(response.streaming_content)
+				rows.append(('GET %s %s' % (url, label), common.measure(get, args.repeat, warmup=3)))
+		finally:
+			renderers.orjson = orjson
+	ProductList.renderer_classes = renderer_classes
+
+	common.report('%d products' % args.products, rows)
+	print()
+	print('%-32s %10d bytes' % ('UTF-8 (both renderers)', len(body)))
+	print('%-32s %10d bytes' % ('ensure_ascii=True (\\uXXXX)', len(EscapedJSONRenderer().render(data))))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,59 @@
+"""
+比較/apis/products/search/的FTS5 trigram index與name、description的icontains查詢
+
+python benchmarks/bench_search.py --products 1000000
+"""
+import argparse
+
+import common
+
+WORDS = ['無頭琴', '電吉他', '木吉他', '貝斯', '鍵盤', '鼓組', '效果器', '音箱', '烏克麗麗', '小提琴', '錄音介面', '監聽耳機']
+
+
+def description(i):
+	#每個product的description包含兩個不同的詞，讓每個詞大約符合1/6的product
+	return '%s與%s，尚未有產品說明' % (WORDS[i % len(WORDS)], WORDS[(i * 7 + 3) % len(WORDS)])
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=1000000)
+	parser.add_argument('--repeat', type=int, default=20)
+	args = parser.parse_args()
+
+	common.setup('bench_search_%d.sqlite3' % args.products)
+	common.seed(args.products, description=description)
+
+	from django.db.models import Q
+	from rest_framework.test import APIClient
+	from apiapp.models import Product
+
+	client = APIClient()
+	queries = ['product123456', 'product1234', '電吉他', '效果器 監聽耳機', '尚未有產品說明']
+
+	rows = []
+	for q in queries:
+		def fts():
+			response = client.get('/apis/products/search/', {'q': q})
+			assert response.status_code == 200, response.status_code
+			return response.data['count']
+
+		def icontains():
+			#沒有index時的做法 : 每個詞都以LIKE掃描整個table，同樣取出count與前20筆
+			queryset = Product.objects.all()
+			for term in q.split():
+				queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+			count = queryset.count()
+			list(queryset.order_by('id').values_list('id', 'name')[:20])
+			return count
+
+		assert fts() == icontains(), q
+		count = fts()
+		rows.append(('%s (%d) FTS5' % (q, count), common.measure(fts, args.repeat, warmup=1)))
+		rows.append(('%s (%d) icontains' % (q, count), common.measure(icontains, max(args.repeat // 4, 3), warmup=0)))
+
+	common.report('%d products, search + count + first page' % args.products, rows)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,61 @@
+"""
+比較ProductSerializer/CategorySerializer(ModelSerializer)與GET專用的快速序列化(values_list)
+
+python benchmarks/bench_serializers.py --products 10000
+"""
+import argparse
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=10000)
+	parser.add_argument('--repeat', type=int, default=10)
+	args = parser.parse_args()
+
+	#category也需要足夠的資料量，使用獨立的資料庫檔案
+	common.setup('bench_serializers_%d.sqlite3' % args.products)
+	common.seed(args.products, categories=args.products // 10)
+
+	from rest_framework.renderers import JSONRenderer
+	from rest_framework.test import APIRequestFactory
+	from apiapp.models import Category, Product
+	from apiapp.serializers import (
+		CategoryReadSerializer, CategorySerializer, ProductReadSerializer, ProductSerializer)
+
+	context = {'request': APIRequestFactory().get('/apis/products/')}
+	renderer = JSONRenderer()
+	products = Product.objects.select_related('owner').order_by('id')
+	categories = Category.objects.order_by('id')
+
+	def model_products():
+		return renderer.render(ProductSerializer(products.all(), many=True, context=context).data)
+
+	def read_products():
+		serializer = ProductReadSerializer(context)
+		return renderer.render(serializer.many(serializer.get_rows(products.all())))
+
+	def model_categories():
+		return renderer.render(CategorySerializer(categories.all(), many=True, context=context).data)
+
+	def read_categories():
+		serializer = CategoryReadSerializer(context)
+		return renderer.render(serializer.many(serializer.get_rows(categories.all())))
+
+	assert model_products() == read_products()
+	assert model_categories() == read_categories()
+
+	common.report('%d products, query + serialize + render' % args.products, [
+		('ProductSerializer', common.measure(model_products, args.repeat, warmup=1)),
+		('ProductReadSerializer', common.measure(read_products, args.repeat, warmup=1)),
+	])
+	print()
+	common.report('%d categories, query + serialize + render' % categories.count(), [
+		('CategorySerializer', common.measure(model_categories, args.repeat, warmup=1)),
+		('CategoryReadSerializer', common.measure(read_categories, args.repeat, warmup=1)),
+	])
+
+
+if __name__ == '__main__':
+	main()
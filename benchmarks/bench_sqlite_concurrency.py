@@ -0,0 +1,109 @@
+"""
+同時讀寫的stress test : writer thread以POST /apis/products/新增product、reader thread讀取list與類別統計
+比較Django預設的SQLite設定(rollback journal、timeout 5秒、BEGIN DEFERRED)與
+settings.DATABASES的OPTIONS(WAL、busy_timeout、BEGIN IMMEDIATE...)的throughput以及database is locked的次數
+
+python benchmarks/bench_sqlite_concurrency.py --writers 8 --readers 8 --seconds 10
+python benchmarks/bench_sqlite_concurrency.py --writers 8 --readers 8 --bulk 1000
+"""
+import argparse
+import threading
+import time
+
+import common
+
+#Django 2.2、Python sqlite3的預設值，journal_mode為資料庫檔案的設定，需要明確改回delete
+DEFAULT_OPTIONS = {'timeout': 5, 'pragmas': {'journal_mode': 'delete', 'synchronous': 'full'}}
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=20000)
+	parser.add_argument('--writers', type=int, default=8)
+	parser.add_argument('--readers', type=int, default=8)
+	parser.add_argument('--seconds', type=float, default=10)
+	parser.add_argument('--bulk', type=int, default=0, help='writer每次以/apis/products/bulk/新增的筆數，0為逐筆POST')
+	args = parser.parse_args()
+
+	common.setup('bench_concurrency_default.sqlite3')
+
+	from django.conf import settings
+	from django.contrib.auth.models import User
+	from django.db import OperationalError, connection, connections
+	from rest_framework.test import APIClient
+	from apiapp.models import Category
+
+	options = settings.DATABASES['default']['OPTIONS']
+	wal_options = dict(options)
+
+	def run(label, new_options):
+		options.clear()
+		options.update(new_options)
+		common.use_database('bench_concurrency_%s.sqlite3' % label)
+		common.seed(args.products)
+		with connection.cursor() as cursor:
+			cursor.execute('PRAGMA journal_mode')
+			journal_mode = cursor.fetchone()[0]
+		owner = User.objects.order_by('id').first()
+		category_id = Category.objects.order_by('id').values_list('id', flat=True)[0]
+		connections['default'].close()
+
+		counts = {'writes': 0, 'reads': 0, 'locked': 0}
+		lock = threading.Lock()
+		deadline = time.monotonic() + args.seconds
+
+		def writer(i):
+			client = APIClient()
+			client.force_authenticate(owner)
+			n = 0
+			while time.monotonic() < deadline:
+				n += 1
+				item = {'category': category_id, 'name': 'stress%d-%d' % (i, n), 'stock': 1, 'price': 100}
+				try:
+					if args.bulk:
+						response = client.post('/apis/products/bulk/', [item] * args.bulk)
+					else:
+						response = client.post('/apis/products/', item)
+					assert response.status_code == 201, response.status_code
+					key = 'writes'
+				except OperationalError as e:
+					assert 'locked' in str(e), e
+					key = 'locked'
+				with lock:
+					counts[key] += 1
+			connections['default'].close()
+
+		def reader(i):
+			client = APIClient()
+			urls = ['/apis/products/?page_size=50', '/apis/categories/stats/', '/apis/products/?ordering=-price&page_size=50']
+			n = 0
+			while time.monotonic() < deadline:
+				n += 1
+				try:
+					response = client.get(urls[n % len(urls)])
+					assert response.status_code == 200, response.status_code
+					key = 'reads'
+				except OperationalError as e:
+					assert 'locked' in str(e), e
+					key = 'locked'
+				with lock:
+					counts[key] += 1
+			connections['default'].close()
+
+		threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+		threads += [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		print('%-10s %-10s %10.0f %10.0f %10d' % (label, journal_mode,
+			counts['writes'] / args.seconds, counts['reads'] / args.seconds, counts['locked']))
+
+	print('%d products, %d writers, %d readers, %.0f seconds' % (args.products, args.writers, args.readers, args.seconds))
+	print('%-10s %-10s %10s %10s %10s' % ('config', 'journal', 'writes/s', 'reads/s', 'locked'))
+	run('default', DEFAULT_OPTIONS)
+	run('wal', wal_options)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,90 @@
+"""
+多個thread同時結帳，比較ProductStock的條件式UPDATE與舊的讀取後寫入(ProductDetail PUT的做法)
+檢查是否超賣(成功的次數大於庫存)以及在競爭下的throughput
+
+python benchmarks/bench_stock.py --threads 16 --stock 2000
+"""
+import argparse
+import threading
+import time
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--threads', type=int, default=16)
+	parser.add_argument('--stock', type=int, default=2000)
+	args = parser.parse_args()
+
+	common.setup('bench_1000.sqlite3')
+	common.seed(1000)
+
+	from django.contrib.auth.models import User
+	from django.db import connection
+	from rest_framework.test import APIClient
+	from apiapp.models import Product
+	from apiapp.stock import StockError, reserve
+
+	product = Product.objects.order_by('id').first()
+	user = User.objects.order_by('id').first()
+
+	def checkout_update(client):
+		response = client.post('/apis/product/%d/stock/' % product.pk, {'quantity': 1}, format='json')
+		assert response.status_code in (204, 409), response.status_code
+		return response.status_code == 204
+
+	def checkout_reserve(client):
+		#不經過HTTP，只量測apiapp/stock.py的條件式UPDATE
+		try:
+			reserve({product.pk: 1})
+		except StockError:
+			return False
+		return True
+
+	def checkout_read_modify_write(client):
+		#舊的做法 : 讀取product，檢查庫存後以save()寫回整筆資料
+		instance = Product.objects.get(pk=product.pk)
+		if instance.stock < 1:
+			return False
+		instance.stock -= 1
+		instance.save()
+		return True
+
+	def run(checkout):
+		Product.objects.filter(pk=product.pk).update(stock=args.stock)
+		successes = [0] * args.threads
+		start_barrier = threading.Barrier(args.threads)
+
+		def worker(index):
+			client = APIClient()
+			client.force_authenticate(user)
+			start_barrier.wait()
+			try:
+				#每個thread一直結帳到庫存不足為止
+				while checkout(client):
+					successes[index] += 1
+			finally:
+				connection.close()
+
+		threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+		started = time.perf_counter()
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		elapsed = time.perf_counter() - started
+		return sum(successes), Product.objects.get(pk=product.pk).stock, elapsed
+
+	print('%d threads, stock %d' % (args.threads, args.stock))
+	print('%-32s %10s %10s %10s %12s' % ('', 'sold', 'oversold', 'stock', 'checkouts/s'))
+	for label, checkout in (
+			('POST /apis/product/<pk>/stock/', checkout_update),
+			('stock.reserve()', checkout_reserve),
+			('read-modify-write save()', checkout_read_modify_write)):
+		sold, stock, elapsed = run(checkout)
+		print('%-32s %10d %10d %10d %12.0f' % (label, sold, max(sold - args.stock, 0), stock, sold / elapsed))
+
+
+if __name__ == '__main__':
+	main()
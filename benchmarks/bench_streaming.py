@@ -0,0 +1,54 @@
+"""
+比較GET /apis/products/ 與 /apis/products/?stream=1 的peak memory以及time to first byte
+
+python benchmarks/bench_streaming.py --products 10000 50000 100000
+"""
+import argparse
+import time
+import tracemalloc
+
+import common
+
+
+def consume(client, url):
+	'''
+	回傳(time to first byte, 全部完成的時間, peak memory)，時間單位為毫秒、memory單位為MB
+	'''
+	tracemalloc.start()
+	start = time.perf_counter()
+	response = client.get(url)
+	if response.streaming:
+		chunks = iter(response.streaming_content)
+		next(chunks)
+		first_byte = time.perf_counter()
+		for _ in chunks:
+			pass
+	else:
+		response.content
+		first_byte = time.perf_counter()
+	end = time.perf_counter()
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return (first_byte - start) * 1000, (end - start) * 1000, peak / 1024 / 1024
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, nargs='+', default=[10000, 50000, 100000])
+	args = parser.parse_args()
+
+	common.setup('bench_%d.sqlite3' % args.products[0])
+	from rest_framework.test import APIClient
+	client = APIClient()
+
+	print('%-10s %-10s %12s %12s %12s' % ('products', 'mode', 'TTFB(ms)', 'total(ms)', 'peak(MB)'))
+	for products in args.products:
+		common.use_database('bench_%d.sqlite3' % products)
+		common.seed(products)
+		for label, url in (('list', '/apis/products/'), ('stream', '/apis/products/?stream=1')):
+			ttfb, total, peak = consume(client, url)
+			print('%-10d %-10s %12.1f %12.1f %12.1f' % (products, label, ttfb, total, peak))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,75 @@
+"""
+比較GET /apis/users/與POST products驗證，在每個user都有大量product時
+原本的PrimaryKeyRelatedField(many=True)與UserSerializer(前PREVIEW_SIZE個id + product_count)的latency與query數
+
+python benchmarks/bench_users.py --products 1000000
+"""
+import argparse
+
+import common
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, default=100000)
+	parser.add_argument('--repeat', type=int, default=20)
+	parser.add_argument('--post-products', type=int, default=1000)
+	args = parser.parse_args()
+
+	common.setup('bench_%d.sqlite3' % args.products)
+	common.seed(args.products)
+
+	from django.contrib.auth.models import User
+	from django.db import connection, transaction
+	from rest_framework import serializers
+	from rest_framework.test import APIClient
+	from apiapp import views
+	from apiapp.models import Product
+	from apiapp.serializers import UserSerializer
+
+	class OriginalUserSerializer(serializers.ModelSerializer):
+		products = serializers.PrimaryKeyRelatedField(many=True, queryset=Product.objects.all())
+		class Meta:
+			model = User
+			fields = ['id', 'username', 'is_staff', 'products']
+
+	admin = User.objects.filter(is_staff=True).first() or User.objects.create_superuser('bench_admin', 'admin@example.com', 'x')
+	client = APIClient()
+	client.force_authenticate(admin)
+	pks = list(Product.objects.order_by('id').values_list('id', flat=True)[:args.post_products])
+
+	def get():
+		response = client.get('/apis/users/')
+		assert response.status_code == 200, response.status_code
+
+	def post():
+		#在transaction中POST後rollback，product的owner不會改變
+		with transaction.atomic():
+			response = client.post('/apis/users/', {'username': 'bench_post', 'products': pks}, format='json')
+			assert response.status_code == 201, response.status_code
+			transaction.set_rollback(True)
+
+	def count_queries(fn):
+		executed = []
+		def wrapper(execute, sql, params, many, context):
+			executed.append(sql)
+			return execute(sql, params, many, context)
+		with connection.execute_wrapper(wrapper):
+			fn()
+		return len(executed)
+
+	rows = []
+	for label, serializer_class in (('original', OriginalUserSerializer), ('preview', UserSerializer)):
+		views.UserList.serializer_class = serializer_class
+		views.UserList.queryset = User.objects.all() if label == 'original' else views.users_with_product_count
+		rows.append(('GET %s (%d queries)' % (label, count_queries(get)), common.measure(get, args.repeat, warmup=1)))
+		rows.append(('POST %s (%d queries)' % (label, count_queries(post)), common.measure(post, args.repeat, warmup=1)))
+	views.UserList.serializer_class = UserSerializer
+	views.UserList.queryset = views.users_with_product_count
+
+	common.report('%d products, %d users, POST with %d products' % (
+		args.products, User.objects.count(), args.post_products), rows)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,124 @@
+"""
+benchmark共用的工具
+
+所有benchmark都使用獨立的SQLite檔案(benchmarks/bench_<n>.sqlite3)，不會動到專案的db.sqlite3。
+同樣數量的資料只會seed一次，之後重複執行benchmark時會直接沿用。
+"""
+import os
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'productapi.settings')
+
+
+def setup(db_name='bench.sqlite3'):
+	'''
+	將default database指向benchmark專用的SQLite檔案，然後執行migrate
+	'''
+	import django
+	from django.conf import settings
+
+	settings.DATABASES['default']['NAME'] = os.path.join(BENCH_DIR, db_name)
+	settings.DEBUG = False #DEBUG為True時connection.queries會一直累積，影響量測
+	django.setup()
+
+	from django.core.management import call_command
+	call_command('migrate', verbosity=0)
+
+
+def use_database(db_name):
+	'''
+	在同一個process中切換到另一個benchmark用的SQLite檔案
+	'''
+	from django.conf import settings
+	from django.core.management import call_command
+	from django.db import connections
+
+	connections['default'].close()
+	settings.DATABASES['default']['NAME'] = os.path.join(BENCH_DIR, db_name)
+	call_command('migrate', verbosity=0)
+
+
+def seed(products, categories=20, users=50, description='尚未有產品說明'):
+	'''
+	建立users個User、categories個Category以及products個Product
+	如果資料庫中已經有相同數量的Product與Category，則不重新建立
+	description可以是function，以product的index產生不同的內容
+	'''
+	from django.contrib.auth.models import User
+	from django.db import transaction
+	from apiapp.models import Category, Product
+
+	if Product.objects.count() == products and Category.objects.count() == categories:
+		return
+	with transaction.atomic():
+		Product.objects.all().delete()
+		Category.objects.all().delete()
+		User.objects.all().delete()
+		User.objects.bulk_create(
+			[User(username='user%d' % i) for i in range(users)], batch_size=500)
+		Category.objects.bulk_create(
+			[Category(name='category%d' % i) for i in range(categories)], batch_size=500)
+		user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+		category_ids = list(Category.objects.order_by('id').values_list('id', flat=True))
+
+		batch = []
+		for i in range(products):
+			batch.append(Product(
+				category_id=category_ids[i % len(category_ids)],
+				owner_id=user_ids[i % len(user_ids)],
+				name='product%d' % i,
+				description=description(i) if callable(description) else description,
+				stock=i % 100,
+				price=(i * 37) % 100000,
+			))
+			if len(batch) == 10000:
+				Product.objects.bulk_create(batch)
+				batch = []
+		if batch:
+			Product.objects.bulk_create(batch)
+
+
+def percentile(samples, p):
+	'''
+	samples為已排序的list
+	'''
+	return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def measure(fn, repeat=50, warmup=3):
+	'''
+	執行fn repeat次，回傳以毫秒為單位的p50、p95、p99、mean，以及每秒執行的次數(throughput)
+	'''
+	for _ in range(warmup):
+		fn()
+	samples = []
+	total = time.perf_counter()
+	for _ in range(repeat):
+		start = time.perf_counter()
+		fn()
+		samples.append((time.perf_counter() - start) * 1000)
+	total = time.perf_counter() - total
+	samples.sort()
+	return {
+		'p50': samples[len(samples) // 2],
+		'p95': percentile(samples, 0.95),
+		'p99': percentile(samples, 0.99),
+		'mean': statistics.mean(samples),
+		'throughput': repeat / total,
+	}
+
+
+def report(title, rows):
+	'''
+	rows為(label, measure()的結果)的list
+	'''
+	print(title)
+	print('%-32s %10s %10s %10s' % ('', 'p50(ms)', 'p99(ms)', 'mean(ms)'))
+	for label, result in rows:
+		print('%-32s %10.2f %10.2f %10.2f' % (label, result['p50'], result['p99'], result['mean']))
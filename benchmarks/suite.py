@@ -0,0 +1,248 @@
+"""
+所有endpoint的benchmark suite : apiapp/urls.py的每一個route以及/api/token/
+每個catalog大小(product數量)各使用一個benchmark專用的SQLite檔案，記錄throughput、p50/p95/p99、
+每個request的query數以及peak RSS，結果寫入JSON，之後的執行可以與它比較並列出變慢的endpoint
+
+python benchmarks/suite.py --products 1000 100000 1000000
+python benchmarks/suite.py --products 100000 --compare benchmarks/results/suite-20260101-120000.json
+python benchmarks/suite.py --products 1000 --only products
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import common
+
+PASSWORD = 'bench-password'
+
+
+def cases(ids):
+	'''
+	回傳(名稱, method, path, data, 使用的token)的list
+	token為None時匿名，'owner'為ids['product']的owner，'admin'為staff user
+	'''
+	return [
+		('token', 'post', '/api/token/', {'username': ids['admin_username'], 'password': PASSWORD}, None),
+		('categories', 'get', '/apis/categories/', None, None),
+		('categories create', 'post', '/apis/categories/', {'name': 'bench category'}, 'owner'),
+		('categories stats', 'get', '/apis/categories/stats/', None, None),
+		('category', 'get', '/apis/category/%d/' % ids['category'], None, None),
+		('category update', 'put', '/apis/category/%d/' % ids['category'], {'name': ids['category_name']}, 'owner'),
+		('products', 'get', '/apis/products/', None, None),
+		('products filtered', 'get', '/apis/products/?category=%s&in_stock=true&ordering=-price' % ids['category_name'], None, None),
+		('products fields', 'get', '/apis/products/?fields=id,name,price&page_size=500', None, None),
+		('products create', 'post', '/apis/products/', ids['product_data'], 'owner'),
+		('products bulk create', 'post', '/apis/products/bulk/', [ids['product_data']] * 100, 'owner'),
+		('products changes', 'get', '/apis/products/changes/', None, None),
+		('products changes since', 'get', '/apis/products/changes/?since=%d&page_size=100' % ids['changes_since'], None, None),
+		('products search', 'get', '/apis/products/search/?q=product123', None, None),
+		('products stock', 'post', '/apis/products/stock/', [{'id': ids['product'], 'quantity': 1}], 'owner'),
+		('product', 'get', '/apis/product/%d/' % ids['product'], None, None),
+		('product update', 'put', '/apis/product/%d/' % ids['product'], ids['product_data'], 'owner'),
+		('product delete', 'delete', '/apis/product/%d/' % ids['product'], None, 'owner'),
+		('product stock', 'post', '/apis/product/%d/stock/' % ids['product'], {'quantity': 1}, 'owner'),
+		('users', 'get', '/apis/users/', None, None),
+		('users create', 'post', '/apis/users/', {'username': 'bench_created', 'products': []}, 'admin'),
+		('user', 'get', '/apis/user/%d/' % ids['owner'], None, 'admin'),
+		('cache stats', 'get', '/apis/cache/stats/', None, None),
+	]
+
+
+def prepare():
+	'''
+	準備benchmark使用的user與object，回傳cases()需要的id
+	seed建立的user沒有password，設定第一個user的password作為owner，另外建立一個staff user
+	'''
+	from django.contrib.auth.models import User
+	from django.db.models import F
+	from apiapp.changes import head
+	from apiapp.models import Product, ProductChange
+
+	product = Product.objects.select_related('owner', 'category').filter(stock__gt=10).order_by('id').first()
+	owner = product.owner
+	if not owner.check_password(PASSWORD):
+		owner.set_password(PASSWORD)
+		owner.save()
+	admin = User.objects.filter(username='bench_admin').first()
+	if admin is None:
+		admin = User.objects.create_superuser('bench_admin', 'admin@example.com', PASSWORD)
+	elif not admin.check_password(PASSWORD):
+		admin.set_password(PASSWORD)
+		admin.save()
+	#加上變更紀錄之前seed的資料庫沒有紀錄，修改100筆product，trigger會記錄變更
+	if ProductChange.objects.count() < 100:
+		pks = list(Product.objects.order_by('id').values_list('id', flat=True)[:100])
+		Product.objects.filter(pk__in=pks).update(stock=F('stock'))
+	return {
+		'owner': owner.pk,
+		'owner_username': owner.username,
+		'admin_username': admin.username,
+		'product': product.pk,
+		'category': product.category_id,
+		'category_name': product.category.name,
+		'product_data': {'category': product.category_id, 'name': 'bench product', 'stock': 1, 'price': 100},
+		#最後100筆變更
+		'changes_since': max(head() - 100, 0),
+	}
+
+
+def run_case(client, method, path, data, repeat):
+	'''
+	回傳measure()的結果加上queries、peak_alloc_kb、status
+	寫入的request在transaction中執行後rollback，重複執行時資料庫的內容不會改變
+	'''
+	from django.db import connection, transaction
+
+	def send():
+		if data is None:
+			return getattr(client, method)(path)
+		return getattr(client, method)(path, data, format='json')
+
+	def request():
+		if method == 'get':
+			response = send()
+		else:
+			with transaction.atomic():
+				response = send()
+				transaction.set_rollback(True)
+		assert response.status_code < 400, (path, response.status_code, response.content[:200])
+		return response
+
+	executed = []
+
+	def count(execute, sql, params, many, context):
+		executed.append(sql)
+		return execute(sql, params, many, context)
+
+	with connection.execute_wrapper(count):
+		status = request().status_code
+	#rollback用的transaction與view內的SAVEPOINT不算在query數中
+	queries = len([sql for sql in executed if not sql.startswith(('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'))])
+
+	tracemalloc.start()
+	request()
+	peak_alloc = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	result = common.measure(request, repeat, warmup=2)
+	result.update({
+		'status': status,
+		'queries': queries,
+		'peak_alloc_kb': peak_alloc / 1024,
+		'peak_rss_mb': peak_rss_mb(),
+	})
+	return result
+
+
+def peak_rss_mb():
+	#process到目前為止的最大RSS，Linux的單位為KB，macOS為bytes
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def git_commit():
+	try:
+		return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=common.BASE_DIR,
+			capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def compare(results, baseline_path, threshold):
+	'''
+	與baseline的JSON比較，p50變慢超過threshold或query數增加時視為regression，回傳regression的數量
+	'''
+	with open(baseline_path, encoding='utf-8') as f:
+		baseline = {(row['products'], row['endpoint']): row for row in json.load(f)['results']}
+	print()
+	print('compared with %s (threshold +%d%%)' % (baseline_path, threshold * 100))
+	print('%-10s %-24s %12s %12s %8s %10s' % ('products', 'endpoint', 'p50 before', 'p50 after', 'change', 'queries'))
+	regressions = 0
+	for row in results:
+		before = baseline.get((row['products'], row['endpoint']))
+		if before is None:
+			continue
+		change = row['p50'] / before['p50'] - 1 if before['p50'] else 0
+		slower = change > threshold or row['queries'] > before['queries']
+		regressions += slower
+		print('%-10d %-24s %12.2f %12.2f %+7.0f%% %4d -> %-4d%s' % (row['products'], row['endpoint'],
+			before['p50'], row['p50'], change * 100, before['queries'], row['queries'], '  REGRESSION' if slower else ''))
+	return regressions
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--products', type=int, nargs='+', default=[1000, 100000])
+	parser.add_argument('--repeat', type=int, default=30)
+	parser.add_argument('--only', help='只執行名稱包含這個字串的endpoint')
+	parser.add_argument('--output', help='結果的JSON檔案，預設為benchmarks/results/suite-<時間>.json')
+	parser.add_argument('--compare', help='與之前的結果比較')
+	parser.add_argument('--threshold', type=float, default=0.2, help='p50變慢的比例超過時視為regression')
+	args = parser.parse_args()
+
+	common.setup('bench_%d.sqlite3' % args.products[0])
+
+	import django
+	import sqlite3
+	from rest_framework.test import APIClient
+
+	results = []
+	for i, products in enumerate(args.products):
+		if i:
+			common.use_database('bench_%d.sqlite3' % products)
+		common.seed(products)
+		ids = prepare()
+
+		tokens = {}
+		for name, username in (('owner', ids['owner_username']), ('admin', ids['admin_username'])):
+			response = APIClient().post('/api/token/', {'username': username, 'password': PASSWORD}, format='json')
+			tokens[name] = response.data['access']
+
+		rows = []
+		for name, method, path, data, token in cases(ids):
+			if args.only and args.only not in name:
+				continue
+			client = APIClient()
+			if token is not None:
+				client.credentials(HTTP_AUTHORIZATION='Bearer ' + tokens[token])
+			result = run_case(client, method, path, data, args.repeat)
+			result.update({'products': products, 'endpoint': name, 'method': method.upper(), 'path': path})
+			results.append(result)
+			rows.append(result)
+
+		print('%d products' % products)
+		print('%-24s %10s %10s %10s %10s %8s %10s' % ('', 'req/s', 'p50(ms)', 'p95(ms)', 'p99(ms)', 'queries', 'rss(MB)'))
+		for row in rows:
+			print('%-24s %10.0f %10.2f %10.2f %10.2f %8d %10.1f' % (row['endpoint'], row['throughput'],
+				row['p50'], row['p95'], row['p99'], row['queries'], row['peak_rss_mb']))
+		print()
+
+	output = args.output or os.path.join(common.BENCH_DIR, 'results', time.strftime('suite-%Y%m%d-%H%M%S.json'))
+	os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+	with open(output, 'w', encoding='utf-8') as f:
+		json.dump({
+			'meta': {
+				'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+				'commit': git_commit(),
+				'python': platform.python_version(),
+				'django': django.get_version(),
+				'sqlite': sqlite3.sqlite_version,
+				'platform': platform.platform(),
+				'repeat': args.repeat,
+			},
+			'results': results,
+		}, f, ensure_ascii=False, indent=1)
+	print('results written to %s' % output)
+
+	if args.compare and compare(results, args.compare, args.threshold):
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
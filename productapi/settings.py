@@ -37,21 +37,44 @@ INSTALLED_APPS = [
 	'django.contrib.sessions',
 	'django.contrib.messages',
 	'django.contrib.staticfiles',
-	'apiapp',
+	'apiapp.apps.ApiappConfig', #使用AppConfig才會在ready()連接apiapp/signals.py
 	'rest_framework',
 	'drf_yasg',
 	]
 
 REST_FRAMEWORK = {
 	#設定驗證方法，若沒有設定DEFAULT_AUTHENTICATION_CLASSES，會將request.user設定為instance of django.contrib.auth.models.AnonymousUser
+	#apiapp的CachedJWTAuthentication與simplejwt的JWTAuthentication相同，但user從cache取得，不需要每個request查詢資料庫
 	'DEFAULT_AUTHENTICATION_CLASSES': (
-		'rest_framework_simplejwt.authentication.JWTAuthentication',
+		'apiapp.authentication.CachedJWTAuthentication',
+	),
+	#所有list view預設使用keyset分頁(apiapp/pagination.py)，每頁PAGE_SIZE筆，client可以用page_size參數要求最多PAGINATION_MAX_PAGE_SIZE筆
+	'DEFAULT_PAGINATION_CLASS': 'apiapp.pagination.KeysetPagination',
+	'PAGE_SIZE': int(os.environ.get('PAGINATION_PAGE_SIZE', 50)),
+	#JSON以orjson render、parse(apiapp/renderers.py、parsers.py)，沒有安裝orjson時使用json module，輸出相同
+	'DEFAULT_RENDERER_CLASSES': (
+		'apiapp.renderers.FastJSONRenderer',
+		'rest_framework.renderers.BrowsableAPIRenderer',
+	),
+	'DEFAULT_PARSER_CLASSES': (
+		'apiapp.parsers.FastJSONParser',
+		'rest_framework.parsers.FormParser',
+		'rest_framework.parsers.MultiPartParser',
 	),
 	#設定test時，發出request的format
 	'TEST_REQUEST_DEFAULT_FORMAT': 'json'
 	}
 
+PAGINATION_MAX_PAGE_SIZE = int(os.environ.get('PAGINATION_MAX_PAGE_SIZE', 500))
+
+#/apis/products/changes/的變更紀錄保留的天數，由cron定期執行 manage.py compact_product_changes 清除(apiapp/changes.py)
+PRODUCT_CHANGES_RETENTION_DAYS = int(os.environ.get('PRODUCT_CHANGES_RETENTION_DAYS', 30))
+
 MIDDLEWARE = [
+    #最外層，時間包含其他middleware，METRICS_ENABLED為False時不使用(apiapp/metrics.py)
+    'apiapp.metrics.MetricsMiddleware',
+    #依照Accept-Encoding壓縮response，需要在其他會讀取、修改內容的middleware之前(apiapp/compression.py)
+    'apiapp.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +86,11 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'productapi.urls'
 
+#每個request的SQL數量與時間、序列化、render的時間以Server-Timing header回傳，並在/metrics輸出Prometheus的histogram
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+#Server-Timing會讓client看到SQL的數量與時間，不想公開時設為0，/metrics仍然有效
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '1') == '1'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -84,14 +112,75 @@ WSGI_APPLICATION = 'productapi.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
+# 預設使用SQLite，production可以透過環境變數改為PostgreSQL，例如 :
+# DATABASE_ENGINE=django.db.backends.postgresql DATABASE_NAME=productapi DATABASE_USER=productapi DATABASE_PASSWORD=... DATABASE_HOST=127.0.0.1
+# 依賴SQLite的功能在其他資料庫的行為(README的資料庫) :
+# 全文搜尋(apiapp/search.py)沒有FTS5 index，改用icontains掃描；類別統計(apiapp/stats.py)、變更紀錄(apiapp/changes.py)由apiapp/signals.py維護
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        #apiapp/backends/sqlite3為Django的SQLite backend加上OPTIONS的pragmas、transaction_mode
+        'ENGINE': os.environ.get('DATABASE_ENGINE', 'apiapp.backends.sqlite3'),
+        'NAME': os.environ.get('DATABASE_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'USER': os.environ.get('DATABASE_USER', ''),
+        'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+        'HOST': os.environ.get('DATABASE_HOST', ''),
+        'PORT': os.environ.get('DATABASE_PORT', ''),
+        #connection在request之間保留的秒數，不需要每個request重新連線
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+    }
+}
+
+if DATABASES['default']['ENGINE'] == 'apiapp.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': 20, #等待write lock的秒數，超過才raise database is locked
+        #transaction.atomic()以BEGIN IMMEDIATE開始，一開始就取得write lock
+        'transaction_mode': 'IMMEDIATE',
+        #每個connection建立時執行的PRAGMA
+        #WAL讓讀取不會被寫入block，synchronous=NORMAL在WAL下只有斷電時可能遺失最後的commit，不會損毀資料庫
+        'pragmas': {
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'busy_timeout': 20000, #毫秒，與timeout相同
+            'mmap_size': 256 * 1024 * 1024, #以mmap讀取資料庫檔案，減少read() system call與複製
+            'cache_size': -64000, #每個connection的page cache(KB)
+            'temp_store': 'memory',
+        },
+    }
+
+#request開始時檢查保留的connection是否仍然可用(apiapp/database.py)，PostgreSQL重新啟動後不會回傳500
+DATABASE_HEALTH_CHECKS = os.environ.get('DATABASE_HEALTH_CHECKS', '1') == '1'
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# 預設使用locmem，production可以透過環境變數改為Redis，例如 :
+# CACHE_BACKEND=django_redis.cache.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379/1
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'productapi'),
     }
 }
 
+RESPONSE_CACHE_TIMEOUT = 600 #apiapp/cache.py存放的response保留的秒數
+
+#response的壓縮(apiapp/compression.py)，br需要安裝brotli，zstd需要安裝zstandard，沒有安裝的encoding會被略過
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1') == '1'
+COMPRESSION_ENCODINGS = ('zstd' , 'br' , 'gzip') #client的q相同時優先使用的順序
+COMPRESSION_LEVELS = {'zstd': 3 , 'br': 4 , 'gzip': 6} #python benchmarks/bench_compression.py可以比較每個level的CPU時間與大小
+COMPRESSION_MIN_SIZE = 1024 #小於這個bytes數的response不壓縮
+
+JWT_USER_CACHE_TIMEOUT = 60 #CachedJWTAuthentication的user在shared cache保留的秒數
+JWT_USER_LOCAL_CACHE_TIMEOUT = 5 #每個process的LRU保留的秒數，其他process修改的user最多延遲這段時間才生效
+
+#Product.image的縮圖(apiapp/images.py)，上傳的原圖由worker pool在request之外解碼並產生WebP縮圖
+PRODUCT_THUMBNAIL_SIZES = {'small': 200, 'medium': 800} #縮圖名稱 : 最長邊的pixel數
+PRODUCT_IMAGE_WORKERS = 2 #每個process處理圖片的thread數
+PRODUCT_IMAGE_MAX_PIXELS = 40000000 #寬 x 高超過時不產生縮圖，image_status為failed
+PRODUCT_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024 #上傳檔案的bytes上限
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -133,4 +222,11 @@ STATIC_URL = '/static/' #可通過http://127.0.0.1/static/***/訪問
 
 MEDIA_ROOT = '/home/edgar/productapi/media/'  #客戶端上傳的圖片存放資料夾 : /media/
 
-MEDIA_URL = '/media/'  #可通過http://127.0.0.1/media/***/訪問
\ No newline at end of file
+MEDIA_URL = '/media/'  #可通過http://127.0.0.1/media/***/訪問
+
+#apiapp/media.py : 設定MEDIA_SENDFILE_HEADER時，Django只回傳header，由web server傳送檔案
+#nginx : MEDIA_SENDFILE_HEADER=X-Accel-Redirect，並設定internal的location /protected-media/ 指向MEDIA_ROOT
+#Apache(mod_xsendfile)、lighttpd : MEDIA_SENDFILE_HEADER=X-Sendfile
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER', None)
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60 #media檔名不變時內容不會改變，client可以cache一年
\ No newline at end of file
@@ -13,15 +13,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
 from django.urls import path , include , re_path
-from django.conf.urls.static import static
 from django.conf import settings
 
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from apiapp.media import serve_media
+from apiapp.metrics import metrics_view
+
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -52,7 +56,14 @@ urlpatterns = [
 	path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
 	path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+#static()只在DEBUG時有效且沒有cache header，改用apiapp/media.py的serve_media
+urlpatterns += [
+	re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media),
+]
 urlpatterns += [
     path('api-auth/', include('rest_framework.urls')),
+]
+#Prometheus的scrape endpoint，METRICS_ENABLED時才有效(apiapp/metrics.py)
+urlpatterns += [
+	path('metrics', metrics_view),
 ]
\ No newline at end of file